@@ -9,8 +9,15 @@ https://docs.djangoproject.com/en/4.1/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "IntelliAPI.settings")
 
 application = get_asgi_application()
+
+if settings.MODEL_WARMUP:
+    # Load the models before the first request instead of during it
+    from api.registry import registry
+
+    registry.warm_up()
@@ -10,17 +10,13 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.1/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 from decouple import config
-from pymongo import MongoClient
 
 MONGO_URI = config("MONGO_URI")
-client = MongoClient(MONGO_URI)
-
 db_name = config("DB_NAME")
-# connect to my MongoDB cluster
-db = client.get_database(db_name)
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -64,6 +60,7 @@ REST_FRAMEWORK = {
 }
 
 MIDDLEWARE = [
+    "api.middleware.TimingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
@@ -105,17 +102,146 @@ WSGI_APPLICATION = "IntelliAPI.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/4.1/ref/settings/#databases
 
+# djongo on the MongoClient shared by the process, created on first use (see
+# api.mongo). The CLIENT options are those of the shared client: size of the
+# connection pool of each process and timeouts, in milliseconds.
 DATABASES = {
     "default": {
-        "ENGINE": "djongo",
+        "ENGINE": "api.db",
         "NAME": db_name,
         "CLIENT": {
             "host": MONGO_URI,
+            "maxPoolSize": config("MONGO_MAX_POOL_SIZE", default=10, cast=int),
+            "minPoolSize": config("MONGO_MIN_POOL_SIZE", default=0, cast=int),
+            "maxIdleTimeMS": config("MONGO_MAX_IDLE_TIME_MS", default=60000, cast=int),
+            "connectTimeoutMS": config(
+                "MONGO_CONNECT_TIMEOUT_MS", default=5000, cast=int
+            ),
+            "serverSelectionTimeoutMS": config(
+                "MONGO_SERVER_SELECTION_TIMEOUT_MS", default=5000, cast=int
+            ),
+            "socketTimeoutMS": config(
+                "MONGO_SOCKET_TIMEOUT_MS", default=30000, cast=int
+            ),
         },
     }
 }
 
 
+# Machine learning models
+
+# Load and warm up every registered model when the WSGI/ASGI application starts
+MODEL_WARMUP = config("MODEL_WARMUP", default=True, cast=bool)
+
+# Seconds between two checks of the model manifests, to load and swap in new
+# model versions without restarting the server (0 disables hot reloading)
+MODEL_RELOAD_INTERVAL = config("MODEL_RELOAD_INTERVAL", default=30, cast=float)
+
+# Memory-map the arrays of uncompressed model artifacts instead of copying them
+MODEL_MMAP = config("MODEL_MMAP", default=True, cast=bool)
+
+# Load the compiled artifacts written by the compile_models command, when they
+# are up to date, instead of unpickling the joblib artifacts
+MODEL_COMPILED = config("MODEL_COMPILED", default=True, cast=bool)
+
+# SHAP explanation mode of the heart disease predictor: "exact", "approximate"
+# or "table" (precomputed SHAP values, see the build_shap_table command)
+HEART_DISEASE_EXPLAIN_MODE = config("HEART_DISEASE_EXPLAIN_MODE", default="exact")
+
+# Build the SHAP explainer during the warm-up. Disabling it shortens the start
+# of the server, shap is then imported by the first explained prediction
+HEART_DISEASE_WARMUP_EXPLAINER = config(
+    "HEART_DISEASE_WARMUP_EXPLAINER", default=True, cast=bool
+)
+
+# How the predictors compute predictions: "sklearn" or "numba" (compiled trees)
+HEART_DISEASE_INFERENCE_BACKEND = config(
+    "HEART_DISEASE_INFERENCE_BACKEND", default="sklearn"
+)
+PRICE_PILOT_INFERENCE_BACKEND = config(
+    "PRICE_PILOT_INFERENCE_BACKEND", default="sklearn"
+)
+
+# Thread pool running the model calls of the async prediction views: number of
+# workers, number of requests waiting for a worker before new ones get a 429,
+# and number of native (OpenMP, BLAS, numba) threads used by each worker
+INFERENCE_WORKERS = config("INFERENCE_WORKERS", default=os.cpu_count() or 1, cast=int)
+INFERENCE_QUEUE_SIZE = config("INFERENCE_QUEUE_SIZE", default=64, cast=int)
+INFERENCE_THREADS_PER_WORKER = config(
+    "INFERENCE_THREADS_PER_WORKER", default=1, cast=int
+)
+
+# Micro-batching of single predictions: the inputs of concurrent requests are
+# predicted together, in batches of up to MICRO_BATCH_MAX_SIZE inputs collected
+# for at most MICRO_BATCH_MAX_WAIT_MS milliseconds. Only useful when a process
+# serves concurrent requests (threaded workers or the async views).
+MICRO_BATCH_ENABLED = config("MICRO_BATCH_ENABLED", default=False, cast=bool)
+MICRO_BATCH_MAX_SIZE = config("MICRO_BATCH_MAX_SIZE", default=32, cast=int)
+MICRO_BATCH_MAX_WAIT_MS = config("MICRO_BATCH_MAX_WAIT_MS", default=2.0, cast=float)
+
+# Maximum number of patients accepted by a single heart disease batch request
+HEART_DISEASE_MAX_BATCH_SIZE = config(
+    "HEART_DISEASE_MAX_BATCH_SIZE", default=10000, cast=int
+)
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+
+# Prediction results are cached, keyed on the validated input and the model
+# version. The local-memory backend evicts the least recently used entries
+# beyond PREDICTION_CACHE_MAX_ENTRIES; PREDICTION_CACHE_TTL is in seconds, 0
+# keeps entries until they are evicted.
+PREDICTION_CACHE_ENABLED = config("PREDICTION_CACHE_ENABLED", default=True, cast=bool)
+PREDICTION_CACHE_ALIAS = "predictions"
+PREDICTION_CACHE_TTL = config("PREDICTION_CACHE_TTL", default=0, cast=int)
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    PREDICTION_CACHE_ALIAS: {
+        "BACKEND": config(
+            "PREDICTION_CACHE_BACKEND",
+            default="django.core.cache.backends.locmem.LocMemCache",
+        ),
+        "LOCATION": config("PREDICTION_CACHE_LOCATION", default="predictions"),
+        "TIMEOUT": PREDICTION_CACHE_TTL or None,
+        "OPTIONS": {
+            "MAX_ENTRIES": config(
+                "PREDICTION_CACHE_MAX_ENTRIES", default=10000, cast=int
+            ),
+        },
+    },
+}
+
+
+# Maximum age in seconds of the in-memory index of car brands and models
+CAR_NAME_INDEX_TTL = config("CAR_NAME_INDEX_TTL", default=300, cast=int)
+
+
+# Number of cars validated and inserted together by car_data_bulk/, and
+# maximum number of per-car errors returned in its response
+CAR_BULK_CHUNK_SIZE = config("CAR_BULK_CHUNK_SIZE", default=1000, cast=int)
+CAR_BULK_MAX_ERRORS = config("CAR_BULK_MAX_ERRORS", default=1000, cast=int)
+
+# Default and maximum number of cars in a page listed by car_data_bulk/, and
+# number of cars read per batch of its NDJSON export
+CAR_LIST_PAGE_SIZE = config("CAR_LIST_PAGE_SIZE", default=100, cast=int)
+CAR_LIST_MAX_PAGE_SIZE = config("CAR_LIST_MAX_PAGE_SIZE", default=1000, cast=int)
+CAR_EXPORT_BATCH_SIZE = config("CAR_EXPORT_BATCH_SIZE", default=1000, cast=int)
+
+# Number of cars read, predicted and written back together when the prices of
+# the stored cars are scored (score_cars/ and manage.py score_cars)
+CAR_SCORING_BATCH_SIZE = config("CAR_SCORING_BATCH_SIZE", default=5000, cast=int)
+
+
+# Return the durations of the stages of each request (validation,
+# preprocessing, prediction, database...) in its Server-Timing header. They are
+# always aggregated into the histograms of /metrics
+SERVER_TIMING_ENABLED = config("SERVER_TIMING_ENABLED", default=False, cast=bool)
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
 
@@ -16,10 +16,13 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import include, path
 
+from api.views import MetricsView
+
 urlpatterns = [
     path("admin/", admin.site.urls),
     path(
         "api/v1/",
         include("api.urls"),
     ),
+    path("metrics", MetricsView.as_view(), name="metrics"),
 ]
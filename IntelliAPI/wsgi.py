@@ -9,8 +9,15 @@ https://docs.djangoproject.com/en/4.1/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "IntelliAPI.settings")
 
 application = get_wsgi_application()
+
+if settings.MODEL_WARMUP:
+    # Load the models before the first request instead of during it
+    from api.registry import registry
+
+    registry.warm_up()
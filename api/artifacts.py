@@ -0,0 +1,179 @@
+import json
+import os
+
+import numpy as np
+
+# Version of the layout of compiled artifacts, bumped on incompatible changes
+FORMAT_VERSION = 1
+COMPILED_SUFFIX = ".compiled"
+META_NAME = "meta.json"
+
+TREE_ENSEMBLE_ARRAYS = (
+    "feature",
+    "threshold",
+    "children_left",
+    "children_right",
+    "value",
+    "roots",
+    "tree_outputs",
+    "init",
+)
+STANDARD_SCALER_ARRAYS = ("mean_", "var_", "scale_")
+
+
+class CompiledStandardScaler:
+    """
+    The arrays of a fitted StandardScaler, loaded from a compiled artifact.
+    It transforms like the scaler, without importing sklearn.
+    """
+
+    def __init__(self, mean_, scale_, with_mean, with_std, n_features_in):
+        self.mean_ = mean_
+        self.scale_ = scale_
+        self.with_mean = with_mean
+        self.with_std = with_std
+        self.n_features_in_ = n_features_in
+
+    def transform(self, X):
+        """
+        Returns the scaled copy of a matrix of shape (n_samples, n_features).
+        """
+        X = np.array(X, dtype=np.float64)
+        if self.with_mean:
+            X -= self.mean_
+        if self.with_std:
+            X /= self.scale_
+        return X
+
+
+def compiled_path(path):
+    """
+    Returns the path of the compiled artifact of a joblib artifact.
+    """
+    return os.path.splitext(path)[0] + COMPILED_SUFFIX
+
+
+def compile_artifact(obj, path, source_version, source_sha1):
+    """
+    Writes a fitted model or scaler as a compiled artifact: a directory with
+    one .npy file per array and a meta.json file with the other attributes,
+    which loads without unpickling anything.
+
+    Supported objects: the tree ensembles of api.tree_engine, compiled to
+    their flattened node arrays, and StandardScaler.
+
+    Parameters:
+        obj: Fitted estimator or scaler.
+        path (str): Directory of the compiled artifact.
+        source_version (str): Fingerprint of the joblib artifact it was
+            compiled from, used to detect stale compiled artifacts.
+        source_sha1 (str): SHA-1 of the joblib artifact, checked when the
+            fingerprint differs (e.g. the files were copied).
+    """
+    from sklearn.preprocessing import StandardScaler
+
+    from .tree_engine import CompiledTreeEnsemble
+
+    if isinstance(obj, StandardScaler):
+        kind, arrays = "standard_scaler", {
+            name: getattr(obj, name)
+            for name in STANDARD_SCALER_ARRAYS
+            if getattr(obj, name, None) is not None
+        }
+        attributes = {
+            "with_mean": obj.with_mean,
+            "with_std": obj.with_std,
+            "n_features_in": int(obj.n_features_in_),
+            "n_samples_seen": np.asarray(obj.n_samples_seen_).tolist(),
+            "feature_names": (
+                obj.feature_names_in_.tolist()
+                if hasattr(obj, "feature_names_in_")
+                else None
+            ),
+        }
+    else:
+        engine = CompiledTreeEnsemble.from_estimator(obj)
+        kind = "tree_ensemble"
+        arrays = {name: getattr(engine, name) for name in TREE_ENSEMBLE_ARRAYS}
+        attributes = {
+            "n_features": engine.n_features,
+            "scale": engine.scale,
+            "divisor": engine.divisor,
+            "objective": engine.objective,
+            "classes": None if engine.classes is None else engine.classes.tolist(),
+        }
+
+    os.makedirs(path, exist_ok=True)
+    for name, array in arrays.items():
+        np.save(os.path.join(path, f"{name}.npy"), np.ascontiguousarray(array))
+    meta = {
+        "format_version": FORMAT_VERSION,
+        "kind": kind,
+        "estimator": type(obj).__name__,
+        "source_version": source_version,
+        "source_sha1": source_sha1,
+        "arrays": sorted(arrays),
+        "attributes": attributes,
+    }
+    # Written last, an interrupted export leaves no loadable artifact
+    with open(os.path.join(path, META_NAME), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+
+
+def read_meta(path):
+    """
+    Returns the metadata of a compiled artifact, or None if there is none or
+    its format is not supported.
+    """
+    try:
+        with open(os.path.join(path, META_NAME), encoding="utf-8") as f:
+            meta = json.load(f)
+    except FileNotFoundError:
+        return None
+    if meta.get("format_version") != FORMAT_VERSION:
+        return None
+    return meta
+
+
+def load_compiled_artifact(path, mmap_mode=None, jit=False):
+    """
+    Loads a compiled artifact, memory-mapping its arrays with the given mode.
+    Compiled tree ensembles are evaluated with numba when jit is True, see
+    CompiledTreeEnsemble.
+
+    Returns:
+        object: A CompiledTreeEnsemble or a CompiledStandardScaler.
+    """
+    meta = read_meta(path)
+    if meta is None:
+        raise ValueError(f"{path} is not a supported compiled artifact.")
+    arrays = {
+        name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode)
+        for name in meta["arrays"]
+    }
+    attributes = meta["attributes"]
+
+    if meta["kind"] == "standard_scaler":
+        return CompiledStandardScaler(
+            arrays.get("mean_"),
+            arrays.get("scale_"),
+            attributes["with_mean"],
+            attributes["with_std"],
+            attributes["n_features_in"],
+        )
+
+    if meta["kind"] == "tree_ensemble":
+        from .tree_engine import CompiledTreeEnsemble
+
+        classes = attributes["classes"]
+        return CompiledTreeEnsemble(
+            **arrays,
+            n_features=attributes["n_features"],
+            scale=attributes["scale"],
+            divisor=attributes["divisor"],
+            objective=attributes["objective"],
+            classes=None if classes is None else np.asarray(classes),
+            jit=jit,
+        )
+
+    raise ValueError(f"Unknown compiled artifact kind {meta['kind']!r}.")
@@ -0,0 +1,59 @@
+import json
+
+from django.http import JsonResponse
+from django.views import View
+from rest_framework import status
+
+from .executor import InferenceQueueFull, inference_executor
+
+
+class AsyncAPIView(View):
+    """
+    Base class of the async JSON views served under ASGI.
+
+    DRF's APIView dispatches requests synchronously, so the async views are
+    plain Django views with coroutine handlers. Like APIView, they are exempt
+    from CSRF checks and their errors are JSON objects with a "detail" key.
+    The model calls are run by the inference executor with `run_inference`,
+    which turns a full queue into a 429 response.
+    """
+
+    # Seconds clients are asked to wait before retrying a rejected request
+    RETRY_AFTER = 1
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        view.csrf_exempt = True
+        return view
+
+    @staticmethod
+    def parse_json(request):
+        """
+        Returns the decoded JSON body of the request, or None if it is invalid.
+        """
+        try:
+            return json.loads(request.body or b"{}")
+        except (UnicodeDecodeError, json.JSONDecodeError):
+            return None
+
+    @staticmethod
+    def json_response(data, status=status.HTTP_200_OK, **kwargs):
+        return JsonResponse(data, status=status, safe=False, **kwargs)
+
+    async def run_inference(self, func, *args):
+        """
+        Runs a model call in the inference executor.
+
+        Returns:
+            tuple: The result of the call and None, or None and a 429 response
+                if the executor is saturated.
+        """
+        try:
+            return await inference_executor.run(func, *args), None
+        except InferenceQueueFull:
+            return None, self.json_response(
+                {"detail": "Too many prediction requests, retry later."},
+                status=status.HTTP_429_TOO_MANY_REQUESTS,
+                headers={"Retry-After": str(self.RETRY_AFTER)},
+            )
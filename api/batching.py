@@ -0,0 +1,137 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from .metrics import Histogram
+
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+class MicroBatcher:
+    """
+    Groups the single-row predictions requested concurrently by several
+    threads into batches, so that the model is called once per batch.
+
+    Callers submit one item each and wait for its result. A background thread
+    takes the first waiting item, collects the items submitted until the batch
+    has max_batch_size items or max_wait seconds have passed, and calls
+    process_batch with the list of items, which returns one result per item
+    in the same order. If process_batch raises, every caller of the batch gets
+    the exception.
+
+    The depth of the queue seen by each submitted item and the size of each
+    batch are recorded in histograms, reported by `stats`.
+    """
+
+    instances = {}
+
+    def __init__(self, name, process_batch, max_batch_size, max_wait):
+        """
+        Parameters:
+            name (str): Name the batcher is reported under.
+            process_batch (callable): Function called with a list of items and
+                returning the list of their results.
+            max_batch_size (int): Maximum number of items per batch.
+            max_wait (float): Maximum number of seconds the first item of a
+                batch waits for others.
+        """
+        self.name = name
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.queue_depth = Histogram(SIZE_BUCKETS)
+        self.batch_size = Histogram(SIZE_BUCKETS)
+        self._queue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._pid = None
+        MicroBatcher.instances[name] = self
+
+    def _ensure_worker(self):
+        # The worker thread is started on first use, and again in a forked
+        # process, which does not inherit the threads of its parent
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._queue = queue.SimpleQueue()
+                threading.Thread(
+                    target=self._work, name=f"batcher-{self.name}", daemon=True
+                ).start()
+                self._pid = os.getpid()
+
+    def submit(self, item):
+        """
+        Queues an item and returns the Future of its result.
+        """
+        self._ensure_worker()
+        future = Future()
+        self.queue_depth.observe(self._queue.qsize())
+        self._queue.put((item, future))
+        return future
+
+    def run(self, item):
+        """
+        Queues an item and waits for its result.
+        """
+        return self.submit(item).result()
+
+    def _work(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                try:
+                    if timeout > 0:
+                        batch.append(self._queue.get(timeout=timeout))
+                    else:
+                        batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._process(batch)
+
+    def _process(self, batch):
+        batch = [
+            (item, future)
+            for item, future in batch
+            if future.set_running_or_notify_cancel()
+        ]
+        if not batch:
+            return
+        self.batch_size.observe(len(batch))
+        try:
+            results = self.process_batch([item for item, _ in batch])
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+    def stats(self):
+        """
+        Returns the configuration and histograms of the batcher.
+        """
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "queue_depth": self.queue_depth.snapshot(),
+            "batch_size": self.batch_size.snapshot(),
+        }
+
+
+def group_by_model(items):
+    """
+    Groups the items of a batch by the model instance they were submitted for,
+    their first element. Items only differ around a model swap, when requests
+    for the old and the new version are batched together.
+
+    Returns:
+        list: Each model with the list of the indexes of its items.
+    """
+    groups = {}
+    for i, item in enumerate(items):
+        groups.setdefault(id(item[0]), (item[0], []))[1].append(i)
+    return list(groups.values())
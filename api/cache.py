@@ -0,0 +1,99 @@
+import hashlib
+import json
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+
+MISSING = object()
+
+
+class PredictionCache:
+    """
+    Caches prediction results in a Django cache, so that resubmitting the same
+    form does not recompute the prediction.
+
+    Entries are keyed on a hash of the canonical JSON of the validated input
+    and on the version of the model that computed them (see
+    api.loading.artifact_version), so a new model file never serves results
+    of the previous one. Eviction and expiry are left to the cache backend
+    configured under the PREDICTION_CACHE_ALIAS alias (bounded LRU with an
+    optional TTL for the default local-memory backend).
+    """
+
+    def __init__(self, alias):
+        self.alias = alias
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    @staticmethod
+    def make_key(namespace, version, input_data):
+        """
+        Returns the cache key of a prediction.
+
+        Parameters:
+            namespace (str): What is predicted, including any option that
+                changes the result.
+            version (str): Version of the model.
+            input_data (dict): Validated input of the prediction.
+        """
+        payload = json.dumps(
+            input_data, sort_keys=True, separators=(",", ":"), default=str
+        )
+        digest = hashlib.sha256(payload.encode()).hexdigest()
+        return f"{namespace}:{version}:{digest}"
+
+    def get_or_compute(self, namespace, version, input_data, compute, cacheable=None):
+        """
+        Returns the cached result of a prediction, or computes and caches it.
+
+        Parameters:
+            namespace (str): What is predicted, see make_key.
+            version (str): Version of the model.
+            input_data (dict): Validated input of the prediction.
+            compute (callable): Function without arguments computing the result.
+            cacheable (callable): Optional predicate telling whether a computed
+                result may be cached, e.g. to skip errors.
+        """
+        if not settings.PREDICTION_CACHE_ENABLED:
+            return compute()
+
+        key = self.make_key(namespace, version, input_data)
+        result = self.cache.get(key, MISSING)
+        if result is not MISSING:
+            self._count(hit=True)
+            return result
+
+        self._count(hit=False)
+        result = compute()
+        if cacheable is None or cacheable(result):
+            self.cache.set(key, result)
+        return result
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def stats(self):
+        """
+        Returns the hit and miss counters of the current process.
+        """
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": hits / lookups if lookups else 0.0,
+        }
+
+
+prediction_cache = PredictionCache(settings.PREDICTION_CACHE_ALIAS)
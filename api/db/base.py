@@ -0,0 +1,32 @@
+from collections import OrderedDict
+
+from bson.codec_options import CodecOptions
+from djongo import base
+
+from api.mongo import get_client
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    djongo database backend running on the MongoClient shared by the process
+    (see api.mongo.get_client) instead of a client of its own.
+
+    Closing a connection, which Django does at the end of every request,
+    releases it without closing the shared client, so its pooled connections
+    are reused by the next requests.
+    """
+
+    def get_new_connection(self, connection_params):
+        # Same database as djongo's, documents decoded as OrderedDicts
+        database = get_client().get_database(
+            connection_params["name"],
+            codec_options=CodecOptions(document_class=OrderedDict),
+        )
+        self.client_connection = database.client
+        self.djongo_connection = base.DjongoClient(
+            database, connection_params["enforce_schema"]
+        )
+        return database
+
+    def _close(self):
+        pass
@@ -0,0 +1,116 @@
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from threadpoolctl import threadpool_limits
+
+
+class InferenceQueueFull(Exception):
+    """
+    Raised when a task is submitted to an InferenceExecutor whose workers are
+    busy and whose queue is full.
+    """
+
+
+class InferenceExecutor:
+    """
+    Bounded pool of threads running the model calls of the async views, so
+    that predictions and SHAP explanations do not block the event loop.
+
+    Threads share the models loaded by the registry, and sklearn, numba and
+    SHAP release the GIL in their native loops. OpenMP's and numba's threads
+    are limited to `threads_per_worker` threads when each worker thread
+    starts, so that the workers do not oversubscribe the CPU cores between
+    them, without changing the limits of the other threads of the process.
+    BLAS limits are process-wide and are left alone; the tree models do not
+    call BLAS.
+
+    At most `max_workers` tasks run at a time and `max_queue` more wait for a
+    worker; beyond that, `run` raises InferenceQueueFull so that the view can
+    reject the request instead of letting the queue grow without bound.
+    """
+
+    def __init__(self, max_workers, max_queue, threads_per_worker=1):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.threads_per_worker = threads_per_worker
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # numba's threading layer hangs the interpreter at exit when it
+                # is first launched from a worker thread
+                self._set_numba_threads()
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="inference",
+                    initializer=self._init_worker,
+                )
+            return self._executor
+
+    def _init_worker(self):
+        # OpenMP's number of threads is set per calling thread, and is kept
+        # for the lifetime of the worker, unlike BLAS's which is global
+        threadpool_limits(limits=self.threads_per_worker, user_api="openmp")
+        self._set_numba_threads()
+
+    def _set_numba_threads(self):
+        # numba's number of threads is set per calling thread
+        import numba
+
+        numba.set_num_threads(
+            min(self.threads_per_worker, numba.config.NUMBA_NUM_THREADS)
+        )
+
+    @property
+    def pending(self):
+        """
+        Number of tasks running or waiting for a worker.
+        """
+        return self._pending
+
+    async def run(self, func, *args):
+        """
+        Runs func(*args) in a worker thread and returns its result. The
+        function runs in a copy of the context of the caller, so that the
+        stages it times are added to the request being served (see
+        api.timing).
+
+        Raises:
+            InferenceQueueFull: If max_workers + max_queue tasks are already
+                pending.
+        """
+        executor = self._get_executor()
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue:
+                raise InferenceQueueFull()
+            self._pending += 1
+        future = executor.submit(contextvars.copy_context().run, func, *args)
+        # Released when the task ends, even if the request is cancelled first
+        future.add_done_callback(self._release)
+        return await asyncio.wrap_future(future)
+
+    def _release(self, future):
+        with self._lock:
+            self._pending -= 1
+
+    def shutdown(self):
+        """
+        Waits for the running tasks and stops the worker threads.
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown()
+
+
+inference_executor = InferenceExecutor(
+    max_workers=settings.INFERENCE_WORKERS,
+    max_queue=settings.INFERENCE_QUEUE_SIZE,
+    threads_per_worker=settings.INFERENCE_THREADS_PER_WORKER,
+)
@@ -0,0 +1,127 @@
+import numpy as np
+
+
+class FeatureSchema:
+    """
+    Maps validated input records (dicts) to the feature matrix of a model.
+
+    The feature order and the default value of each feature are resolved once,
+    when the schema is created. Records are then written straight into one
+    contiguous float64 matrix, one row per record and one column per feature,
+    without copying or reordering the records first. A feature that is absent
+    from a record, None or an empty string takes its default value and is
+    flagged in the optional missing-value mask.
+    """
+
+    def __init__(self, features, defaults=None, default=0.0):
+        """
+        Parameters:
+            features (sequence): Names of the features, in the column order of
+                the model.
+            defaults (dict): Default value of some features.
+            default (float): Default value of the other features.
+        """
+        defaults = defaults or {}
+        self.features = tuple(features)
+        self.defaults = np.array(
+            [defaults.get(feature, default) for feature in self.features],
+            dtype=np.float64,
+        )
+        self._columns = tuple(enumerate(self.features))
+
+    @property
+    def n_features(self):
+        return len(self.features)
+
+    def empty(self, n_records):
+        """
+        Returns an uninitialized matrix for n_records records, to be reused as
+        the `out` argument of transform.
+        """
+        return np.empty((n_records, self.n_features), dtype=np.float64)
+
+    def transform(self, records, out=None, missing=None):
+        """
+        Writes the features of a list of records into a matrix.
+
+        Parameters:
+            records (list): Input records.
+            out (ndarray): Optional float64 matrix of shape
+                (len(records), n_features) the features are written into,
+                allocated when not given.
+            missing (ndarray): Optional boolean array of the same shape, set
+                to True where a feature is missing from a record.
+
+        Returns:
+            ndarray: The feature matrix.
+        """
+        if out is None:
+            out = self.empty(len(records))
+        elif out.shape != (len(records), self.n_features):
+            raise ValueError(
+                f"out has shape {out.shape}, expected "
+                f"{(len(records), self.n_features)}."
+            )
+        out[:] = self.defaults
+        if missing is not None:
+            missing[:] = True
+
+        for i, record in enumerate(records):
+            row = out[i]
+            for j, feature in self._columns:
+                value = record.get(feature)
+                if value is None or value == "":
+                    continue
+                row[j] = value
+                if missing is not None:
+                    missing[i, j] = False
+        return out
+
+    def transform_frame(self, frame, out=None, missing=None):
+        """
+        Writes the features of the rows of a pandas DataFrame into a matrix,
+        one column at a time instead of one record at a time. A feature whose
+        column is absent from the frame, or whose value is missing or not a
+        number, takes its default value.
+
+        Parameters:
+            frame (DataFrame): Input records, one per row.
+            out (ndarray): See transform.
+            missing (ndarray): See transform.
+
+        Returns:
+            ndarray: The feature matrix.
+        """
+        # Imported on demand, serving single records does not need pandas
+        import pandas as pd
+
+        if out is None:
+            out = self.empty(len(frame))
+        elif out.shape != (len(frame), self.n_features):
+            raise ValueError(
+                f"out has shape {out.shape}, expected "
+                f"{(len(frame), self.n_features)}."
+            )
+
+        for j, feature in self._columns:
+            if feature not in frame.columns:
+                out[:, j] = self.defaults[j]
+                if missing is not None:
+                    missing[:, j] = True
+                continue
+            values = pd.to_numeric(frame[feature], errors="coerce").to_numpy(
+                dtype=np.float64, na_value=np.nan
+            )
+            absent = np.isnan(values)
+            np.copyto(out[:, j], values)
+            out[absent, j] = self.defaults[j]
+            if missing is not None:
+                missing[:, j] = absent
+        return out
+
+    def transform_one(self, record, out=None, missing=None):
+        """
+        Writes the features of a single record into a matrix of one row, see
+        transform.
+        """
+        return self.transform((record,), out=out, missing=missing)
@@ -0,0 +1,25 @@
+INFERENCE_BACKENDS = ("sklearn", "numba")
+
+
+def build_inference_engine(model, backend="sklearn"):
+    """
+    Returns the object whose predict method a predictor calls for a model.
+
+    Parameters:
+        model: Fitted sklearn estimator.
+        backend (str): "sklearn" to call the estimator itself, "numba" to
+            evaluate its trees with the compiled engine of api.tree_engine.
+
+    Returns:
+        object: An object with the predict method of the estimator.
+    """
+    if backend == "sklearn":
+        return model
+    if backend == "numba":
+        # Imported on demand so that numba is only initialised when used
+        from .tree_engine import CompiledTreeEnsemble
+
+        return CompiledTreeEnsemble.from_estimator(model)
+    raise ValueError(
+        f"Unknown inference backend {backend!r}, expected one of {INFERENCE_BACKENDS}."
+    )
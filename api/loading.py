@@ -0,0 +1,138 @@
+import hashlib
+import json
+import os
+
+import joblib
+from django.conf import settings
+
+from .artifacts import compiled_path, load_compiled_artifact, read_meta
+
+MANIFEST_NAME = "manifest.json"
+
+
+def load_model(path):
+    """
+    Loads a joblib model artifact.
+
+    When MODEL_MMAP is enabled, the numpy arrays of an uncompressed artifact
+    (see the export_models command) are memory-mapped read-only instead of
+    being copied into the process, so that every worker of the machine reads
+    the same pages from the OS page cache. Compressed artifacts are loaded in
+    memory as before.
+
+    Parameters:
+        path (str): Path to the joblib artifact.
+
+    Returns:
+        object: The deserialized model.
+    """
+    mmap_mode = "r" if settings.MODEL_MMAP else None
+    return joblib.load(path, mmap_mode=mmap_mode)
+
+
+def load_compiled(path, backend="sklearn"):
+    """
+    Returns the compiled artifact of a joblib artifact (see the compile_models
+    command), or None if MODEL_COMPILED is disabled or there is no compiled
+    artifact compiled from the current content of the joblib file.
+
+    A compiled artifact loads without unpickling: its arrays are read (or
+    memory-mapped, with MODEL_MMAP) straight from .npy files.
+
+    Parameters:
+        path (str): Path to the joblib artifact.
+        backend (str): Inference backend of the predictor, compiled trees are
+            evaluated with numba for "numba" and with numpy otherwise.
+
+    Returns:
+        object: The compiled model or scaler, or None.
+    """
+    if not settings.MODEL_COMPILED:
+        return None
+    compiled = compiled_path(path)
+    meta = read_meta(compiled)
+    if meta is None or not os.path.exists(path):
+        return None
+    # The fingerprint changes when the file is copied, the content hash is
+    # only computed in that case
+    if meta["source_version"] != artifact_version(path):
+        if meta.get("source_sha1") != file_sha1(path):
+            return None
+    return load_compiled_artifact(
+        compiled,
+        mmap_mode="r" if settings.MODEL_MMAP else None,
+        jit=backend == "numba",
+    )
+
+
+def file_sha1(path):
+    """
+    Returns the SHA-1 of the content of a file.
+    """
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def artifact_version(*paths):
+    """
+    Returns a short fingerprint of model artifacts, computed from their name,
+    size and modification time. It changes whenever one of the files is
+    replaced, and is used to version cached predictions.
+
+    Parameters:
+        *paths (str): Paths to the artifacts of a model.
+
+    Returns:
+        str: Hexadecimal fingerprint of the artifacts.
+    """
+    digest = hashlib.sha1()
+    for path in paths:
+        stat = os.stat(path)
+        digest.update(
+            f"{os.path.basename(path)}:{stat.st_size}:{stat.st_mtime_ns};".encode()
+        )
+    return digest.hexdigest()[:12]
+
+
+def read_manifest(models_dir, default_artifacts):
+    """
+    Returns the version and the artifact paths of the current model of an app.
+
+    The current model is described by the manifest.json file of the models
+    directory, which lists its artifacts by role and optionally names its
+    version, e.g.:
+
+        {
+            "version": "2024-05-01",
+            "artifacts": {
+                "model": "gradient_boosting_model-2024-05-01.joblib",
+                "scaler": "scaler-2024-05-01.joblib"
+            }
+        }
+
+    Deploying a new model is then a matter of copying its artifacts to the
+    directory and replacing the manifest. Paths are relative to the models
+    directory. Without a manifest, the default artifacts are used. Without a
+    version, the version is the fingerprint of the artifacts.
+
+    Parameters:
+        models_dir (str): Directory of the artifacts and the manifest.
+        default_artifacts (dict): Path of each artifact without a manifest.
+
+    Returns:
+        tuple: The version (str) and the path of each artifact (dict).
+    """
+    try:
+        with open(os.path.join(models_dir, MANIFEST_NAME), encoding="utf-8") as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        manifest = {}
+
+    artifacts = dict(default_artifacts)
+    for role, path in manifest.get("artifacts", {}).items():
+        artifacts[role] = os.path.join(models_dir, path)
+    version = manifest.get("version") or artifact_version(*artifacts.values())
+    return str(version), artifacts
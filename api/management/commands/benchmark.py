@@ -0,0 +1,278 @@
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+
+from api import standins
+from api.memory import current_rss
+from api.registry import registry
+from heart_disease.constants import SAMPLE_INPUT as HEART_DISEASE_SAMPLE_INPUT
+
+from .load_test import PRICE_PILOT_SAMPLE_INPUT
+
+# Metrics compared with the baseline, and whether higher values are better
+GATED_METRICS = {
+    "p50_ms": False,
+    "p95_ms": False,
+    "throughput": True,
+    "peak_rss_mb": False,
+}
+
+
+class RssSampler:
+    """
+    Samples the resident set size of the process in a background thread, to
+    report its peak over a scenario.
+    """
+
+    def __init__(self, interval=0.02):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.peak = current_rss()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, current_rss())
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmarks the hot paths of the API offline, with stand-in models trained "
+        "on synthetic data and an in-memory mongomock database: the predictors, the "
+        "car name list, the bulk car ingestion and full DRF request round-trips. "
+        "Reports the p50/p95/p99 latency, the throughput and the peak RSS of each "
+        "scenario, saves them as the baseline with --save-baseline, and fails when "
+        "a scenario regresses past --threshold compared with the baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--duration",
+            type=float,
+            default=2.0,
+            help="Seconds each scenario runs for, after a short warm-up.",
+        )
+        parser.add_argument(
+            "--scenarios",
+            nargs="+",
+            help="Names (or name prefixes) of the scenarios to run, all by default.",
+        )
+        parser.add_argument(
+            "--baseline",
+            default=os.path.join(settings.BASE_DIR, "benchmarks", "baseline.json"),
+            help="File of the baseline results.",
+        )
+        parser.add_argument(
+            "--save-baseline",
+            action="store_true",
+            help="Save the results as the new baseline instead of comparing them.",
+        )
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=0.25,
+            help="Relative regression of a metric that fails the comparison.",
+        )
+
+    def handle(self, *args, **options):
+        # Baselines are only comparable on the same machine, none is committed
+        if not options["save_baseline"] and not os.path.exists(options["baseline"]):
+            raise CommandError(
+                f"No baseline to compare with at {options['baseline']}, run the "
+                "benchmark with --save-baseline on the reference commit first."
+            )
+
+        with tempfile.TemporaryDirectory() as directory:
+            self.stdout.write("Training the stand-in models...")
+            try:
+                standins.install(directory)
+            except ImportError as e:
+                raise CommandError(
+                    f"Install {e.name} to run the benchmark suite "
+                    "(pip install -r requirements-dev.txt)."
+                )
+            results = self.run_scenarios(options)
+
+        if options["save_baseline"]:
+            os.makedirs(os.path.dirname(options["baseline"]), exist_ok=True)
+            with open(options["baseline"], "w", encoding="utf-8") as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(f"Saved the baseline to {options['baseline']}")
+            return
+
+        with open(options["baseline"], encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = self.compare(results, baseline, options["threshold"])
+        if regressions:
+            raise CommandError("Performance regressions:\n" + "\n".join(regressions))
+        self.stdout.write("No regression compared with the baseline.")
+
+    def run_scenarios(self, options):
+        scenarios = self.scenarios()
+        if options["scenarios"]:
+            scenarios = [
+                scenario
+                for scenario in scenarios
+                if scenario[0].startswith(tuple(options["scenarios"]))
+            ]
+
+        self.stdout.write(
+            f"{'scenario':<40}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+            f"{'rows/s':>11}{'RSS MB':>9}"
+        )
+        results = {}
+        for name, func, rows in scenarios:
+            for _ in range(3):
+                func()
+            latencies = []
+            deadline = time.perf_counter() + options["duration"]
+            with RssSampler() as sampler:
+                while time.perf_counter() < deadline:
+                    start = time.perf_counter()
+                    func()
+                    latencies.append(time.perf_counter() - start)
+            latencies = np.array(latencies) * 1000
+            result = {
+                "p50_ms": float(np.percentile(latencies, 50)),
+                "p95_ms": float(np.percentile(latencies, 95)),
+                "p99_ms": float(np.percentile(latencies, 99)),
+                "throughput": rows * len(latencies) / (latencies.sum() / 1000),
+                "peak_rss_mb": sampler.peak / 1024,
+            }
+            results[name] = result
+            self.stdout.write(
+                f"{name:<40}{result['p50_ms']:>9.3f}{result['p95_ms']:>9.3f}"
+                f"{result['p99_ms']:>9.3f}{result['throughput']:>11.0f}"
+                f"{result['peak_rss_mb']:>9.1f}"
+            )
+        return results
+
+    def scenarios(self):
+        """
+        Returns the name, function and number of rows processed per call of
+        each scenario. Inputs vary between calls so that the prediction cache
+        is not hit.
+        """
+        rng = random.Random(0)
+        heart_disease = registry.get("heart_disease")
+        price_pilot = registry.get("price_pilot")
+        client = Client(HTTP_HOST="localhost")
+        cars = [standins.fake_car(rng) for _ in range(1000)]
+        bulk_body = json.dumps(cars)
+
+        def heart_disease_input():
+            return {
+                **HEART_DISEASE_SAMPLE_INPUT,
+                "trestbps": rng.randint(94, 200),
+                "chol": rng.randint(126, 564),
+                "thalach": rng.randint(71, 202),
+            }
+
+        def price_pilot_input():
+            return {**PRICE_PILOT_SAMPLE_INPUT, "mileage": rng.uniform(0, 250000)}
+
+        def post(path, data):
+            response = client.post(path, data, content_type="application/json")
+            if response.status_code >= 400:
+                raise CommandError(f"{path} returned {response.status_code}.")
+
+        def get(path, **headers):
+            response = client.get(path, **headers)
+            if response.status_code >= 400:
+                raise CommandError(f"{path} returned {response.status_code}.")
+            b"".join(response)
+
+        return [
+            (
+                "heart_disease.predict",
+                lambda: heart_disease.predict(heart_disease_input()),
+                1,
+            ),
+            (
+                "heart_disease.explain",
+                lambda: heart_disease.explain(heart_disease_input()),
+                1,
+            ),
+            (
+                "price_pilot.preprocess_input",
+                lambda: price_pilot.preprocess_input(price_pilot_input()),
+                1,
+            ),
+            (
+                "price_pilot.predict",
+                lambda: price_pilot.predict(
+                    price_pilot.preprocess_input(price_pilot_input())
+                ),
+                1,
+            ),
+            (
+                "http.heart_disease.predict",
+                lambda: post(
+                    "/api/v1/heart_disease/predict/", {"data": heart_disease_input()}
+                ),
+                1,
+            ),
+            (
+                "http.price_pilot.predict_price",
+                lambda: post(
+                    "/api/v1/price_pilot/predict_price/", {"data": price_pilot_input()}
+                ),
+                1,
+            ),
+            (
+                "http.price_pilot.car_names",
+                lambda: get("/api/v1/price_pilot/car_names/"),
+                1,
+            ),
+            (
+                "http.price_pilot.car_data_bulk.list",
+                lambda: get("/api/v1/price_pilot/car_data_bulk/?limit=100"),
+                100,
+            ),
+            (
+                "http.price_pilot.car_data_bulk.ingest",
+                lambda: post("/api/v1/price_pilot/car_data_bulk/", bulk_body),
+                len(cars),
+            ),
+        ]
+
+    @staticmethod
+    def compare(results, baseline, threshold):
+        """
+        Returns a description of each metric of each scenario that regressed
+        by more than the threshold compared with the baseline.
+        """
+        regressions = []
+        for name, result in results.items():
+            for metric, higher_is_better in GATED_METRICS.items():
+                reference = baseline.get(name, {}).get(metric)
+                if not reference:
+                    continue
+                change = result[metric] / reference - 1
+                if higher_is_better:
+                    change = reference / result[metric] - 1
+                if change > threshold:
+                    regressions.append(
+                        f"{name} {metric}: {result[metric]:.3f} against "
+                        f"{reference:.3f} in the baseline ({change:+.0%})"
+                    )
+        return regressions
@@ -0,0 +1,125 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from .load_test import ENDPOINTS
+
+# Run in a fresh interpreter: imports the WSGI application without warm-up and
+# times the first requests made to it
+PROBE = """
+import json
+import sys
+import time
+
+start = time.perf_counter()
+from IntelliAPI.wsgi import application
+timings = {"import wsgi app": time.perf_counter() - start}
+
+from django.test import Client
+
+client = Client(HTTP_HOST="localhost")
+for name, path, data in json.loads(sys.argv[1]):
+    start = time.perf_counter()
+    response = client.post(path, {"data": data}, content_type="application/json")
+    timings[name] = time.perf_counter() - start
+    if response.status_code != 200:
+        sys.exit(f"{path} returned {response.status_code}: {response.content!r}")
+print(json.dumps(timings))
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures the startup cost of the project, with joblib and with compiled "
+        "model artifacts (see MODEL_COMPILED and the compile_models command): the "
+        "duration of `manage.py check`, of importing the WSGI application without "
+        "warm-up, and of the first requests, each in a fresh process."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=3,
+            help="Number of fresh processes per measure, the median is reported.",
+        )
+        parser.add_argument(
+            "--modes",
+            nargs="+",
+            choices=["joblib", "compiled"],
+            default=["joblib", "compiled"],
+        )
+
+    def handle(self, *args, **options):
+        heart_path, _, heart_input, _ = ENDPOINTS["heart_disease"]
+        price_path, _, price_input, _ = ENDPOINTS["price_pilot"]
+        requests = [
+            ("first heart_disease", f"{heart_path}?explain=false", heart_input),
+            ("first price_pilot", price_path, price_input),
+            (
+                "first explanation",
+                heart_path,
+                {**heart_input, "chol": heart_input["chol"] + 1},
+            ),
+            (
+                "next heart_disease",
+                f"{heart_path}?explain=false",
+                {**heart_input, "chol": heart_input["chol"] + 2},
+            ),
+        ]
+
+        results = {}
+        for mode in options["modes"]:
+            env = {
+                **os.environ,
+                "MODEL_COMPILED": str(mode == "compiled"),
+                "MODEL_WARMUP": "False",
+            }
+            runs = [
+                {"manage.py check": self.time_check(env)}
+                | self.run_probe(env, requests)
+                for _ in range(options["repeat"])
+            ]
+            results[mode] = {
+                name: statistics.median(run[name] for run in runs) for name in runs[0]
+            }
+
+        modes = list(results)
+        self.stdout.write(
+            f"{'median seconds':<24}" + "".join(f"{m:>12}" for m in modes)
+        )
+        for name in results[modes[0]]:
+            self.stdout.write(
+                f"{name:<24}"
+                + "".join(f"{results[mode][name]:>12.3f}" for mode in modes)
+            )
+
+    @staticmethod
+    def time_check(env):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, os.path.join(settings.BASE_DIR, "manage.py"), "check"],
+            env=env,
+            check=True,
+            capture_output=True,
+        )
+        return time.perf_counter() - start
+
+    @staticmethod
+    def run_probe(env, requests):
+        process = subprocess.run(
+            [sys.executable, "-c", PROBE, json.dumps(requests)],
+            env=env,
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            text=True,
+        )
+        if process.returncode != 0:
+            raise CommandError(process.stderr.strip())
+        return json.loads(process.stdout.strip().splitlines()[-1])
@@ -0,0 +1,87 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from api.loading import load_model
+from api.tree_engine import CompiledTreeEnsemble
+from heart_disease.constants import MODEL_PATH as HEART_DISEASE_MODEL_PATH
+from price_pilot.predictor import MODEL_PATH as PRICE_PILOT_MODEL_PATH
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the p50/p99 latency of sklearn's predict with the compiled numba "
+        "tree engine for batches of 1, 100 and 10000 rows, and checks that both "
+        "return identical predictions."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "models",
+            nargs="*",
+            help="Model artifacts to benchmark, defaults to the models of both apps.",
+        )
+        parser.add_argument(
+            "--batch-sizes",
+            type=int,
+            nargs="+",
+            default=[1, 100, 10000],
+            help="Number of rows per predict call.",
+        )
+        parser.add_argument(
+            "--iterations",
+            type=int,
+            default=200,
+            help="Number of timed calls per batch size (fewer for large batches).",
+        )
+
+    def handle(self, *args, **options):
+        paths = options["models"] or [HEART_DISEASE_MODEL_PATH, PRICE_PILOT_MODEL_PATH]
+        rng = np.random.default_rng(0)
+
+        for path in paths:
+            model = load_model(path)
+            engine = CompiledTreeEnsemble.from_estimator(model)
+            self.stdout.write(f"\n{path} ({type(model).__name__})")
+            self.stdout.write(f"{'rows':>8}{'backend':>10}{'p50 ms':>12}{'p99 ms':>12}")
+
+            for batch_size in options["batch_sizes"]:
+                X = self.sample_inputs(engine, batch_size, rng)
+                if not np.array_equal(model.predict(X), engine.predict(X)):
+                    raise CommandError(
+                        f"The numba engine and sklearn disagree on {path}."
+                    )
+
+                iterations = max(5, options["iterations"] * 100 // max(batch_size, 100))
+                for backend, predict in (
+                    ("sklearn", model.predict),
+                    ("numba", engine.predict),
+                ):
+                    timings = []
+                    for _ in range(iterations):
+                        start = time.perf_counter()
+                        predict(X)
+                        timings.append((time.perf_counter() - start) * 1000)
+                    p50, p99 = np.percentile(timings, [50, 99])
+                    self.stdout.write(
+                        f"{batch_size:>8}{backend:>10}{p50:>12.4f}{p99:>12.4f}"
+                    )
+
+    @staticmethod
+    def sample_inputs(engine, batch_size, rng):
+        """
+        Draws inputs around the split thresholds of each feature, so that the
+        traversals go down realistic paths of the trees.
+        """
+        X = np.empty((batch_size, engine.n_features), dtype=np.float64)
+        internal = engine.children_left != -1
+        for j in range(engine.n_features):
+            thresholds = engine.threshold[internal & (engine.feature == j)]
+            if len(thresholds) == 0:
+                X[:, j] = 0.0
+            else:
+                X[:, j] = rng.uniform(
+                    thresholds.min() - 1, thresholds.max() + 1, batch_size
+                )
+        return X
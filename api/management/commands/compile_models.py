@@ -0,0 +1,69 @@
+import glob
+import os
+import shutil
+
+import joblib
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.artifacts import compile_artifact, compiled_path, load_compiled_artifact
+from api.loading import artifact_version, file_sha1
+
+
+class Command(BaseCommand):
+    help = (
+        "Compiles joblib model artifacts to array-backed artifacts (a directory of "
+        ".npy files and a meta.json file next to each artifact) that load without "
+        "unpickling, see MODEL_COMPILED. Tree ensembles are flattened to the node "
+        "arrays of the compiled tree engine and checked to predict like the "
+        "original estimator."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "paths",
+            nargs="*",
+            help="Artifacts to compile, defaults to every <app>/models/*.joblib file.",
+        )
+
+    def handle(self, *args, **options):
+        paths = options["paths"] or sorted(
+            glob.glob(os.path.join(settings.BASE_DIR, "*", "models", "*.joblib"))
+        )
+        for path in paths:
+            obj = joblib.load(path)
+            target = compiled_path(path)
+            temporary_path = f"{target}.tmp"
+            shutil.rmtree(temporary_path, ignore_errors=True)
+            try:
+                compile_artifact(
+                    obj, temporary_path, artifact_version(path), file_sha1(path)
+                )
+            except (TypeError, ValueError) as e:
+                shutil.rmtree(temporary_path, ignore_errors=True)
+                self.stderr.write(f"Skipped {path}: {e}")
+                continue
+
+            if not self.predicts_like(obj, load_compiled_artifact(temporary_path)):
+                shutil.rmtree(temporary_path, ignore_errors=True)
+                raise CommandError(
+                    f"The compiled {path} does not predict like the original."
+                )
+            shutil.rmtree(target, ignore_errors=True)
+            os.replace(temporary_path, target)
+            size = sum(
+                os.path.getsize(os.path.join(target, name))
+                for name in os.listdir(target)
+            )
+            self.stdout.write(f"Compiled {path} to {target} ({size} bytes)")
+
+    @staticmethod
+    def predicts_like(obj, compiled):
+        X = np.random.default_rng(0).normal(size=(1000, obj.n_features_in_))
+        if hasattr(obj, "feature_names_in_"):
+            X = pd.DataFrame(X, columns=obj.feature_names_in_)
+        if hasattr(obj, "predict"):
+            return np.array_equal(obj.predict(X), compiled.predict(X))
+        return np.array_equal(obj.transform(X), compiled.transform(X))
@@ -0,0 +1,31 @@
+import glob
+import os
+
+import joblib
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = (
+        "Rewrites joblib model artifacts without compression, so that their numpy "
+        "arrays can be memory-mapped and shared between workers (see MODEL_MMAP)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "paths",
+            nargs="*",
+            help="Artifacts to rewrite, defaults to every <app>/models/*.joblib file.",
+        )
+
+    def handle(self, *args, **options):
+        paths = options["paths"] or sorted(
+            glob.glob(os.path.join(settings.BASE_DIR, "*", "models", "*.joblib"))
+        )
+        for path in paths:
+            model = joblib.load(path)
+            temporary_path = f"{path}.tmp"
+            joblib.dump(model, temporary_path)
+            os.replace(temporary_path, path)
+            self.stdout.write(f"Exported {path} ({os.path.getsize(path)} bytes)")
@@ -0,0 +1,179 @@
+import http.client
+import json
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from heart_disease.constants import SAMPLE_INPUT as HEART_DISEASE_SAMPLE_INPUT
+
+PRICE_PILOT_SAMPLE_INPUT = {
+    "name": "Peugeot 208",
+    "year": 2019,
+    "origin": True,
+    "technical_inspection": True,
+    "first_hand": True,
+    "mileage": 45000.0,
+    "fuel_type": "Essence",
+    "transmission": "Manuelle",
+    "num_doors": 5,
+    "num_seats": 5,
+    "power": 100,
+    "co2_emission": 110.0,
+    "length": 4.05,
+    "critair_rating": 1,
+    "combined_consumption": 5.2,
+}
+
+# Path of the sync and async prediction endpoints, sample input and the field
+# varied between requests so that they are not served by the prediction cache
+ENDPOINTS = {
+    "heart_disease": (
+        "/api/v1/heart_disease/predict/",
+        "/api/v1/heart_disease/predict_async/",
+        HEART_DISEASE_SAMPLE_INPUT,
+        "chol",
+    ),
+    "price_pilot": (
+        "/api/v1/price_pilot/predict_price/",
+        "/api/v1/price_pilot/predict_price_async/",
+        PRICE_PILOT_SAMPLE_INPUT,
+        "mileage",
+    ),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Load tests the sync and async prediction endpoints of a running server "
+        "with concurrent clients, and reports the throughput, p50/p99 latency and "
+        "rejected (429) requests of each."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--base-url",
+            default="http://127.0.0.1:8000",
+            help="URL of the server under test.",
+        )
+        parser.add_argument(
+            "--apps",
+            nargs="+",
+            choices=sorted(ENDPOINTS),
+            default=sorted(ENDPOINTS),
+            help="Apps whose prediction endpoints are tested.",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            nargs="+",
+            default=[1, 8, 32],
+            help="Numbers of concurrent clients.",
+        )
+        parser.add_argument(
+            "--duration",
+            type=float,
+            default=10.0,
+            help="Seconds each endpoint is tested for, per number of clients.",
+        )
+        parser.add_argument(
+            "--repeat-input",
+            action="store_true",
+            help="Send the same input in every request, to test cache hits.",
+        )
+
+    def handle(self, *args, **options):
+        url = urlsplit(options["base_url"])
+        if url.scheme not in ("http", "https") or not url.hostname:
+            raise CommandError(f"Invalid base URL {options['base_url']!r}.")
+
+        self.stdout.write(
+            f"{'endpoint':<44}{'clients':>8}{'req/s':>10}{'p50 ms':>10}"
+            f"{'p99 ms':>10}{'429':>8}{'errors':>8}"
+        )
+        for app in options["apps"]:
+            sync_path, async_path, sample_input, varied_field = ENDPOINTS[app]
+            for path in (sync_path, async_path):
+                for clients in options["concurrency"]:
+                    result = self.run_load(
+                        url,
+                        url.path.rstrip("/") + path,
+                        sample_input,
+                        None if options["repeat_input"] else varied_field,
+                        clients,
+                        options["duration"],
+                    )
+                    self.stdout.write(
+                        f"{path:<44}{clients:>8}{result['throughput']:>10.1f}"
+                        f"{result['p50']:>10.2f}{result['p99']:>10.2f}"
+                        f"{result['rejected']:>8}{result['errors']:>8}"
+                    )
+
+    def run_load(self, url, path, sample_input, varied_field, clients, duration):
+        """
+        Sends requests from the given number of client threads, each with its
+        own keep-alive connection, for the given number of seconds.
+        """
+        latencies, counts = [], {"rejected": 0, "errors": 0}
+        lock = threading.Lock()
+        deadline = time.perf_counter() + duration
+
+        def client():
+            connection_class = (
+                http.client.HTTPSConnection
+                if url.scheme == "https"
+                else http.client.HTTPConnection
+            )
+            connection = connection_class(url.hostname, url.port, timeout=30)
+            rng = random.Random()
+            local_latencies, rejected, errors = [], 0, 0
+            while time.perf_counter() < deadline:
+                input_data = dict(sample_input)
+                if varied_field is not None:
+                    input_data[varied_field] = round(
+                        input_data[varied_field] * rng.uniform(0.5, 1.5)
+                    )
+                body = json.dumps({"data": input_data})
+                start = time.perf_counter()
+                try:
+                    connection.request(
+                        "POST",
+                        path,
+                        body=body,
+                        headers={"Content-Type": "application/json"},
+                    )
+                    response = connection.getresponse()
+                    response.read()
+                except (OSError, http.client.HTTPException):
+                    errors += 1
+                    connection.close()
+                    continue
+                elapsed = time.perf_counter() - start
+                if response.status == 429:
+                    rejected += 1
+                elif response.status != 200:
+                    errors += 1
+                else:
+                    local_latencies.append(elapsed)
+            connection.close()
+            with lock:
+                latencies.extend(local_latencies)
+                counts["rejected"] += rejected
+                counts["errors"] += errors
+
+        threads = [threading.Thread(target=client) for _ in range(clients)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        latencies = np.array(latencies or [np.nan]) * 1000
+        return {
+            "throughput": np.count_nonzero(~np.isnan(latencies)) / duration,
+            "p50": np.percentile(latencies, 50),
+            "p99": np.percentile(latencies, 99),
+            **counts,
+        }
@@ -0,0 +1,92 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.scoring import PREDICTOR_LOADERS, score_file
+
+
+class Command(BaseCommand):
+    help = (
+        "Scores a CSV or Parquet file of cars (price_pilot) or patients "
+        "(heart_disease) offline, with the model served by the API. The file is "
+        "read, predicted and written in chunks, spread over a pool of worker "
+        "processes, so it can be larger than the memory. Each row of the input is "
+        "written to the output with its prediction and, with --explain, the SHAP "
+        "value of each feature or, with --quantiles, the spread of the price "
+        "predicted by the trees of the forest. The format of each file is given by its "
+        "extension: .parquet or .pq for Parquet (which needs pyarrow), CSV "
+        "otherwise."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("model", choices=sorted(PREDICTOR_LOADERS))
+        parser.add_argument("input", help="CSV or Parquet file to score.")
+        parser.add_argument("output", help="CSV or Parquet file to write.")
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=50000,
+            help="Number of rows read and scored together.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Number of worker processes, 1 to score in this process.",
+        )
+        parser.add_argument(
+            "--explain",
+            action="store_true",
+            help="Add a shap_<feature> column per feature (heart_disease only).",
+        )
+        parser.add_argument(
+            "--quantiles",
+            type=float,
+            nargs="+",
+            help=(
+                "Add a price_std column and a price_q<quantile> column per "
+                "quantile of the tree predictions (price_pilot only)."
+            ),
+        )
+
+    def handle(self, *args, **options):
+        score_options = {}
+        if options["explain"]:
+            if options["model"] != "heart_disease":
+                raise CommandError("--explain is only supported by heart_disease.")
+            score_options["explain"] = True
+        if options["quantiles"]:
+            if options["model"] != "price_pilot":
+                raise CommandError("--quantiles is only supported by price_pilot.")
+            if not all(0 <= q <= 1 for q in options["quantiles"]):
+                raise CommandError("Quantiles must be between 0 and 1.")
+            score_options["quantiles"] = tuple(options["quantiles"])
+        if not os.path.exists(options["input"]):
+            raise CommandError(f"{options['input']} does not exist.")
+
+        start = time.perf_counter()
+
+        def report(rows):
+            if options["verbosity"] >= 2:
+                elapsed = time.perf_counter() - start
+                self.stdout.write(f"{rows} rows scored, {rows / elapsed:.0f} rows/s")
+
+        try:
+            rows = score_file(
+                options["model"],
+                options["input"],
+                options["output"],
+                chunk_size=options["chunk_size"],
+                workers=options["workers"],
+                on_chunk=report,
+                **score_options,
+            )
+        except ImportError as e:
+            raise CommandError(f"Install {e.name} to score {options['input']}.")
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f"Scored {rows} rows in {elapsed:.1f} s ({rows / elapsed:.0f} rows/s), "
+            f"written to {options['output']}"
+        )
@@ -0,0 +1,55 @@
+import os
+import resource
+
+SMAPS_ROLLUP_PATH = "/proc/self/smaps_rollup"
+STATM_PATH = "/proc/self/statm"
+
+# Fields of /proc/self/smaps_rollup reported, in kB
+SMAPS_FIELDS = {
+    "Rss": "rss",
+    "Pss": "pss",
+    "Shared_Clean": "shared_clean",
+    "Shared_Dirty": "shared_dirty",
+    "Private_Clean": "private_clean",
+    "Private_Dirty": "private_dirty",
+}
+
+
+def memory_report():
+    """
+    Returns the memory usage of the current process in kB.
+
+    On Linux the report is read from /proc/self/smaps_rollup: `pss` charges
+    each shared page to the processes sharing it, and `uss` (private pages
+    only) is the memory that would be freed if the worker exited. Comparing
+    them across workers shows how much of the model memory is shared. On
+    other platforms only the peak resident set size reported by getrusage
+    is available.
+    """
+    report = {"pid": os.getpid()}
+    try:
+        with open(SMAPS_ROLLUP_PATH, "r") as file:
+            for line in file:
+                key, _, value = line.partition(":")
+                if key in SMAPS_FIELDS:
+                    report[SMAPS_FIELDS[key]] = int(value.split()[0])
+    except OSError:
+        report["max_rss"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return report
+
+    report["uss"] = report.get("private_clean", 0) + report.get("private_dirty", 0)
+    report["shared"] = report.get("shared_clean", 0) + report.get("shared_dirty", 0)
+    return report
+
+
+def current_rss():
+    """
+    Returns the current resident set size of the process in kB, or its peak
+    resident set size where /proc is not available.
+    """
+    try:
+        with open(STATM_PATH, "r") as file:
+            pages = int(file.read().split()[1])
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pages * os.sysconf("SC_PAGE_SIZE") // 1024
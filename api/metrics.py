@@ -0,0 +1,99 @@
+import bisect
+import threading
+
+
+class Histogram:
+    """
+    Thread-safe histogram of observed values, with cumulative bucket counts
+    like Prometheus histograms: each bucket counts the observations lower than
+    or equal to its upper bound, and the last one ("+Inf") all of them.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = tuple(sorted(buckets))
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def snapshot(self):
+        """
+        Returns the cumulative count of each bucket, the number of observations
+        and their sum.
+        """
+        with self._lock:
+            counts, total = list(self._counts), self._sum
+        buckets, cumulative = {}, 0
+        for bound, count in zip((*self.buckets, "+Inf"), counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        return {"buckets": buckets, "count": cumulative, "sum": total}
+
+
+class HistogramFamily:
+    """
+    Histograms of one metric, one per combination of label values, rendered
+    in the Prometheus text exposition format.
+    """
+
+    def __init__(self, name, documentation, label_names, buckets):
+        """
+        Parameters:
+            name (str): Name of the metric.
+            documentation (str): Description of the metric.
+            label_names (tuple): Names of the labels of the metric.
+            buckets (sequence): Upper bounds of the buckets of the histograms.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.buckets = buckets
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_values, value):
+        """
+        Records a value in the histogram of the given label values (a tuple of
+        strings, in the order of the label names).
+        """
+        histogram = self._histograms.get(label_values)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(
+                    label_values, Histogram(self.buckets)
+                )
+        histogram.observe(value)
+
+    def render(self):
+        """
+        Returns the histograms in the Prometheus text exposition format.
+        """
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram",
+        ]
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+        for label_values, histogram in histograms:
+            labels = ",".join(
+                f'{name}="{escape_label_value(value)}"'
+                for name, value in zip(self.label_names, label_values)
+            )
+            snapshot = histogram.snapshot()
+            for bound, count in snapshot["buckets"].items():
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f"{self.name}_sum{{{labels}}} {snapshot['sum']}")
+            lines.append(f"{self.name}_count{{{labels}}} {snapshot['count']}")
+        return "\n".join(lines) + "\n"
+
+
+def escape_label_value(value):
+    """
+    Escapes a label value for the Prometheus text exposition format.
+    """
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
@@ -0,0 +1,100 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .metrics import HistogramFamily
+from .timing import end_request, start_request
+
+# Upper bounds of the latency buckets, in seconds
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+request_duration = HistogramFamily(
+    "intelliapi_request_duration_seconds",
+    "Duration of the requests, by endpoint, method, status and model version.",
+    ("endpoint", "method", "status", "model_version"),
+    LATENCY_BUCKETS,
+)
+stage_duration = HistogramFamily(
+    "intelliapi_stage_duration_seconds",
+    "Duration of the stages of the requests, by endpoint, model version and stage.",
+    ("endpoint", "model_version", "stage"),
+    LATENCY_BUCKETS,
+)
+
+
+class TimingMiddleware:
+    """
+    Times every request and the stages recorded with api.timing.span while it
+    is served, and aggregates them into histograms per endpoint (URL pattern)
+    and model version, exposed on /metrics.
+
+    With SERVER_TIMING_ENABLED, the durations of the stages of a request are
+    also returned in its Server-Timing header, which browsers show next to the
+    request in their developer tools.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        timing, token = start_request()
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            end_request(token)
+        self.record(request, response, timing, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        timing, token = start_request()
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            end_request(token)
+        self.record(request, response, timing, time.perf_counter() - start)
+        return response
+
+    @staticmethod
+    def record(request, response, timing, duration):
+        # Requests that match no URL pattern share a label, so that scanners
+        # do not create a histogram per URL
+        match = request.resolver_match
+        endpoint = match.route if match is not None else "unmatched"
+        version = str(timing.labels.get("model_version") or "")
+        request_duration.observe(
+            (endpoint, request.method, str(response.status_code), version), duration
+        )
+        for stage, seconds in timing.spans.items():
+            stage_duration.observe((endpoint, version, stage), seconds)
+
+        if settings.SERVER_TIMING_ENABLED:
+            response["Server-Timing"] = ", ".join(
+                f"{stage};dur={seconds * 1000:.3f}"
+                for stage, seconds in (*timing.spans.items(), ("total", duration))
+            )
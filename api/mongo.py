@@ -0,0 +1,126 @@
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from pymongo import MongoClient, monitoring
+from pymongo.errors import PyMongoError
+
+from .timing import current
+
+logger = logging.getLogger(__name__)
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+class CommandTimingListener(monitoring.CommandListener):
+    """
+    Adds the duration of the database commands run while a request is served
+    to its "db" stage (see api.timing), whether they come from the djongo
+    backend or from the pymongo code paths. The events of a command are
+    published in the thread that runs it.
+    """
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._record(event)
+
+    def failed(self, event):
+        self._record(event)
+
+    @staticmethod
+    def _record(event):
+        timing = current()
+        if timing is not None:
+            timing.add("db", event.duration_micros / 1e6)
+
+
+def get_client():
+    """
+    Returns the MongoClient of the process, shared by the djongo database
+    backend (see api.db) and the pymongo code paths, so that each process
+    holds a single connection pool.
+
+    The client is created on first use, with the CLIENT options of the
+    default database (pool sizes and timeouts, see the MONGO_* settings), and
+    created again in a forked process, since a client must not be used across
+    a fork. Creating the client does not connect: connections are opened by
+    the first operations.
+    """
+    global _client, _client_pid
+    if _client_pid == os.getpid():
+        return _client
+    with _client_lock:
+        if _client_pid != os.getpid():
+            _client = MongoClient(
+                **settings.DATABASES["default"]["CLIENT"],
+                event_listeners=[CommandTimingListener()],
+            )
+            _client_pid = os.getpid()
+    return _client
+
+
+def get_database(**kwargs):
+    """
+    Returns the database of the default connection, on the shared client.
+    Keyword arguments are passed to MongoClient.get_database, e.g.
+    codec_options.
+    """
+    return get_client().get_database(settings.DATABASES["default"]["NAME"], **kwargs)
+
+
+def use_client(client):
+    """
+    Replaces the shared client of the process, e.g. with an in-memory
+    mongomock client in benchmarks.
+    """
+    global _client, _client_pid
+    with _client_lock:
+        _client, _client_pid = client, os.getpid()
+
+
+def close_client():
+    """
+    Closes the shared client of the process, if any. The next call of
+    get_client creates a new one.
+    """
+    global _client, _client_pid
+    with _client_lock:
+        if _client is not None and _client_pid == os.getpid():
+            _client.close()
+        _client, _client_pid = None, None
+
+
+def health():
+    """
+    Pings the database and reports its status.
+
+    Returns:
+        dict: Whether the database answered ("ok"), the round trip time of
+        the ping in milliseconds, and the pool options. The error of a failed
+        ping is logged, and only reported as the fixed code "ping_failed".
+    """
+    client = get_client()
+    options = client.options.pool_options
+    report = {
+        "pool": {
+            "max_size": options.max_pool_size,
+            "min_size": options.min_pool_size,
+            "max_idle_time_s": options.max_idle_time_seconds,
+            "connect_timeout_s": options.connect_timeout,
+            "socket_timeout_s": options.socket_timeout,
+        }
+    }
+    start = time.perf_counter()
+    try:
+        client.admin.command("ping")
+    except PyMongoError:
+        # The message of the error may name hosts and credentials
+        logger.exception("The database ping failed.")
+        return {"ok": False, "error": "ping_failed", **report}
+    return {"ok": True, "latency_ms": (time.perf_counter() - start) * 1000, **report}
@@ -0,0 +1,202 @@
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ModelRegistry:
+    """
+    Process-wide registry of the machine learning models served by the API.
+
+    Each app registers a loader for its model when Django starts. A model is
+    loaded the first time it is requested (or when the registry is warmed up)
+    and the same instance is then shared by every request and thread of the
+    process, instead of being deserialized again by each view.
+
+    Models registered with a version function are reloaded when the version
+    of their artifacts changes: every MODEL_RELOAD_INTERVAL seconds, a
+    background thread of each process compares it with the version of the
+    loaded model, loads and warms up the new version, then swaps it in.
+    Requests being served keep the instance they got, and new requests get the
+    new one without waiting for the load. The replaced instance is kept, so
+    that going back to its version is an instant swap. Rolling back is done
+    by restoring the previous manifest: unlike swapping the instances of one
+    process, it rolls back every worker, and lasts until the next deployment.
+    """
+
+    def __init__(self):
+        self._loaders = {}
+        self._warm_ups = {}
+        self._versions = {}
+        self._models = {}
+        self._previous = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        self._watcher_pid = None
+        # gunicorn --preload loads and warms up the models in the master, whose
+        # watcher thread is not inherited by the forked workers
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def register(self, name, loader, warm_up=None, version=None):
+        """
+        Registers the loader of a model.
+
+        Parameters:
+            name (str): Name the model is requested with.
+            loader (callable): Function without arguments returning the loaded model.
+            warm_up (callable): Optional function called with the loaded model to
+                run a first prediction, so that lazy initialisation does not
+                happen during a request.
+            version (callable): Optional function without arguments returning
+                the version of the artifacts to serve, compared with the
+                `version` attribute of the loaded model to reload it.
+        """
+        with self._lock:
+            self._loaders[name] = loader
+            self._warm_ups[name] = warm_up
+            self._versions[name] = version
+            self._locks.setdefault(name, threading.Lock())
+
+    def get(self, name):
+        """
+        Returns the loaded model registered under the given name, loading it on
+        first use. Concurrent callers wait for a single load of the model.
+        """
+        self._ensure_watcher()
+        model = self._models.get(name)
+        if model is not None:
+            return model
+
+        try:
+            lock = self._locks[name]
+        except KeyError:
+            raise KeyError(f"No model registered under the name {name!r}.")
+
+        with lock:
+            model = self._models.get(name)
+            if model is None:
+                logger.info(f"Loading model {name!r}.")
+                model = self._loaders[name]()
+                self._models[name] = model
+        return model
+
+    def warm_up(self, names=None):
+        """
+        Loads the given models (all registered models by default) and runs
+        their warm-up function. Failures are logged so that a broken model
+        does not prevent the server from starting.
+        """
+        for name in names or list(self._loaders):
+            try:
+                model = self.get(name)
+                warm_up = self._warm_ups.get(name)
+                if warm_up is not None:
+                    warm_up(model)
+            except Exception as e:
+                logger.error(f"Error warming up model {name!r}: {e}")
+
+    def reload(self, name):
+        """
+        Loads the current version of a model, warms it up and swaps it in
+        place of the loaded instance, which is kept. If the current version is
+        the one of the kept instance (the previous manifest was restored), the
+        instances are swapped back without loading anything.
+
+        Returns:
+            object: The model now served.
+        """
+        with self._locks[name]:
+            current = self._models.get(name)
+            previous = self._previous.get(name)
+            version = self._versions.get(name)
+            if (
+                previous is not None
+                and version is not None
+                and version() == getattr(previous, "version", None)
+            ):
+                model = previous
+            else:
+                logger.info(f"Loading a new version of model {name!r}.")
+                model = self._loaders[name]()
+                warm_up = self._warm_ups.get(name)
+                if warm_up is not None:
+                    warm_up(model)
+            if current is not None:
+                self._previous[name] = current
+            self._models[name] = model
+        logger.info(
+            f"Serving version {getattr(model, 'version', None)!r} of model {name!r}."
+        )
+        return model
+
+    def check_for_updates(self):
+        """
+        Reloads the loaded models whose version changed. Failures are logged
+        and the current version keeps being served.
+        """
+        for name, version in list(self._versions.items()):
+            model = self._models.get(name)
+            if version is None or model is None:
+                continue
+            try:
+                if version() != getattr(model, "version", None):
+                    self.reload(name)
+            except Exception as e:
+                logger.error(f"Error reloading model {name!r}: {e}")
+
+    def versions(self):
+        """
+        Returns the version served and the previous version kept for each
+        loaded model.
+        """
+        return {
+            name: {
+                "version": getattr(model, "version", None),
+                "previous_version": getattr(self._previous.get(name), "version", None),
+            }
+            for name, model in list(self._models.items())
+        }
+
+    def _after_fork(self):
+        # Locks held by another thread of the parent when it forked would
+        # never be released in the child
+        self._watcher_pid = None
+        self._lock = threading.Lock()
+        self._locks = {name: threading.Lock() for name in self._locks}
+
+    def _ensure_watcher(self):
+        # Started in each process on first use, and again in a forked process
+        # (see _after_fork); the PID check also covers platforms without
+        # os.register_at_fork
+        interval = settings.MODEL_RELOAD_INTERVAL
+        if interval <= 0 or self._watcher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._watcher_pid != os.getpid():
+                self._watcher_pid = os.getpid()
+                threading.Thread(
+                    target=self._watch,
+                    args=(interval,),
+                    name="model-watcher",
+                    daemon=True,
+                ).start()
+
+    def _watch(self, interval):
+        while True:
+            time.sleep(interval)
+            self.check_for_updates()
+
+    def unload(self, name):
+        """
+        Drops the loaded instance of a model, which is loaded again on next use.
+        """
+        with self._locks.get(name, self._lock):
+            self._models.pop(name, None)
+
+
+registry = ModelRegistry()
@@ -0,0 +1,169 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from django.utils.module_loading import import_string
+
+# Loader of the predictor of each model that can score files, with a
+# score_frame method
+PREDICTOR_LOADERS = {
+    "heart_disease": "heart_disease.predictor.load_predictor",
+    "price_pilot": "price_pilot.predictor.load_predictor",
+}
+
+PARQUET_EXTENSIONS = (".parquet", ".pq")
+
+_predictor = None
+
+
+def is_parquet(path):
+    return path.lower().endswith(PARQUET_EXTENSIONS)
+
+
+def read_chunks(path, chunk_size):
+    """
+    Yields the rows of a CSV or Parquet file (by extension) as DataFrames of at
+    most chunk_size rows. Only one chunk is read at a time, so the file can be
+    larger than the memory.
+    """
+    if is_parquet(path):
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        import pandas as pd
+
+        with pd.read_csv(path, chunksize=chunk_size) as reader:
+            yield from reader
+
+
+class ChunkWriter:
+    """
+    Writes DataFrames to a CSV or Parquet file (by extension) as they come, so
+    that the whole output is never held in memory. The columns of the first
+    chunk are those of the file, and the Parquet schema is inferred from it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+        self._parquet_writer = None
+
+    def write(self, frame):
+        if is_parquet(self.path):
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            if self._parquet_writer is None:
+                table = pa.Table.from_pandas(frame, preserve_index=False)
+                self._parquet_writer = pq.ParquetWriter(self.path, table.schema)
+            else:
+                table = pa.Table.from_pandas(
+                    frame, schema=self._parquet_writer.schema, preserve_index=False
+                )
+            self._parquet_writer.write_table(table)
+        else:
+            header = self._file is None
+            if header:
+                self._file = open(self.path, "w", newline="", encoding="utf-8")
+            frame.to_csv(self._file, header=header, index=False)
+
+    def close(self):
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+        if self._file is not None:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def score_file(
+    model,
+    input_path,
+    output_path,
+    chunk_size,
+    workers=1,
+    on_chunk=None,
+    **score_options,
+):
+    """
+    Scores a CSV or Parquet file with the predictor of a model, chunk by chunk,
+    and writes the rows of the input with their scores to the output file.
+
+    Each chunk is preprocessed and predicted as one matrix by the score_frame
+    method of the predictor. With several workers, chunks are scored in a pool
+    of processes, each loading the predictor once, while the main process
+    reads the next chunks and writes the scored ones in the input order. At
+    most two chunks per worker are pending, which bounds the memory used
+    whatever the size of the file.
+
+    Parameters:
+        model (str): Name of the model, a key of PREDICTOR_LOADERS.
+        input_path (str): File to score.
+        output_path (str): File the scored rows are written to.
+        chunk_size (int): Number of rows read and scored together.
+        workers (int): Number of worker processes, 1 to score in the process.
+        on_chunk (callable): Optional function called with the total number
+            of rows written after each chunk.
+        score_options: Keyword arguments of score_frame, e.g. explain.
+
+    Returns:
+        int: The number of rows scored.
+    """
+    rows = 0
+    with ChunkWriter(output_path) as writer:
+
+        def write(chunk, scores):
+            nonlocal rows
+            writer.write(chunk.join(scores))
+            rows += len(chunk)
+            if on_chunk is not None:
+                on_chunk(rows)
+
+        if workers <= 1:
+            predictor = import_string(PREDICTOR_LOADERS[model])()
+            for chunk in read_chunks(input_path, chunk_size):
+                write(chunk, predictor.score_frame(chunk, **score_options))
+            return rows
+
+        with ProcessPoolExecutor(
+            max_workers=workers, initializer=_init_worker, initargs=(model,)
+        ) as executor:
+            pending = deque()
+            for chunk in read_chunks(input_path, chunk_size):
+                pending.append(
+                    (chunk, executor.submit(_score_chunk, chunk, score_options))
+                )
+                if len(pending) >= 2 * workers:
+                    chunk, future = pending.popleft()
+                    write(chunk, future.result())
+            while pending:
+                chunk, future = pending.popleft()
+                write(chunk, future.result())
+    return rows
+
+
+def _init_worker(model):
+    global _predictor
+    import django
+    import numba
+    from django.apps import apps
+    from threadpoolctl import threadpool_limits
+
+    # Processes started with spawn rather than fork import the project again
+    if not apps.ready:
+        django.setup()
+    # Each worker scores with one thread, the pool uses the cores. numba may
+    # already be imported by a forked worker, its threads are set at run time
+    threadpool_limits(limits=1)
+    numba.set_num_threads(1)
+    _predictor = import_string(PREDICTOR_LOADERS[model])()
+
+
+def _score_chunk(chunk, score_options):
+    # Only the scores are sent back, the main process still holds the chunk
+    return _predictor.score_frame(chunk, **score_options)
@@ -0,0 +1,154 @@
+import functools
+import os
+import random
+
+import joblib
+import numpy as np
+from django.conf import settings
+
+from heart_disease.predictor import HeartDiseasePredictor
+from price_pilot.car_names import car_name_index
+from price_pilot.models import get_car_collection
+from price_pilot.predictor import FEATURE_ORDER as PRICE_PILOT_FEATURES
+from price_pilot.predictor import CarPricePredictor
+
+from .mongo import use_client
+from .registry import registry
+
+CAR_NAMES = [
+    "Peugeot 208",
+    "Peugeot 3008",
+    "Renault Clio V",
+    "Renault Megane",
+    "Volkswagen Golf",
+    "Volkswagen Polo",
+    "Tesla Model 3",
+    "Toyota Yaris",
+]
+
+
+def train_heart_disease(directory, n_samples=1000):
+    """
+    Trains a stand-in heart disease model and scaler, of the same kinds as the
+    real ones, on synthetic data, and writes them to the given directory.
+
+    Returns:
+        tuple: The paths of the model and of the scaler.
+    """
+    from sklearn.ensemble import GradientBoostingClassifier
+    from sklearn.preprocessing import StandardScaler
+
+    rng = np.random.default_rng(0)
+    X = np.column_stack(
+        [
+            rng.integers(29, 78, n_samples),  # age
+            rng.integers(0, 2, n_samples),  # sex
+            rng.integers(0, 4, n_samples),  # cp
+            rng.integers(94, 201, n_samples),  # trestbps
+            rng.integers(126, 565, n_samples),  # chol
+            rng.integers(0, 2, n_samples),  # fbs
+            rng.integers(0, 3, n_samples),  # restecg
+            rng.integers(71, 203, n_samples),  # thalach
+            rng.integers(0, 2, n_samples),  # exang
+            rng.uniform(0, 6.2, n_samples).round(1),  # oldpeak
+            rng.integers(0, 3, n_samples),  # slope
+            rng.integers(0, 4, n_samples),  # ca
+            rng.integers(0, 4, n_samples),  # thal
+        ]
+    ).astype(np.float64)
+    risk = 0.04 * (X[:, 0] - 50) + 0.8 * X[:, 2] - 0.03 * (X[:, 7] - 150) + X[:, 9]
+    y = (risk + rng.normal(0, 1, n_samples) > 1).astype(int)
+
+    scaler = StandardScaler().fit(X)
+    model = GradientBoostingClassifier(random_state=0).fit(scaler.transform(X), y)
+    model_path = os.path.join(directory, "heart_disease_model.joblib")
+    scaler_path = os.path.join(directory, "heart_disease_scaler.joblib")
+    joblib.dump(model, model_path)
+    joblib.dump(scaler, scaler_path)
+    return model_path, scaler_path
+
+
+def train_price_pilot(directory, n_samples=5000):
+    """
+    Trains a stand-in car price model, of the same kind as the real one, on
+    synthetic data, and writes it to the given directory.
+
+    Returns:
+        str: The path of the model.
+    """
+    from sklearn.ensemble import RandomForestRegressor
+
+    records = [fake_car(random.Random(i)) for i in range(n_samples)]
+    X = np.array(
+        [[record[feature] for feature in PRICE_PILOT_FEATURES] for record in records]
+    )
+    y = np.array([record["price"] for record in records])
+    model = RandomForestRegressor(
+        n_estimators=100, max_depth=12, random_state=0, n_jobs=-1
+    ).fit(X, y)
+    # Trained on every core, served with the default number of jobs
+    model.set_params(n_jobs=None)
+    model_path = os.path.join(directory, "price_pilot_model.joblib")
+    joblib.dump(model, model_path)
+    return model_path
+
+
+def fake_car(rng):
+    """
+    Returns a plausible car with its price, in the normalized form stored by
+    the API.
+    """
+    year = rng.randint(2005, 2023)
+    mileage = float(rng.randint(0, 250000))
+    power = float(rng.choice([75, 100, 130, 180, 250]))
+    price = 60000 * 0.88 ** (2024 - year) * (power / 130) - 0.05 * mileage
+    return {
+        "name": rng.choice(CAR_NAMES),
+        "price": round(max(price, 1000.0) * rng.uniform(0.9, 1.1)),
+        "year": year,
+        "mileage": mileage,
+        "fuel_type": rng.choice(["Essence", "Diesel", "Electrique"]),
+        "num_doors": rng.choice([3, 5]),
+        "num_seats": 5,
+        "power": power,
+        "combined_consumption": round(rng.uniform(3.5, 9.0), 1),
+        "length": rng.choice([4.05, 4.3, 4.6]),
+    }
+
+
+def install(directory, n_cars=2000):
+    """
+    Replaces the models and the database of the process with stand-ins, so
+    that the API runs offline: models trained on synthetic data (written to
+    the given directory) are registered in place of the real ones, and the
+    shared MongoDB client is replaced with an in-memory mongomock client
+    holding n_cars fake cars.
+    """
+    import mongomock
+
+    model_path, scaler_path = train_heart_disease(directory)
+    registry.register(
+        "heart_disease",
+        functools.partial(
+            HeartDiseasePredictor,
+            model_path,
+            scaler_path,
+            explain_mode=settings.HEART_DISEASE_EXPLAIN_MODE,
+            backend=settings.HEART_DISEASE_INFERENCE_BACKEND,
+        ),
+    )
+    registry.register(
+        "price_pilot",
+        functools.partial(
+            CarPricePredictor,
+            train_price_pilot(directory),
+            backend=settings.PRICE_PILOT_INFERENCE_BACKEND,
+        ),
+    )
+    for name in ("heart_disease", "price_pilot"):
+        registry.unload(name)
+
+    use_client(mongomock.MongoClient())
+    rng = random.Random(0)
+    get_car_collection().insert_many([fake_car(rng) for _ in range(n_cars)])
+    car_name_index.rebuild()
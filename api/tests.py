@@ -1,3 +1,224 @@
-from django.test import TestCase
+import threading
+import time
+from types import SimpleNamespace
 
-# Create your tests here.
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+
+from .batching import MicroBatcher, group_by_model
+from .registry import ModelRegistry
+from .tree_engine import CompiledTreeEnsemble
+
+
+class CompiledTreeEnsembleTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        from sklearn.ensemble import (
+            ExtraTreesRegressor,
+            GradientBoostingClassifier,
+            GradientBoostingRegressor,
+            RandomForestRegressor,
+        )
+
+        rng = np.random.default_rng(0)
+        cls.X = rng.normal(size=(500, 6))
+        y = cls.X[:, 0] * 3 + np.sin(cls.X[:, 1]) + rng.normal(0, 0.1, 500)
+        labels = np.digitize(cls.X[:, 2] + cls.X[:, 3], [-0.5, 0.5])
+        cls.regressors = [
+            RandomForestRegressor(n_estimators=20, random_state=0).fit(cls.X, y),
+            ExtraTreesRegressor(n_estimators=20, random_state=0).fit(cls.X, y),
+            GradientBoostingRegressor(n_estimators=30, random_state=0).fit(cls.X, y),
+        ]
+        cls.classifiers = [
+            GradientBoostingClassifier(n_estimators=30, random_state=0).fit(
+                cls.X, labels > 0
+            ),
+            GradientBoostingClassifier(
+                n_estimators=30, loss="exponential", random_state=0
+            ).fit(cls.X, labels > 0),
+            GradientBoostingClassifier(n_estimators=10, random_state=0).fit(
+                cls.X, labels
+            ),
+        ]
+        # Rows near the thresholds as well as the training rows
+        cls.X_test = np.vstack([cls.X, rng.normal(size=(300, 6)).round(1)])
+
+    def test_regressors_match_sklearn(self):
+        for model in self.regressors:
+            for jit in (True, False):
+                with self.subTest(model=type(model).__name__, jit=jit):
+                    engine = CompiledTreeEnsemble.from_estimator(model, jit=jit)
+                    np.testing.assert_array_equal(
+                        engine.predict(self.X_test), model.predict(self.X_test)
+                    )
+
+    def test_classifiers_match_sklearn(self):
+        for model in self.classifiers:
+            for jit in (True, False):
+                with self.subTest(model=model.loss, classes=model.n_classes_, jit=jit):
+                    engine = CompiledTreeEnsemble.from_estimator(model, jit=jit)
+                    np.testing.assert_array_equal(
+                        engine.predict(self.X_test), model.predict(self.X_test)
+                    )
+                    np.testing.assert_allclose(
+                        engine.predict_proba(self.X_test),
+                        model.predict_proba(self.X_test),
+                        rtol=0,
+                        atol=1e-12,
+                    )
+
+    def test_parallel_kernel_matches_serial(self):
+        model = self.regressors[0]
+        engine = CompiledTreeEnsemble.from_estimator(model)
+        X = np.tile(self.X_test, (2, 1))
+        self.assertGreaterEqual(len(X), engine.PARALLEL_MIN_ROWS)
+        np.testing.assert_array_equal(engine.predict(X), model.predict(X))
+
+    def test_tree_predict_matches_each_tree(self):
+        model = self.regressors[0]
+        expected = np.column_stack(
+            [tree.predict(self.X_test.astype(np.float32)) for tree in model.estimators_]
+        )
+        for jit in (True, False):
+            with self.subTest(jit=jit):
+                engine = CompiledTreeEnsemble.from_estimator(model, jit=jit)
+                tree_predictions = engine.tree_predict(self.X_test)
+                np.testing.assert_array_equal(tree_predictions, expected)
+                np.testing.assert_array_equal(
+                    engine.leaf_values(model.apply(self.X_test)), expected
+                )
+
+    def test_tree_predict_requires_a_forest(self):
+        engine = CompiledTreeEnsemble.from_estimator(self.regressors[2])
+        with self.assertRaises(ValueError):
+            engine.tree_predict(self.X_test)
+
+    def test_rejects_wrong_number_of_features(self):
+        engine = CompiledTreeEnsemble.from_estimator(self.regressors[0])
+        with self.assertRaises(ValueError):
+            engine.predict(self.X_test[:, :3])
+
+
+class MicroBatcherTests(SimpleTestCase):
+    def run_concurrently(self, batcher, items):
+        results = [None] * len(items)
+        barrier = threading.Barrier(len(items))
+
+        def submit(i):
+            barrier.wait()
+            try:
+                results[i] = batcher.run(items[i])
+            except Exception as e:
+                results[i] = e
+
+        threads = [
+            threading.Thread(target=submit, args=(i,)) for i in range(len(items))
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_concurrent_items_are_batched(self):
+        batches = []
+
+        def process_batch(items):
+            batches.append(list(items))
+            return [item * 2 for item in items]
+
+        batcher = MicroBatcher("test-batched", process_batch, 8, max_wait=0.2)
+        results = self.run_concurrently(batcher, list(range(16)))
+
+        self.assertEqual(results, [i * 2 for i in range(16)])
+        self.assertEqual(sorted(sum(batches, [])), list(range(16)))
+        self.assertLess(len(batches), 16)
+        self.assertLessEqual(max(len(batch) for batch in batches), 8)
+        self.assertEqual(batcher.stats()["batch_size"]["count"], len(batches))
+
+    def test_errors_are_raised_to_every_caller_of_the_batch(self):
+        def process_batch(items):
+            raise RuntimeError("model failed")
+
+        batcher = MicroBatcher("test-errors", process_batch, 4, max_wait=0.05)
+        results = self.run_concurrently(batcher, list(range(4)))
+        for result in results:
+            self.assertIsInstance(result, RuntimeError)
+
+    def test_group_by_model(self):
+        first, second = object(), object()
+        items = [(first, "a"), (second, "b"), (first, "c")]
+        self.assertEqual(group_by_model(items), [(first, [0, 2]), (second, [1])])
+
+
+@override_settings(MODEL_RELOAD_INTERVAL=0)
+class ModelRegistryTests(SimpleTestCase):
+    def setUp(self):
+        self.manifest_version = "v1"
+        self.loaded = []
+        self.registry = ModelRegistry()
+        self.registry.register(
+            "model", self.load, version=lambda: self.manifest_version
+        )
+
+    def load(self):
+        if self.manifest_version == "broken":
+            raise OSError("missing artifact")
+        model = SimpleNamespace(version=self.manifest_version)
+        self.loaded.append(model)
+        return model
+
+    def test_reloads_when_the_manifest_changes(self):
+        first = self.registry.get("model")
+        self.registry.check_for_updates()
+        self.assertIs(self.registry.get("model"), first)
+
+        self.manifest_version = "v2"
+        self.registry.check_for_updates()
+        self.assertEqual(self.registry.get("model").version, "v2")
+        self.assertEqual(
+            self.registry.versions(),
+            {"model": {"version": "v2", "previous_version": "v1"}},
+        )
+
+    def test_restoring_the_previous_manifest_swaps_back(self):
+        first = self.registry.get("model")
+        self.manifest_version = "v2"
+        self.registry.check_for_updates()
+        second = self.registry.get("model")
+
+        self.manifest_version = "v1"
+        self.registry.check_for_updates()
+        self.assertIs(self.registry.get("model"), first)
+        self.assertEqual(self.loaded, [first, second])
+        # The rollback lasts until the manifest changes again
+        self.registry.check_for_updates()
+        self.assertIs(self.registry.get("model"), first)
+
+    def test_failed_reload_keeps_serving_the_current_version(self):
+        first = self.registry.get("model")
+        self.manifest_version = "broken"
+        with self.assertLogs("api.registry", "ERROR"):
+            self.registry.check_for_updates()
+        self.assertIs(self.registry.get("model"), first)
+        self.assertEqual(self.registry.versions()["model"]["previous_version"], None)
+
+    def test_watcher_reloads_in_the_background(self):
+        with override_settings(MODEL_RELOAD_INTERVAL=0.01):
+            self.registry.get("model")
+            self.manifest_version = "v2"
+            deadline = time.monotonic() + 5
+            while self.registry.get("model").version != "v2":
+                self.assertLess(time.monotonic(), deadline)
+                time.sleep(0.01)
+        # The watcher thread runs until the process exits, with nothing to check
+        self.registry._versions.clear()
+
+    def test_after_fork_resets_the_watcher_and_locks(self):
+        self.registry._watcher_pid = 1
+        self.registry._locks["model"].acquire()
+        self.registry._after_fork()
+        self.assertIsNone(self.registry._watcher_pid)
+        self.assertFalse(self.registry._locks["model"].locked())
+        self.assertIs(self.registry.get("model"), self.loaded[0])
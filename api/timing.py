@@ -0,0 +1,82 @@
+import contextvars
+import time
+from contextlib import contextmanager
+
+_current = contextvars.ContextVar("request_timing", default=None)
+
+
+class RequestTiming:
+    """
+    Durations of the stages of the request being served (validation,
+    preprocessing, prediction, explanation, database...), recorded by `span`
+    and aggregated by api.middleware.TimingMiddleware, and labels describing
+    the request, such as the version of the model that served it.
+    """
+
+    def __init__(self):
+        self.spans = {}
+        self.labels = {}
+
+    def add(self, name, seconds):
+        """
+        Adds a duration to a stage, a stage run several times by a request is
+        reported once with its total duration.
+        """
+        self.spans[name] = self.spans.get(name, 0.0) + seconds
+
+
+def start_request():
+    """
+    Starts recording the stages of a request in the current context.
+
+    Returns:
+        tuple: The RequestTiming of the request, and the token to pass to
+        end_request.
+    """
+    timing = RequestTiming()
+    return timing, _current.set(timing)
+
+
+def end_request(token):
+    """
+    Stops recording the stages of the request started with the given token.
+    """
+    _current.reset(token)
+
+
+def current():
+    """
+    Returns the RequestTiming of the request being served, or None.
+    """
+    return _current.get()
+
+
+@contextmanager
+def span(name):
+    """
+    Times the enclosed block as a stage of the request being served. Outside
+    of a request (in management commands or background threads), the block
+    is run without being timed.
+
+    Example:
+        with span("predict"):
+            predictions = model.predict(X)
+    """
+    timing = _current.get()
+    if timing is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing.add(name, time.perf_counter() - start)
+
+
+def annotate(**labels):
+    """
+    Sets labels of the request being served, e.g. annotate(model_version=v).
+    """
+    timing = _current.get()
+    if timing is not None:
+        timing.labels.update(labels)
@@ -0,0 +1,352 @@
+import numpy as np
+
+TREE_LEAF = -1
+BLOCK_ROWS = 64
+
+
+def _leaf_nodes_numpy(X, roots, feature, threshold, children_left, children_right):
+    # All the rows walk down all the trees at once, one level per iteration,
+    # until every row has reached a leaf of every tree. Returns the leaf of
+    # each row in each tree, of shape (n_samples, n_trees).
+    n_samples = X.shape[0]
+    rows = np.arange(n_samples)[:, np.newaxis]
+    nodes = np.repeat(roots[np.newaxis, :], n_samples, axis=0)
+    while True:
+        left = children_left[nodes]
+        internal = left != TREE_LEAF
+        if not internal.any():
+            break
+        # Same comparison as sklearn: float32 feature, float64 threshold. The
+        # feature of a leaf is negative and its comparison discarded.
+        go_left = X[rows, feature[nodes]] <= threshold[nodes]
+        nodes = np.where(
+            internal, np.where(go_left, left, children_right[nodes]), nodes
+        )
+    return nodes
+
+
+def _accumulate_numpy(
+    X,
+    roots,
+    tree_outputs,
+    scale,
+    feature,
+    threshold,
+    children_left,
+    children_right,
+    value,
+    out,
+):
+    # The leaf values are added tree by tree, in the same order as sklearn
+    leaf_values = value[
+        _leaf_nodes_numpy(X, roots, feature, threshold, children_left, children_right)
+    ]
+    for t in range(roots.shape[0]):
+        out[:, tree_outputs[t]] += scale * leaf_values[:, t]
+
+
+def _tree_values_numpy(
+    X, roots, scale, feature, threshold, children_left, children_right, value, out
+):
+    out[:] = value[
+        _leaf_nodes_numpy(X, roots, feature, threshold, children_left, children_right)
+    ]
+    out *= scale
+
+
+class CompiledTreeEnsemble:
+    """
+    A fitted sklearn tree ensemble flattened into contiguous node arrays and
+    evaluated with a numba-jitted traversal, or a vectorized numpy traversal
+    that loads without numba.
+
+    All the trees are concatenated in the same node arrays (children indices
+    are global, leaves have no children) and each tree starts at its root in
+    `roots`. The traversal and the accumulation of the leaf values follow
+    sklearn's order of operations, so predictions are identical to the
+    estimator's, without its per-call validation overhead.
+
+    Supported estimators: RandomForestRegressor, ExtraTreesRegressor,
+    GradientBoostingRegressor and GradientBoostingClassifier (with the default
+    prior init estimator).
+    """
+
+    # Batches with at least this many rows are spread over numba's threads
+    PARALLEL_MIN_ROWS = 256
+
+    def __init__(
+        self,
+        feature,
+        threshold,
+        children_left,
+        children_right,
+        value,
+        roots,
+        tree_outputs,
+        n_features,
+        scale=1.0,
+        divisor=1.0,
+        init=None,
+        objective="regression",
+        classes=None,
+        jit=True,
+    ):
+        """
+        Parameters:
+            feature, threshold, children_left, children_right, value (ndarray):
+                Node arrays of all the trees.
+            roots (ndarray): Index of the root node of each tree.
+            tree_outputs (ndarray): Output (class) each tree contributes to.
+            n_features (int): Number of input features.
+            scale (float): Factor applied to each leaf value (learning rate).
+            divisor (float): Divisor of the sum of the trees (number of trees
+                of a forest).
+            init (ndarray): Initial raw prediction of each output.
+            objective (str): "regression", "binomial", "exponential" or
+                "multinomial", how raw predictions are turned into outputs.
+            classes (ndarray): Class labels of a classifier.
+            jit (bool): Whether to evaluate the trees with the numba kernels
+                of api.tree_kernels, compiled (or read from numba's cache) on
+                first use, rather than with numpy.
+        """
+        self.feature = np.ascontiguousarray(feature, dtype=np.intp)
+        self.threshold = np.ascontiguousarray(threshold, dtype=np.float64)
+        self.children_left = np.ascontiguousarray(children_left, dtype=np.intp)
+        self.children_right = np.ascontiguousarray(children_right, dtype=np.intp)
+        self.value = np.ascontiguousarray(value, dtype=np.float64)
+        self.roots = np.ascontiguousarray(roots, dtype=np.intp)
+        self.tree_outputs = np.ascontiguousarray(tree_outputs, dtype=np.intp)
+        self.n_features = int(n_features)
+        self.scale = float(scale)
+        self.divisor = float(divisor)
+        self.n_outputs = int(self.tree_outputs.max()) + 1 if len(self.roots) else 1
+        self.init = (
+            np.zeros(self.n_outputs, dtype=np.float64)
+            if init is None
+            else np.asarray(init, dtype=np.float64).reshape(self.n_outputs)
+        )
+        self.objective = objective
+        self.classes = classes
+        self.jit = jit
+
+    @classmethod
+    def from_estimator(cls, model, jit=True):
+        """
+        Flattens the trees of a fitted sklearn ensemble.
+        """
+        from sklearn.dummy import DummyClassifier, DummyRegressor
+        from sklearn.ensemble import (
+            ExtraTreesRegressor,
+            GradientBoostingClassifier,
+            GradientBoostingRegressor,
+            RandomForestRegressor,
+        )
+
+        if isinstance(model, (RandomForestRegressor, ExtraTreesRegressor)):
+            if model.n_outputs_ != 1:
+                raise ValueError("Only single-output forests can be compiled.")
+            trees = [(estimator.tree_, 0) for estimator in model.estimators_]
+            return cls._from_trees(
+                trees, model.n_features_in_, divisor=len(trees), jit=jit
+            )
+
+        if isinstance(model, (GradientBoostingClassifier, GradientBoostingRegressor)):
+            if not (
+                (isinstance(model.init_, str) and model.init_ == "zero")
+                or isinstance(model.init_, (DummyClassifier, DummyRegressor))
+            ):
+                raise ValueError(
+                    "Only gradient boosting models with a constant init estimator "
+                    "can be compiled."
+                )
+            trees = [
+                (model.estimators_[stage, k].tree_, k)
+                for stage in range(model.estimators_.shape[0])
+                for k in range(model.estimators_.shape[1])
+            ]
+            # The prior init estimator predicts the same raw value for every row
+            init = model._raw_predict_init(
+                np.zeros((1, model.n_features_in_), dtype=np.float32)
+            )[0]
+            objective, classes = "regression", None
+            if isinstance(model, GradientBoostingClassifier):
+                classes = model.classes_
+                if model.loss == "exponential":
+                    objective = "exponential"
+                elif model.n_classes_ == 2:
+                    objective = "binomial"
+                else:
+                    objective = "multinomial"
+            return cls._from_trees(
+                trees,
+                model.n_features_in_,
+                scale=model.learning_rate,
+                init=init,
+                objective=objective,
+                classes=classes,
+                jit=jit,
+            )
+
+        raise TypeError(f"Cannot compile estimators of type {type(model).__name__}.")
+
+    @classmethod
+    def _from_trees(cls, trees, n_features, **kwargs):
+        features, thresholds, lefts, rights, values, roots, outputs = (
+            [] for _ in range(7)
+        )
+        offset = 0
+        for tree, output in trees:
+            left = tree.children_left.astype(np.intp)
+            right = tree.children_right.astype(np.intp)
+            internal = left != TREE_LEAF
+            left[internal] += offset
+            right[internal] += offset
+            features.append(tree.feature)
+            thresholds.append(tree.threshold)
+            lefts.append(left)
+            rights.append(right)
+            values.append(tree.value[:, 0, 0])
+            roots.append(offset)
+            outputs.append(output)
+            offset += tree.node_count
+        return cls(
+            np.concatenate(features),
+            np.concatenate(thresholds),
+            np.concatenate(lefts),
+            np.concatenate(rights),
+            np.concatenate(values),
+            np.array(roots),
+            np.array(outputs),
+            n_features,
+            **kwargs,
+        )
+
+    def _prepare(self, X):
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(
+                f"X has shape {X.shape}, but the model expects "
+                f"{self.n_features} features."
+            )
+        return X
+
+    def raw_predict(self, X):
+        """
+        Returns the raw predictions, of shape (n_samples, n_outputs): the sum
+        of the scaled leaf values plus the init prediction, divided by the
+        number of trees for forests.
+        """
+        X = self._prepare(X)
+        out = np.empty((X.shape[0], self.n_outputs), dtype=np.float64)
+        out[:] = self.init
+        if not self.jit:
+            accumulate = _accumulate_numpy
+        else:
+            from . import tree_kernels
+
+            accumulate = (
+                tree_kernels.accumulate_parallel
+                if X.shape[0] >= self.PARALLEL_MIN_ROWS
+                else tree_kernels.accumulate_serial
+            )
+        accumulate(
+            X,
+            self.roots,
+            self.tree_outputs,
+            self.scale,
+            self.feature,
+            self.threshold,
+            self.children_left,
+            self.children_right,
+            self.value,
+            out,
+        )
+        if self.divisor != 1.0:
+            out /= self.divisor
+        return out
+
+    @property
+    def is_forest(self):
+        """
+        Whether the model is a forest, whose prediction is the mean of the
+        predictions of its trees.
+        """
+        return (
+            self.objective == "regression"
+            and len(self.roots) > 0
+            and self.divisor == len(self.roots)
+            and self.scale == 1.0
+            and not self.init.any()
+        )
+
+    def tree_predict(self, X):
+        """
+        Returns the prediction of each tree of a forest, of shape (n_samples,
+        n_trees), computed in one traversal of all the trees.
+
+        The sum of the columns, added in order and divided by the number of
+        trees, is the prediction of the forest, and their spread measures how
+        much the trees disagree on a row.
+
+        Raises:
+            ValueError: If the model is not a forest.
+        """
+        if not self.is_forest:
+            raise ValueError("Only forests have per-tree predictions.")
+        X = self._prepare(X)
+        out = np.empty((X.shape[0], len(self.roots)), dtype=np.float64)
+        if not self.jit:
+            tree_values = _tree_values_numpy
+        else:
+            from . import tree_kernels
+
+            tree_values = (
+                tree_kernels.tree_values_parallel
+                if X.shape[0] >= self.PARALLEL_MIN_ROWS
+                else tree_kernels.tree_values_serial
+            )
+        tree_values(
+            X,
+            self.roots,
+            self.scale,
+            self.feature,
+            self.threshold,
+            self.children_left,
+            self.children_right,
+            self.value,
+            out,
+        )
+        return out
+
+    def leaf_values(self, leaves):
+        """
+        Returns the scaled values of the leaves of each tree, of shape
+        (n_samples, n_trees), given their indices within their trees, e.g. as
+        returned by the apply method of a fitted sklearn forest.
+        """
+        return self.scale * self.value[np.asarray(leaves, dtype=np.intp) + self.roots]
+
+    def predict_proba(self, X):
+        """
+        Returns the class probabilities of a classifier.
+        """
+        from scipy.special import expit, logsumexp
+
+        raw = self.raw_predict(X)
+        if self.objective in ("binomial", "exponential"):
+            factor = 2.0 if self.objective == "exponential" else 1.0
+            proba = np.ones((raw.shape[0], 2), dtype=np.float64)
+            proba[:, 1] = expit(factor * raw.ravel())
+            proba[:, 0] -= proba[:, 1]
+            return proba
+        if self.objective == "multinomial":
+            return np.nan_to_num(np.exp(raw - (logsumexp(raw, axis=1)[:, np.newaxis])))
+        raise ValueError("predict_proba is only available for classifiers.")
+
+    def predict(self, X):
+        """
+        Predicts like the compiled estimator's predict method.
+        """
+        if self.objective == "regression":
+            return self.raw_predict(X)[:, 0]
+        return self.classes.take(np.argmax(self.predict_proba(X), axis=1), axis=0)
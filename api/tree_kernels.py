@@ -0,0 +1,63 @@
+import numba
+
+from .tree_engine import BLOCK_ROWS, TREE_LEAF
+
+
+def _accumulate(
+    X,
+    roots,
+    tree_outputs,
+    scale,
+    feature,
+    threshold,
+    children_left,
+    children_right,
+    value,
+    out,
+):
+    # Rows are processed in blocks, one tree at a time, so that the nodes of a
+    # tree stay in cache across the rows of a block. Each row still adds the
+    # trees in order, like sklearn.
+    n_samples = X.shape[0]
+    n_blocks = (n_samples + BLOCK_ROWS - 1) // BLOCK_ROWS
+    for block in numba.prange(n_blocks):
+        start = block * BLOCK_ROWS
+        end = min(start + BLOCK_ROWS, n_samples)
+        for t in range(roots.shape[0]):
+            output = tree_outputs[t]
+            for i in range(start, end):
+                node = roots[t]
+                while children_left[node] != TREE_LEAF:
+                    # Same comparison as sklearn: float32 feature, float64 threshold
+                    if X[i, feature[node]] <= threshold[node]:
+                        node = children_left[node]
+                    else:
+                        node = children_right[node]
+                out[i, output] += scale * value[node]
+
+
+def _tree_values(
+    X, roots, scale, feature, threshold, children_left, children_right, value, out
+):
+    # Same traversal as _accumulate, the leaf value of each tree is stored in
+    # its own column instead of being added
+    n_samples = X.shape[0]
+    n_blocks = (n_samples + BLOCK_ROWS - 1) // BLOCK_ROWS
+    for block in numba.prange(n_blocks):
+        start = block * BLOCK_ROWS
+        end = min(start + BLOCK_ROWS, n_samples)
+        for t in range(roots.shape[0]):
+            for i in range(start, end):
+                node = roots[t]
+                while children_left[node] != TREE_LEAF:
+                    if X[i, feature[node]] <= threshold[node]:
+                        node = children_left[node]
+                    else:
+                        node = children_right[node]
+                out[i, t] = scale * value[node]
+
+
+accumulate_serial = numba.njit(nogil=True, cache=True)(_accumulate)
+accumulate_parallel = numba.njit(nogil=True, cache=True, parallel=True)(_accumulate)
+tree_values_serial = numba.njit(nogil=True, cache=True)(_tree_values)
+tree_values_parallel = numba.njit(nogil=True, cache=True, parallel=True)(_tree_values)
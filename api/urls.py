@@ -1,6 +1,27 @@
 from django.urls import include, path
 
+from .views import (
+    HealthView,
+    MemoryReportView,
+    MicroBatchingStatsView,
+    ModelVersionsView,
+    PredictionCacheStatsView,
+)
+
 urlpatterns = [
     path("heart_disease/", include("heart_disease.urls")),
     path("price_pilot/", include("price_pilot.urls")),
+    path("health/", HealthView.as_view(), name="health"),
+    path("memory/", MemoryReportView.as_view(), name="memory"),
+    path("models/", ModelVersionsView.as_view(), name="models"),
+    path(
+        "prediction_cache/",
+        PredictionCacheStatsView.as_view(),
+        name="prediction_cache",
+    ),
+    path(
+        "micro_batching/",
+        MicroBatchingStatsView.as_view(),
+        name="micro_batching",
+    ),
 ]
@@ -1,3 +1,83 @@
-from django.shortcuts import render
+from django.http import HttpResponse
+from django.views import View
+from rest_framework import response, status, views
 
-# Create your views here.
+from .batching import MicroBatcher
+from .cache import prediction_cache
+from .memory import memory_report
+from .middleware import request_duration, stage_duration
+from .mongo import health
+from .registry import registry
+
+
+class MemoryReportView(views.APIView):
+    """
+    Returns the memory usage of the worker process serving the request, used
+    to check how much of the model memory is shared between workers.
+    """
+
+    def get(self, request, format=None):
+        return response.Response(memory_report(), status=status.HTTP_200_OK)
+
+
+class PredictionCacheStatsView(views.APIView):
+    """
+    Returns the hit and miss counters of the prediction cache of the worker
+    process serving the request.
+    """
+
+    def get(self, request, format=None):
+        return response.Response(prediction_cache.stats(), status=status.HTTP_200_OK)
+
+
+class MicroBatchingStatsView(views.APIView):
+    """
+    Returns the queue depth and batch size histograms of the micro-batchers of
+    the worker process serving the request.
+    """
+
+    def get(self, request, format=None):
+        stats = {
+            name: batcher.stats() for name, batcher in MicroBatcher.instances.items()
+        }
+        return response.Response(stats, status=status.HTTP_200_OK)
+
+
+class ModelVersionsView(views.APIView):
+    """
+    Returns the version of each model served by the worker process serving the
+    request, and the previous version kept in memory to roll back to.
+    """
+
+    def get(self, request, format=None):
+        return response.Response(registry.versions(), status=status.HTTP_200_OK)
+
+
+class HealthView(views.APIView):
+    """
+    Returns the health of the worker process serving the request: 200 when
+    it reaches the database, 503 otherwise, with the round trip time of the
+    ping and the options of the connection pool.
+    """
+
+    def get(self, request, format=None):
+        mongo = health()
+        return response.Response(
+            {"status": "ok" if mongo["ok"] else "unavailable", "mongo": mongo},
+            status=(
+                status.HTTP_200_OK
+                if mongo["ok"]
+                else status.HTTP_503_SERVICE_UNAVAILABLE
+            ),
+        )
+
+
+class MetricsView(View):
+    """
+    Returns the request and stage duration histograms of the worker process
+    serving the request, in the Prometheus text exposition format.
+    """
+
+    def get(self, request):
+        body = request_duration.render() + stage_duration.render()
+        return HttpResponse(body, content_type="text/plain; version=0.0.4")
@@ -0,0 +1,30 @@
+"""
+Gunicorn configuration for IntelliAPI.
+
+The application is imported in the master process before the workers are
+forked (preload_app), which loads and warms up every model once (see
+MODEL_WARMUP). The workers then share the model memory with the master
+copy-on-write, and the memory-mapped arrays of uncompressed artifacts (see
+MODEL_MMAP and the export_models command) through the OS page cache.
+
+The memory used by a worker can be checked at /api/v1/memory/.
+"""
+
+import gc
+
+wsgi_app = "IntelliAPI.wsgi:application"
+preload_app = True
+
+
+def when_ready(server):
+    # Move the objects created while preloading the application to the
+    # permanent generation, so that the garbage collector of the workers does
+    # not write to (and thus copy) the pages holding them.
+    gc.collect()
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    from api.memory import memory_report
+
+    server.log.info(f"Worker {worker.pid} started, memory: {memory_report()}")
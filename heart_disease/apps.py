@@ -4,3 +4,17 @@ from django.apps import AppConfig
 class HeartDiseaseConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'heart_disease'
+
+    def ready(self):
+        from api.registry import registry
+
+        from .predictor import current_version, load_predictor, warm_up_predictor
+        from .recommender import load_messages
+
+        load_messages()
+        registry.register(
+            "heart_disease",
+            load_predictor,
+            warm_up=warm_up_predictor,
+            version=current_version,
+        )
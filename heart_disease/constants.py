@@ -1,3 +1,5 @@
+import os
+
 FEATURES = [
     "age",
     "sex",
@@ -13,3 +15,39 @@ FEATURES = [
     "ca",
     "thal",
 ]
+
+EXPLAIN_MODES = ("exact", "approximate", "table")
+
+MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models")
+MODEL_PATH = os.path.join(MODELS_DIR, "gradient_boosting_model.joblib")
+SCALER_PATH = os.path.join(MODELS_DIR, "scaler.joblib")
+
+# Canned input used to warm up the predictor and in benchmarks
+SAMPLE_INPUT = {
+    "age": 45,
+    "sex": 1,
+    "cp": 1,
+    "trestbps": 120,
+    "chol": 240,
+    "fbs": 1,
+    "restecg": 1,
+    "thalach": 150,
+    "exang": 0,
+    "oldpeak": 2.3,
+    "slope": 2,
+    "ca": 0,
+    "thal": 2,
+}
+
+RECOMMENDATIONS_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "recommendations"
+)
+DEFAULT_LANGUAGE = "en"
+
+# Recommendations triggered by the patient's data: (key, feature, comparison,
+# threshold), where the comparison is one of "gt", "ge", "lt", "le" or "eq"
+RECOMMENDATION_RULES = (
+    ("high_blood_pressure", "trestbps", "gt", 140),  # high blood pressure
+    ("high_cholesterol", "chol", "gt", 240),  # high cholesterol
+    ("high_fbs", "fbs", "eq", 1),  # 1 indicates FBS > 120 mg/dl
+)
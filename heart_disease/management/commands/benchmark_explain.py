@@ -0,0 +1,70 @@
+import statistics
+import time
+
+import shap
+from django.core.management.base import BaseCommand
+
+from ...constants import EXPLAIN_MODES, MODEL_PATH, SAMPLE_INPUT, SCALER_PATH
+from ...predictor import HeartDiseasePredictor
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures the per-request latency of HeartDiseasePredictor.explain when the "
+        "SHAP explainer is rebuilt on every call versus cached on the predictor."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--model",
+            default=MODEL_PATH,
+            help="Path to the gradient boosting model.",
+        )
+        parser.add_argument(
+            "--scaler",
+            default=SCALER_PATH,
+            help="Path to the fitted scaler.",
+        )
+        parser.add_argument(
+            "--iterations",
+            type=int,
+            default=200,
+            help="Number of timed explanations per scenario.",
+        )
+
+    def handle(self, *args, **options):
+        iterations = options["iterations"]
+        predictor = HeartDiseasePredictor(options["model"], options["scaler"])
+
+        def rebuild():
+            # Behaviour before the explainer was cached on the predictor
+            preprocessed_input = predictor.preprocess_input(
+                SAMPLE_INPUT, predictor.scaler
+            )
+            shap.TreeExplainer(predictor.model).shap_values(preprocessed_input)
+
+        scenarios = [("rebuild", rebuild)]
+        for mode in EXPLAIN_MODES:
+            cached = HeartDiseasePredictor(
+                options["model"], options["scaler"], explain_mode=mode
+            )
+            cached.explain(SAMPLE_INPUT)  # build the explainer outside the timings
+            scenarios.append(
+                (f"cached-{mode}", lambda cached=cached: cached.explain(SAMPLE_INPUT))
+            )
+
+        self.stdout.write(
+            f"{'scenario':<20}{'mean ms':>10}{'p50 ms':>10}{'p99 ms':>10}"
+        )
+        for name, func in scenarios:
+            timings = []
+            for _ in range(iterations):
+                start = time.perf_counter()
+                func()
+                timings.append((time.perf_counter() - start) * 1000)
+            timings.sort()
+            p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+            self.stdout.write(
+                f"{name:<20}{statistics.mean(timings):>10.3f}"
+                f"{statistics.median(timings):>10.3f}{p99:>10.3f}"
+            )
@@ -0,0 +1,114 @@
+import os
+import shutil
+import time
+
+import numpy as np
+import shap
+from django.core.management.base import BaseCommand
+
+from api.loading import artifact_version, file_sha1, load_model
+
+from ...constants import FEATURES
+from ...predictor import HeartDiseasePredictor, current_artifacts
+from ...shap_table import ShapTable, shap_table_path
+
+# Range of each input drawn for the report, on the grid of the serializer
+REPORT_RANGES = {
+    "age": (29, 77, 1),
+    "sex": (0, 1, 1),
+    "cp": (0, 3, 1),
+    "trestbps": (94, 200, 1),
+    "chol": (126, 564, 1),
+    "fbs": (0, 1, 1),
+    "restecg": (0, 2, 1),
+    "thalach": (71, 202, 1),
+    "exang": (0, 1, 1),
+    "oldpeak": (0, 6.2, 0.1),
+    "slope": (0, 2, 1),
+    "ca": (0, 3, 1),
+    "thal": (0, 3, 1),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Builds the precomputed SHAP table of the heart disease model (served with "
+        "HEART_DISEASE_EXPLAIN_MODE=table), next to the model artifact, and reports "
+        "its accuracy against the exact TreeExplainer values and the latency of "
+        "both on random inputs."
+    )
+
+    def add_arguments(self, parser):
+        _, artifacts = current_artifacts()
+        parser.add_argument("--model", default=artifacts["model"])
+        parser.add_argument("--scaler", default=artifacts["scaler"])
+        parser.add_argument(
+            "--samples",
+            type=int,
+            default=1000,
+            help="Number of random inputs of the report.",
+        )
+
+    def handle(self, *args, **options):
+        path = options["model"]
+        start = time.perf_counter()
+        table = ShapTable.build(load_model(path))
+        target = shap_table_path(path)
+        temporary_path = f"{target}.tmp"
+        shutil.rmtree(temporary_path, ignore_errors=True)
+        table.save(temporary_path, artifact_version(path), file_sha1(path))
+        shutil.rmtree(target, ignore_errors=True)
+        os.replace(temporary_path, target)
+        size = sum(
+            os.path.getsize(os.path.join(target, name)) for name in os.listdir(target)
+        )
+        self.stdout.write(
+            f"Built {target} in {time.perf_counter() - start:.1f} s ({size} bytes, "
+            f"{int(table.filled.sum())} decision patterns)"
+        )
+        self.report(table, path, options["scaler"], options["samples"])
+
+    def report(self, table, model_path, scaler_path, samples):
+        predictor = HeartDiseasePredictor(model_path, scaler_path)
+        X = predictor.preprocess_batch(self.random_inputs(samples), predictor.scaler)
+        explainer = shap.TreeExplainer(predictor.model)
+
+        exact = explainer.shap_values(X)
+        values, covered = table.explain(X)
+        error = np.abs(values - exact)[covered]
+        self.stdout.write(
+            f"Covered inputs: {covered.mean():.2%}, max abs error: "
+            f"{error.max(initial=0):.3g}, mean abs error: "
+            f"{error.mean() if error.size else 0:.3g}"
+        )
+
+        self.stdout.write(f"{'':<20}{'exact ms':>12}{'table ms':>12}{'speedup':>10}")
+        for name, rows in (("single input", X[:1]), (f"batch of {samples}", X)):
+            timings = [
+                self.time(lambda: explainer.shap_values(rows)),
+                self.time(lambda: table.explain(rows)),
+            ]
+            self.stdout.write(
+                f"{name:<20}{timings[0]:>12.3f}{timings[1]:>12.3f}"
+                f"{timings[0] / timings[1]:>10.1f}"
+            )
+
+    @staticmethod
+    def time(func, iterations=50):
+        func()
+        start = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        return (time.perf_counter() - start) / iterations * 1000
+
+    @staticmethod
+    def random_inputs(samples):
+        rng = np.random.default_rng(0)
+        columns = {
+            feature: rng.choice(np.arange(low, high + step / 2, step), samples)
+            for feature, (low, high, step) in REPORT_RANGES.items()
+        }
+        return [
+            {feature: float(columns[feature][i]) for feature in FEATURES}
+            for i in range(samples)
+        ]
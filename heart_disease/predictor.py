@@ -1,25 +1,142 @@
-import joblib
-import pandas as pd
-import shap
+import logging
+import threading
 
-from .constants import FEATURES
+import numpy as np
+from django.conf import settings
+
+from api.artifacts import CompiledStandardScaler
+from api.features import FeatureSchema
+from api.inference import build_inference_engine
+from api.loading import artifact_version, load_compiled, load_model, read_manifest
+from api.timing import span
+
+from .constants import (
+    EXPLAIN_MODES,
+    FEATURES,
+    MODEL_PATH,
+    MODELS_DIR,
+    SAMPLE_INPUT,
+    SCALER_PATH,
+)
+from .shap_table import load_shap_table
+
+logger = logging.getLogger(__name__)
+
+# Missing features are NaN, so that incomplete rows of a file are not scored
+FEATURE_SCHEMA = FeatureSchema(FEATURES, default=np.nan)
 
 
 class HeartDiseasePredictor:
-    def __init__(self, model_path, scaler_path):
+    def __init__(
+        self,
+        model_path,
+        scaler_path,
+        explain_mode="exact",
+        backend="sklearn",
+        version=None,
+    ):
         """
         Initializes the HeartDiseasePredictor with the trained model and scaler.
+
+        The explain mode selects how SHAP values are computed: "exact" uses the
+        path-dependent TreeSHAP algorithm, "approximate" uses the faster
+        Saabas per-tree path attribution, "table" looks the TreeSHAP values up
+        in the precomputed table of the model (see heart_disease.shap_table),
+        and falls back to "exact" for the inputs the table does not cover or
+        when there is no up to date table. The backend selects how predictions
+        are computed, see api.inference. The version defaults to the
+        fingerprint of the artifacts.
+        """
+        if explain_mode not in EXPLAIN_MODES:
+            raise ValueError(
+                f"Unknown explain mode {explain_mode!r}, expected one of {EXPLAIN_MODES}."
+            )
+        self.model_path = model_path
+        self._model = None
+        self._model_lock = threading.Lock()
+        self.scaler = load_compiled(scaler_path)
+        if self.scaler is None:
+            self.scaler = load_model(scaler_path)
+        self.version = version or artifact_version(model_path, scaler_path)
+        # A compiled model predicts with its compiled engine, and the fitted
+        # estimator is only loaded when an explanation is first requested
+        self.engine = load_compiled(model_path, backend)
+        if self.engine is None:
+            self.engine = build_inference_engine(self.model, backend)
+        self.explain_mode = explain_mode
+        self.shap_table = (
+            load_shap_table(model_path) if explain_mode == "table" else None
+        )
+        self._explainer = None
+        self._explainer_lock = threading.Lock()
+        self._rows = threading.local()
+
+    @property
+    def model(self):
+        """
+        Returns the fitted estimator, loaded on first use.
+        """
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    self._model = load_model(self.model_path)
+        return self._model
+
+    def _row_buffer(self):
+        # Single predictions preprocess their input into a row allocated once
+        # per thread: the row is only used until the prediction returns
+        row = getattr(self._rows, "row", None)
+        if row is None:
+            row = self._rows.row = np.empty((1, len(FEATURES)), dtype=np.float64)
+        return row
+
+    @property
+    def explainer(self):
+        """
+        Returns the SHAP TreeExplainer of the loaded model, built once on first use.
+        """
+        if self._explainer is None:
+            with self._explainer_lock:
+                if self._explainer is None:
+                    # Imported on demand, importing shap takes several seconds
+                    import shap
+
+                    self._explainer = shap.TreeExplainer(self.model)
+        return self._explainer
+
+    def shap_values(self, preprocessed_input):
+        """
+        Returns the SHAP values of a matrix of preprocessed inputs, computed
+        according to the explain mode.
+        """
+        with span("explain"):
+            if self.shap_table is not None:
+                shap_values, covered = self.shap_table.explain(preprocessed_input)
+                if not covered.all():
+                    shap_values[~covered] = self.explainer.shap_values(
+                        preprocessed_input[~covered]
+                    )
+                return shap_values
+            return self.explainer.shap_values(
+                preprocessed_input, approximate=self.explain_mode == "approximate"
+            )
+
+    def predict_matrix(self, preprocessed_input):
+        """
+        Returns the predictions of a matrix of preprocessed inputs.
         """
-        self.model = joblib.load(model_path)
-        self.scaler = joblib.load(scaler_path)
+        with span("predict"):
+            return self.engine.predict(preprocessed_input)
 
     def predict(self, input_data):
         """
         Predicts the cardiovascular risk using the trained model.
         """
         try:
-            preprocessed_input = self.preprocess_input(input_data, self.scaler)
-            prediction = self.model.predict(preprocessed_input)
+            preprocessed_input = self.preprocess_input(
+                input_data, self.scaler, out=self._row_buffer()
+            )
+            prediction = self.predict_matrix(preprocessed_input)
             return self.post_process_prediction(prediction)
         except Exception as e:
             print(f"Prediction error: {str(e)}")
@@ -30,22 +147,199 @@ class HeartDiseasePredictor:
         Explains the model's prediction using SHAP.
         """
         try:
-            preprocessed_input = self.preprocess_input(input_data, self.scaler)
-            explainer = shap.TreeExplainer(self.model)
-            shap_values = explainer.shap_values(preprocessed_input)
-            return shap_values[0]
+            preprocessed_input = self.preprocess_input(
+                input_data, self.scaler, out=self._row_buffer()
+            )
+            return self.shap_values(preprocessed_input)[0]
         except Exception as e:
             print(f"Explanation error: {str(e)}")
             return None
 
+    def predict_batch(self, input_records):
+        """
+        Predicts the cardiovascular risk of several patients in one model call.
+
+        Raises:
+            Exception: Any error of the preprocessing or of the model, logged
+                with its traceback.
+        """
+        try:
+            preprocessed_input = self.preprocess_batch(input_records, self.scaler)
+            return self.predict_matrix(preprocessed_input)
+        except Exception:
+            logger.exception("Batch prediction error.")
+            raise
+
+    def explain_batch(self, input_records):
+        """
+        Explains the model's predictions of several patients in one SHAP call.
+
+        Raises:
+            Exception: Any error of the preprocessing or of the explainer,
+                logged with its traceback.
+        """
+        try:
+            preprocessed_input = self.preprocess_batch(input_records, self.scaler)
+            return self.shap_values(preprocessed_input)
+        except Exception:
+            logger.exception("Batch explanation error.")
+            raise
+
+    def predict_and_explain(self, input_data, explain=True):
+        """
+        Predicts the cardiovascular risk and explains it with SHAP, preprocessing
+        the input only once. Returns the prediction and the SHAP values, which
+        are None when explain is False.
+        """
+        preprocessed_input = self.preprocess_input(
+            input_data, self.scaler, out=self._row_buffer()
+        )
+        predictions, shap_values = self._predict_and_explain(
+            preprocessed_input, explain
+        )
+        if shap_values is not None:
+            shap_values = shap_values[0]
+        return self.post_process_prediction(predictions), shap_values
+
+    def predict_and_explain_batch(self, input_records, explain=True):
+        """
+        Batch version of predict_and_explain, returning one prediction and one
+        row of SHAP values per input record.
+        """
+        preprocessed_input = self.preprocess_batch(input_records, self.scaler)
+        return self._predict_and_explain(preprocessed_input, explain)
+
+    def predict_and_explain_matrix(self, matrix, explain=True):
+        """
+        Batch version of predict_and_explain from the unscaled matrix of the
+        inputs, as returned by to_matrix. The matrix is left unchanged, so
+        that the caller can still use the raw features, e.g. for the
+        recommendations.
+        """
+        with span("scale"):
+            preprocessed_input = self.scale(matrix.copy(), self.scaler)
+        return self._predict_and_explain(preprocessed_input, explain)
+
+    def predict_and_explain_rows(self, input_records, explain):
+        """
+        Predicts a list of inputs at once and explains the ones whose explain
+        flag is set, with a single SHAP call. Returns the predictions and a
+        list with the SHAP values of each input, None for the ones that are
+        not explained.
+        """
+        preprocessed_input = self.preprocess_batch(input_records, self.scaler)
+        predictions = self.predict_matrix(preprocessed_input)
+        shap_rows = [None] * len(input_records)
+        explained = np.flatnonzero(explain)
+        if len(explained):
+            shap_values = self.shap_values(preprocessed_input[explained])
+            for i, row in zip(explained, shap_values):
+                shap_rows[i] = row
+        return predictions, shap_rows
+
+    def score_frame(self, frame, explain=False):
+        """
+        Predicts the cardiovascular risk of each row of a DataFrame of patients
+        with one model call, and explains the predictions with one SHAP call.
+        Rows with a missing or non-numeric feature are not scored.
+
+        Parameters:
+            frame (DataFrame): Patients, with one column per feature.
+            explain (bool): Whether to add a shap_<feature> column per feature.
+
+        Returns:
+            DataFrame: The `prediction` of each row (null for rows that are
+            not scored) and its SHAP values, with the index of the frame.
+        """
+        import pandas as pd
+
+        matrix = FEATURE_SCHEMA.transform_frame(frame)
+        complete = ~np.isnan(matrix).any(axis=1)
+        preprocessed_input = self.scale(matrix[complete], self.scaler)
+
+        scores = pd.DataFrame(index=frame.index)
+        predictions = np.zeros(len(frame), dtype=np.int64)
+        predictions[complete] = self.predict_matrix(preprocessed_input)
+        scores["prediction"] = pd.arrays.IntegerArray(predictions, ~complete)
+        if explain:
+            shap_values = np.full(matrix.shape, np.nan)
+            if complete.any():
+                shap_values[complete] = self.shap_values(preprocessed_input)
+            for j, feature in enumerate(FEATURES):
+                scores[f"shap_{feature}"] = shap_values[:, j]
+        return scores
+
+    def _predict_and_explain(self, preprocessed_input, explain):
+        predictions = self.predict_matrix(preprocessed_input)
+        shap_values = None
+        if explain:
+            shap_values = self.shap_values(preprocessed_input)
+        return predictions, shap_values
+
     @staticmethod
-    def preprocess_input(input_data, scaler):
+    def preprocess_input(input_data, scaler, out=None):
         """
         Preprocesses the input data to the format required by the model.
+
+        Parameters:
+            input_data (dict): Validated input of a patient.
+            scaler: Fitted scaler of the features.
+            out (ndarray): Optional preallocated float64 array of shape
+                (1, n_features) the features are written into, and scaled in
+                place by a StandardScaler.
+
+        Returns:
+            ndarray: Scaled feature values, of shape (1, n_features).
+        """
+        with span("preprocess"):
+            row = np.empty((1, len(FEATURES)), dtype=np.float64) if out is None else out
+            for i, feature in enumerate(FEATURES):
+                row[0, i] = input_data[feature]
+        with span("scale"):
+            return HeartDiseasePredictor.scale(row, scaler)
+
+    @staticmethod
+    def preprocess_batch(input_records, scaler):
+        """
+        Preprocesses a list of inputs into one scaled matrix, one row per input.
         """
-        df = pd.DataFrame([input_data], columns=FEATURES)
-        scaled_data = scaler.transform(df)
-        return scaled_data
+        with span("preprocess"):
+            matrix = HeartDiseasePredictor.to_matrix(input_records)
+        with span("scale"):
+            return HeartDiseasePredictor.scale(matrix, scaler)
+
+    @staticmethod
+    def to_matrix(input_records):
+        """
+        Returns the unscaled float64 matrix of a list of inputs, one row per
+        input and one column per feature in FEATURES order.
+        """
+        matrix = np.empty((len(input_records), len(FEATURES)), dtype=np.float64)
+        for i, record in enumerate(input_records):
+            for j, feature in enumerate(FEATURES):
+                matrix[i, j] = record[feature]
+        return matrix
+
+    @staticmethod
+    def scale(matrix, scaler):
+        """
+        Scales a float64 matrix of features in FEATURES order. A StandardScaler
+        is applied in place, without going through pandas, any other scaler is
+        given a DataFrame with the feature names it was fitted with.
+        """
+        if not isinstance(scaler, CompiledStandardScaler):
+            # Imported on demand, compiled scalers need neither sklearn nor pandas
+            from sklearn.preprocessing import StandardScaler
+
+            if not isinstance(scaler, StandardScaler):
+                import pandas as pd
+
+                return scaler.transform(pd.DataFrame(matrix, columns=FEATURES))
+        if scaler.with_mean:
+            matrix -= scaler.mean_
+        if scaler.with_std:
+            matrix /= scaler.scale_
+        return matrix
 
     @staticmethod
     def post_process_prediction(prediction):
@@ -54,3 +348,42 @@ class HeartDiseasePredictor:
         """
         # TODO: Implement any postprocessing needed for the prediction
         return prediction[0]
+
+
+def current_artifacts():
+    """
+    Returns the version and the paths of the model and scaler to serve, listed
+    by the manifest of the models directory (see api.loading.read_manifest).
+    """
+    return read_manifest(MODELS_DIR, {"model": MODEL_PATH, "scaler": SCALER_PATH})
+
+
+def current_version():
+    return current_artifacts()[0]
+
+
+def load_predictor():
+    """
+    Loads the HeartDiseasePredictor served by the API, registered in the model
+    registry when the app is ready.
+    """
+    version, artifacts = current_artifacts()
+    return HeartDiseasePredictor(
+        artifacts["model"],
+        artifacts["scaler"],
+        explain_mode=settings.HEART_DISEASE_EXPLAIN_MODE,
+        backend=settings.HEART_DISEASE_INFERENCE_BACKEND,
+        version=version,
+    )
+
+
+def warm_up_predictor(predictor):
+    """
+    Runs a canned prediction and explanation so that the SHAP explainer is
+    built before the first request. With HEART_DISEASE_WARMUP_EXPLAINER
+    disabled, only the prediction is run, and shap is imported and the
+    explainer built by the first request asking for an explanation.
+    """
+    predictor.predict_and_explain(
+        SAMPLE_INPUT, explain=settings.HEART_DISEASE_WARMUP_EXPLAINER
+    )
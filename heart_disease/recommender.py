@@ -0,0 +1,109 @@
+import glob
+import json
+import logging
+import os
+import re
+from types import MappingProxyType
+
+import numpy as np
+
+from .constants import (
+    DEFAULT_LANGUAGE,
+    FEATURES,
+    RECOMMENDATION_RULES,
+    RECOMMENDATIONS_DIR,
+)
+
+logger = logging.getLogger(__name__)
+
+COMPARISONS = {
+    "gt": np.greater,
+    "ge": np.greater_equal,
+    "lt": np.less,
+    "le": np.less_equal,
+    "eq": np.equal,
+}
+
+RULE_KEYS = tuple(key for key, _, _, _ in RECOMMENDATION_RULES)
+RULE_COLUMNS = np.array(
+    [FEATURES.index(feature) for _, feature, _, _ in RECOMMENDATION_RULES],
+    dtype=np.intp,
+)
+
+_messages = None
+
+
+def load_messages():
+    """
+    Loads every recommendations_<lang>.json file into an immutable table of
+    messages per language. Called once when the app is ready.
+    """
+    global _messages
+    table = {}
+    pattern = os.path.join(RECOMMENDATIONS_DIR, "recommendations_*.json")
+    for file_path in glob.glob(pattern):
+        lang = re.fullmatch(r"recommendations_(.+)\.json", os.path.basename(file_path))
+        with open(file_path, "r", encoding="utf-8") as file:
+            table[lang.group(1)] = MappingProxyType(json.load(file))
+    if DEFAULT_LANGUAGE not in table:
+        raise FileNotFoundError(
+            f"Recommendations file for language {DEFAULT_LANGUAGE} not found."
+        )
+    _messages = MappingProxyType(table)
+    return _messages
+
+
+def get_messages(lang=DEFAULT_LANGUAGE):
+    """
+    Returns the recommendation messages of a language, falling back to the
+    default language when there are no messages in that language.
+    """
+    messages = _messages if _messages is not None else load_messages()
+    try:
+        return messages[lang]
+    except KeyError:
+        logger.debug(f"Recommendations file for language {lang} not found.")
+        return messages[DEFAULT_LANGUAGE]
+
+
+def recommend(input_data, prediction, lang=DEFAULT_LANGUAGE):
+    """
+    Returns the recommendations of a patient from their data and prediction.
+    """
+    messages = get_messages(lang)
+    recommendations = {}
+    for key, feature, comparison, threshold in RECOMMENDATION_RULES:
+        if COMPARISONS[comparison](input_data[feature], threshold):
+            recommendations[key] = messages[key]
+    risk = "high_risk" if prediction == 1 else "low_risk"
+    recommendations[risk] = messages[risk]
+    return recommendations
+
+
+def rule_flags(matrix):
+    """
+    Evaluates every rule over a batch of unscaled inputs, of shape
+    (n_samples, len(FEATURES)). Returns a boolean array of shape
+    (n_samples, len(RECOMMENDATION_RULES)).
+    """
+    flags = np.empty((matrix.shape[0], len(RECOMMENDATION_RULES)), dtype=bool)
+    for j, (_, _, comparison, threshold) in enumerate(RECOMMENDATION_RULES):
+        COMPARISONS[comparison](matrix[:, RULE_COLUMNS[j]], threshold, out=flags[:, j])
+    return flags
+
+
+def recommend_batch(matrix, predictions, lang=DEFAULT_LANGUAGE):
+    """
+    Batch version of recommend, from a matrix of unscaled inputs in FEATURES
+    order and the predictions of its rows.
+    """
+    messages = get_messages(lang)
+    flags = rule_flags(matrix).tolist()
+    high_risk = (np.asarray(predictions) == 1).tolist()
+    recommendations = []
+    for row_flags, is_high_risk in zip(flags, high_risk):
+        row = {key: messages[key] for key, flag in zip(RULE_KEYS, row_flags) if flag}
+        risk = "high_risk" if is_high_risk else "low_risk"
+        row[risk] = messages[risk]
+        recommendations.append(row)
+    return recommendations
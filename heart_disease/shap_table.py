@@ -0,0 +1,213 @@
+import itertools
+import json
+import os
+
+import numpy as np
+from django.conf import settings
+
+from api.loading import artifact_version, file_sha1
+
+SHAP_TABLE_SUFFIX = ".shap_table"
+META_NAME = "meta.json"
+ARRAYS = ("feature", "threshold", "values", "filled")
+
+# Trees with more splits than this cannot be tabulated: the table of a tree has
+# one row per combination of its split decisions
+MAX_SPLITS = 10
+# Maximum number of representative inputs explained per tree
+MAX_CELLS = 4096
+
+
+class ShapTable:
+    """
+    Precomputed SHAP values of a gradient boosting classifier.
+
+    The path-dependent TreeSHAP values of a tree only depend on the input
+    through the decisions taken at the splits of the tree. The table stores,
+    for each tree, the SHAP values of every combination of its split
+    decisions reached by some input, computed once with shap by explaining one
+    representative input per cell of the grid formed by the thresholds of the
+    tree. Explaining an input then comes down to evaluating the splits of
+    every tree, looking up the row of each tree and adding the rows in tree
+    order, as shap does.
+
+    The lookup covers every input whose decision pattern was reached while
+    building the table, which in practice is every input; `explain` flags the
+    other ones so that the caller can explain them with the live explainer.
+    """
+
+    def __init__(self, feature, threshold, values, filled):
+        """
+        Parameters:
+            feature, threshold (ndarray): Feature and threshold of each split,
+                of shape (n_trees, n_splits). Trees with fewer splits are
+                padded with splits that always go left.
+            values (ndarray): SHAP values of each decision pattern of each
+                tree, of shape (n_trees, 2 ** n_splits, n_features).
+            filled (ndarray): Whether each decision pattern was tabulated, of
+                shape (n_trees, 2 ** n_splits).
+        """
+        self.feature = feature
+        self.threshold = threshold
+        self.values = values
+        self.filled = filled
+        self._trees = np.arange(feature.shape[0])[np.newaxis, :]
+
+    @property
+    def n_features(self):
+        return self.values.shape[2]
+
+    @staticmethod
+    def patterns(X, feature, threshold):
+        """
+        Returns the decision pattern of each tree for each row of X, of shape
+        (n_samples, n_trees): bit k is set when the row goes left at split k
+        of the tree.
+        """
+        # Same comparison as shap and sklearn: float32 feature, float64 threshold
+        X = np.asarray(X, dtype=np.float32)
+        decisions = X[:, feature] <= threshold
+        return decisions @ (1 << np.arange(feature.shape[1]))
+
+    def explain(self, X):
+        """
+        Looks up the SHAP values of a matrix of preprocessed inputs.
+
+        Returns:
+            tuple: The SHAP values (ndarray of shape (n_samples, n_features))
+            and a boolean array flagging the rows whose values were found in
+            the table. The values of the other rows are undefined.
+        """
+        patterns = self.patterns(X, self.feature, self.threshold)
+        covered = self.filled[self._trees, patterns].all(axis=1)
+        # Summed over the trees in order, one tree at a time
+        return self.values[self._trees, patterns].sum(axis=1), covered
+
+    @classmethod
+    def build(cls, model):
+        """
+        Tabulates the SHAP values of a fitted binary GradientBoostingClassifier.
+        """
+        import shap
+
+        ensemble = shap.TreeExplainer(model).model
+        n_features = model.n_features_in_
+        splits = [np.flatnonzero(tree.children_left >= 0) for tree in ensemble.trees]
+        n_splits = max(len(nodes) for nodes in splits)
+        if n_splits > MAX_SPLITS:
+            raise ValueError(
+                f"The trees have up to {n_splits} splits, at most {MAX_SPLITS} "
+                "can be tabulated."
+            )
+
+        n_trees = len(ensemble.trees)
+        feature = np.zeros((n_trees, n_splits), dtype=np.intp)
+        threshold = np.full((n_trees, n_splits), np.inf)
+        values = np.zeros((n_trees, 2**n_splits, n_features))
+        filled = np.zeros((n_trees, 2**n_splits), dtype=bool)
+        for t, (tree, nodes) in enumerate(zip(ensemble.trees, splits)):
+            feature[t, : len(nodes)] = tree.features[nodes]
+            threshold[t, : len(nodes)] = tree.thresholds[nodes]
+
+            X = cls._representatives(
+                tree.features[nodes], tree.thresholds[nodes], n_features
+            )
+            patterns = cls.patterns(X, feature[t : t + 1], threshold[t : t + 1])[:, 0]
+            explainer = shap.TreeExplainer(
+                {"trees": [cls._tree_dict(tree)], "input_dtype": np.float32}
+            )
+            values[t, patterns] = explainer.shap_values(X)
+            filled[t, patterns] = True
+        return cls(feature, threshold, values, filled)
+
+    @staticmethod
+    def _representatives(features, thresholds, n_features):
+        # One input per cell of the grid of the thresholds of a tree: below the
+        # lowest threshold, between each pair of consecutive thresholds and
+        # above the highest one, for each feature used by the tree
+        used = np.unique(features)
+        grids = []
+        for f in used:
+            cuts = np.unique(thresholds[features == f])
+            grids.append(
+                np.concatenate(
+                    ([cuts[0] - 1], (cuts[:-1] + cuts[1:]) / 2, [cuts[-1] + 1])
+                )
+            )
+        n_cells = int(np.prod([len(grid) for grid in grids]))
+        if n_cells > MAX_CELLS:
+            raise ValueError(f"A tree has {n_cells} cells, at most {MAX_CELLS}.")
+        X = np.zeros((n_cells, n_features), dtype=np.float32)
+        if len(used):
+            X[:, used] = np.array(list(itertools.product(*grids)), dtype=np.float32)
+        return X
+
+    @staticmethod
+    def _tree_dict(tree):
+        return {
+            "children_left": tree.children_left,
+            "children_right": tree.children_right,
+            "children_default": tree.children_default,
+            "features": tree.features,
+            "thresholds": tree.thresholds,
+            "values": tree.values,
+            "node_sample_weight": tree.node_sample_weight,
+        }
+
+    def save(self, path, source_version, source_sha1):
+        """
+        Writes the table to a directory of .npy files and a meta.json file.
+
+        Parameters:
+            path (str): Directory of the table.
+            source_version (str): Fingerprint of the model artifact the table
+                was built from, used to detect stale tables.
+            source_sha1 (str): SHA-1 of the model artifact.
+        """
+        os.makedirs(path, exist_ok=True)
+        for name in ARRAYS:
+            np.save(os.path.join(path, f"{name}.npy"), getattr(self, name))
+        meta = {
+            "source_version": source_version,
+            "source_sha1": source_sha1,
+        }
+        # Written last, an interrupted build leaves no loadable table
+        with open(os.path.join(path, META_NAME), "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2)
+
+    @classmethod
+    def load(cls, path, mmap_mode=None):
+        """
+        Loads a table written by save, memory-mapping its arrays with the
+        given mode.
+        """
+        with open(os.path.join(path, META_NAME), encoding="utf-8") as f:
+            meta = json.load(f)
+        arrays = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode)
+            for name in ARRAYS
+        }
+        return cls(**arrays), meta
+
+
+def shap_table_path(model_path):
+    """
+    Returns the path of the SHAP table of a model artifact.
+    """
+    return os.path.splitext(model_path)[0] + SHAP_TABLE_SUFFIX
+
+
+def load_shap_table(model_path):
+    """
+    Returns the SHAP table built from the current content of a model artifact
+    (see the build_shap_table command), or None if there is none. Its arrays
+    are memory-mapped with MODEL_MMAP.
+    """
+    path = shap_table_path(model_path)
+    if not os.path.exists(os.path.join(path, META_NAME)):
+        return None
+    table, meta = ShapTable.load(path, mmap_mode="r" if settings.MODEL_MMAP else None)
+    if meta["source_version"] != artifact_version(model_path):
+        if meta["source_sha1"] != file_sha1(model_path):
+            return None
+    return table
@@ -1,3 +1,131 @@
-from django.test import TestCase
+import tempfile
 
-# Create your tests here.
+import numpy as np
+from django.test import SimpleTestCase
+
+from api.loading import artifact_version, file_sha1
+from api.standins import train_heart_disease
+
+from .constants import FEATURES, SAMPLE_INPUT
+from .predictor import HeartDiseasePredictor
+from .shap_table import ShapTable, shap_table_path
+
+
+class HeartDiseaseTestCase(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.model_path, cls.scaler_path = train_heart_disease(
+            cls.directory.name, n_samples=300
+        )
+        cls.predictor = HeartDiseasePredictor(cls.model_path, cls.scaler_path)
+        rng = np.random.default_rng(1)
+        cls.records = [
+            {
+                feature: value + rng.integers(-2, 3)
+                for feature, value in SAMPLE_INPUT.items()
+            }
+            for _ in range(40)
+        ]
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+        super().tearDownClass()
+
+
+class ShapTableTests(HeartDiseaseTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.table = ShapTable.build(cls.predictor.model)
+
+    def test_matches_tree_explainer(self):
+        X = self.predictor.preprocess_batch(self.records, self.predictor.scaler)
+        shap_values, covered = self.table.explain(X)
+        self.assertTrue(covered.all())
+        np.testing.assert_allclose(
+            shap_values,
+            self.predictor.explainer.shap_values(X),
+            rtol=0,
+            atol=1e-10,
+        )
+
+    def test_predictor_explains_with_the_saved_table(self):
+        self.table.save(
+            shap_table_path(self.model_path),
+            artifact_version(self.model_path),
+            file_sha1(self.model_path),
+        )
+        predictor = HeartDiseasePredictor(
+            self.model_path, self.scaler_path, explain_mode="table"
+        )
+        self.assertIsNotNone(predictor.shap_table)
+        X = predictor.preprocess_batch(self.records, predictor.scaler)
+        np.testing.assert_allclose(
+            predictor.shap_values(X),
+            self.predictor.shap_values(X),
+            rtol=0,
+            atol=1e-10,
+        )
+
+
+class ScoreFrameTests(HeartDiseaseTestCase):
+    def test_scores_complete_rows_like_predict(self):
+        import pandas as pd
+
+        frame = pd.DataFrame(self.records, index=range(100, 140))
+        frame.loc[105, "chol"] = np.nan
+        frame["age"] = frame["age"].astype(object)
+        frame.loc[107, "age"] = "unknown"
+        scores = self.predictor.score_frame(frame, explain=True)
+
+        self.assertEqual(list(scores.index), list(frame.index))
+        self.assertEqual(
+            list(scores.columns),
+            ["prediction"] + [f"shap_{feature}" for feature in FEATURES],
+        )
+        self.assertEqual(list(scores.index[scores["prediction"].isna()]), [105, 107])
+
+        complete = [record for i, record in enumerate(self.records) if i not in (5, 7)]
+        X = self.predictor.preprocess_batch(complete, self.predictor.scaler)
+        scored = scores.drop(index=[105, 107])
+        np.testing.assert_array_equal(
+            scored["prediction"].to_numpy(dtype=np.int64),
+            self.predictor.predict_matrix(X),
+        )
+        np.testing.assert_allclose(
+            scored[[f"shap_{feature}" for feature in FEATURES]].to_numpy(),
+            self.predictor.shap_values(X),
+        )
+
+    def test_single_predictions_match_the_batch(self):
+        predictions = self.predictor.predict_batch(self.records)
+        shap_values = self.predictor.explain_batch(self.records)
+        for i, record in enumerate(self.records):
+            self.assertEqual(self.predictor.predict(record), predictions[i])
+            np.testing.assert_allclose(
+                self.predictor.explain(record), shap_values[i], atol=1e-12
+            )
+
+
+class PredictBatchTests(HeartDiseaseTestCase):
+    def test_predict_and_explain_matrix_keeps_the_raw_features(self):
+        matrix = self.predictor.to_matrix(self.records)
+        raw = matrix.copy()
+        predictions, shap_values = self.predictor.predict_and_explain_matrix(matrix)
+        np.testing.assert_array_equal(matrix, raw)
+
+        expected = self.predictor.predict_and_explain_batch(self.records)
+        np.testing.assert_array_equal(predictions, expected[0])
+        np.testing.assert_array_equal(shap_values, expected[1])
+
+    def test_batch_errors_are_raised(self):
+        records = [{**self.records[0], "age": "old"}]
+        with self.assertLogs("heart_disease.predictor", "ERROR"):
+            with self.assertRaises(ValueError):
+                self.predictor.predict_batch(records)
+        with self.assertLogs("heart_disease.predictor", "ERROR"):
+            with self.assertRaises(ValueError):
+                self.predictor.explain_batch(records)
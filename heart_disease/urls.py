@@ -1,7 +1,21 @@
 from django.urls import path
 
-from .views import HeartDiseasePredictorView
+from .views import (
+    AsyncHeartDiseasePredictorView,
+    HeartDiseaseBatchPredictorView,
+    HeartDiseasePredictorView,
+)
 
 urlpatterns = [
     path("predict/", HeartDiseasePredictorView.as_view(), name="predict"),
+    path(
+        "predict_async/",
+        AsyncHeartDiseasePredictorView.as_view(),
+        name="predict_async",
+    ),
+    path(
+        "predict_batch/",
+        HeartDiseaseBatchPredictorView.as_view(),
+        name="predict_batch",
+    ),
 ]
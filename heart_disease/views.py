@@ -1,63 +1,61 @@
-import json
 import logging
-import os
+from functools import partial
 
+from django.conf import settings
 from rest_framework import exceptions, response, status, views
 
+from api.async_views import AsyncAPIView
+from api.batching import MicroBatcher, group_by_model
+from api.cache import prediction_cache
+from api.registry import registry
+from api.timing import annotate, span
+
 from .constants import FEATURES
-from .predictor import HeartDiseasePredictor
+from .recommender import recommend, recommend_batch
 from .serializers import UserInputSerializer
 
 logger = logging.getLogger(__name__)
 
 
 class HeartDiseasePredictorView(views.APIView):
-    _predictor_instance = None
-
-    @classmethod
-    def get_predictor(cls):
+    @staticmethod
+    def get_predictor():
         """
-        Returns a singleton instance of the HeartDiseasePredictor.
+        Returns the HeartDiseasePredictor shared by the whole process.
         """
-        if cls._predictor_instance is None:
-            try:
-                current_dir = os.path.dirname(os.path.abspath(__file__))
-                model_path = os.path.join(
-                    current_dir, "models/gradient_boosting_model.joblib"
-                )
-                scaler_path = os.path.join(current_dir, "models/scaler.joblib")
-                cls._predictor_instance = HeartDiseasePredictor(model_path, scaler_path)
-            except Exception as e:
-                logger.error(f"Error loading model or scaler: {e}")
-                raise exceptions.APIException(
-                    "Internal server error: model loading failed."
-                )
-        return cls._predictor_instance
+        try:
+            return registry.get("heart_disease")
+        except Exception as e:
+            logger.error(f"Error loading model or scaler: {e}")
+            raise exceptions.APIException(
+                "Internal server error: model loading failed."
+            )
 
     def post(self, request, *args, **kwargs):
         """
         Handles the POST request to the view.
         """
         serializer = UserInputSerializer(data=request.data.get("data"))
-        if serializer.is_valid():
+        with span("validation"):
+            valid = serializer.is_valid()
+        if valid:
             try:
-                predictor = self.get_predictor()
-                prediction = predictor.predict(serializer.validated_data)
-                shap_explanation = predictor.explain(serializer.validated_data)
+                explain = self.explanation_requested(request)
+                prediction, shap_explanation, version = self.get_prediction(
+                    serializer.validated_data, explain
+                )
 
                 lang = request.query_params.get("lang", "en")
                 recommendations = self.generate_recommendations(
                     serializer.validated_data, prediction, lang
                 )
 
-                return response.Response(
-                    {
-                        "prediction": prediction,
-                        "explanation": self.format_shap_values(shap_explanation),
-                        "recommendations": recommendations,
-                    },
-                    status=status.HTTP_200_OK,
-                )
+                data = {"prediction": prediction}
+                if explain:
+                    data["explanation"] = self.format_shap_values(shap_explanation)
+                data["recommendations"] = recommendations
+                data["model_version"] = version
+                return response.Response(data, status=status.HTTP_200_OK)
             except Exception as e:
                 logger.error(f"Error in prediction or explanation: {e}")
                 return response.Response(
@@ -69,51 +67,76 @@ class HeartDiseasePredictorView(views.APIView):
                 serializer.errors, status=status.HTTP_400_BAD_REQUEST
             )
 
-    def generate_recommendations(self, input_data, prediction, lang="en"):
+    @classmethod
+    def get_prediction(cls, input_data, explain):
         """
-        Generates recommendations based on the input data and the prediction result.
+        Returns the prediction and SHAP values of a validated input, from the
+        prediction cache or computed by the shared predictor, and the version
+        of the model. With MICRO_BATCH_ENABLED, the inputs of concurrent
+        requests are predicted and explained together by the micro-batcher.
         """
-        try:
-            rec_messages = self.load_recommendations(lang)
-        except FileNotFoundError:
-            logger.error(f"Recommendations file for language {lang} not found.")
-            rec_messages = self.load_recommendations("en")  # Fallback to English
-
-        recommendations = {}
-
-        # Blood Pressure
-        if input_data["trestbps"] > 140:  # threshold for high blood pressure
-            recommendations["high_blood_pressure"] = rec_messages["high_blood_pressure"]
-
-        # Cholesterol Levels
-        if input_data["chol"] > 240:  # threshold for high cholesterol
-            recommendations["high_cholesterol"] = rec_messages["high_cholesterol"]
-
-        # Fasting Blood Sugar
-        if input_data["fbs"] == 1:  # 1 indicates FBS > 120 mg/dl
-            recommendations["high_fbs"] = rec_messages["high_fbs"]
-
-        if prediction == 1:
-            recommendations["high_risk"] = rec_messages["high_risk"]
+        predictor = cls.get_predictor()
+        annotate(model_version=predictor.version)
+        if settings.MICRO_BATCH_ENABLED:
+            compute = partial(batcher.run, (predictor, input_data, explain))
         else:
-            recommendations["low_risk"] = rec_messages["low_risk"]
-
-        return recommendations
+            compute = partial(cls.predict_and_explain, predictor, input_data, explain)
+        prediction, shap_explanation = prediction_cache.get_or_compute(
+            f"heart_disease:{predictor.explain_mode}:{explain}",
+            predictor.version,
+            input_data,
+            compute,
+        )
+        return prediction, shap_explanation, predictor.version
 
     @staticmethod
-    def load_recommendations(lang="en"):
+    def predict_and_explain(predictor, input_data, explain):
         """
-        Loads recommendation messages from a JSON file based on the specified language.
+        Returns the prediction and SHAP values of an input as plain Python
+        values, as stored in the prediction cache.
         """
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        file_path = os.path.join(
-            current_dir, f"recommendations/recommendations_{lang}.json"
+        prediction, shap_explanation = predictor.predict_and_explain(
+            input_data, explain=explain
         )
-        try:
-            with open(file_path, "r") as file:
-                return json.load(file)
-        except FileNotFoundError:
-            raise
+        if shap_explanation is not None:
+            shap_explanation = shap_explanation.tolist()
+        return prediction.item(), shap_explanation
+
+    @staticmethod
+    def predict_and_explain_items(items):
+        """
+        Predicts a batch of (predictor, input, explain) items of the
+        micro-batcher with one call to the model and one SHAP call per
+        predictor, and returns the result of each item like
+        predict_and_explain.
+        """
+        results = [None] * len(items)
+        for predictor, indexes in group_by_model(items):
+            predictions, shap_rows = predictor.predict_and_explain_rows(
+                [items[i][1] for i in indexes], [items[i][2] for i in indexes]
+            )
+            for i, prediction, shap_row in zip(indexes, predictions, shap_rows):
+                results[i] = (
+                    predictor.post_process_prediction([prediction]).item(),
+                    None if shap_row is None else shap_row.tolist(),
+                )
+        return results
+
+    @staticmethod
+    def explanation_requested(request):
+        """
+        Returns False when the client opted out of the SHAP explanation with
+        the `explain=false` query parameter.
+        """
+        # GET is the query string of both Django and DRF requests
+        explain = request.GET.get("explain", "true")
+        return explain.lower() not in ("false", "0", "no")
+
+    def generate_recommendations(self, input_data, prediction, lang="en"):
+        """
+        Generates recommendations based on the input data and the prediction result.
+        """
+        return recommend(input_data, prediction, lang)
 
     @staticmethod
     def format_shap_values(shap_values):
@@ -125,3 +148,137 @@ class HeartDiseasePredictorView(views.APIView):
             explanation = {"feature_name": feature, "shap_value": value}
             formatted.append(explanation)
         return formatted
+
+
+batcher = MicroBatcher(
+    "heart_disease",
+    HeartDiseasePredictorView.predict_and_explain_items,
+    max_batch_size=settings.MICRO_BATCH_MAX_SIZE,
+    max_wait=settings.MICRO_BATCH_MAX_WAIT_MS / 1000,
+)
+
+
+class HeartDiseaseBatchPredictorView(HeartDiseasePredictorView):
+    """
+    Scores a list of patients in a single request. The inputs are validated
+    together, scaled and predicted as one matrix and explained with a single
+    SHAP call. Results are returned in the same order as the inputs.
+    """
+
+    def post(self, request, *args, **kwargs):
+        """
+        Handles the POST request to the view.
+        """
+        records = request.data.get("data")
+        if not isinstance(records, list):
+            return response.Response(
+                {"data": ["Expected a list of patient records."]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if len(records) > settings.HEART_DISEASE_MAX_BATCH_SIZE:
+            return response.Response(
+                {
+                    "data": [
+                        "Ensure this list has at most "
+                        f"{settings.HEART_DISEASE_MAX_BATCH_SIZE} records."
+                    ]
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        serializer = UserInputSerializer(data=records, many=True)
+        with span("validation"):
+            valid = serializer.is_valid()
+        if not valid:
+            return response.Response(
+                serializer.errors, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            predictor = self.get_predictor()
+            annotate(model_version=predictor.version)
+            explain = self.explanation_requested(request)
+            # The raw features are built once, for the model and the
+            # recommendations
+            with span("preprocess"):
+                matrix = predictor.to_matrix(serializer.validated_data)
+            predictions, shap_explanations = predictor.predict_and_explain_matrix(
+                matrix, explain=explain
+            )
+
+            lang = request.query_params.get("lang", "en")
+            recommendations = recommend_batch(matrix, predictions, lang)
+            results = []
+            for i, prediction in enumerate(predictions.tolist()):
+                result = {"prediction": prediction}
+                if explain:
+                    result["explanation"] = self.format_shap_values(
+                        shap_explanations[i].tolist()
+                    )
+                result["recommendations"] = recommendations[i]
+                results.append(result)
+            return response.Response(
+                {"results": results, "model_version": predictor.version},
+                status=status.HTTP_200_OK,
+            )
+        except Exception as e:
+            logger.error(f"Error in batch prediction or explanation: {e}")
+            return response.Response(
+                {"detail": "Error processing request."},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+
+class AsyncHeartDiseasePredictorView(AsyncAPIView):
+    """
+    Async variant of HeartDiseasePredictorView for ASGI servers. The request is
+    validated on the event loop and the prediction and SHAP explanation run in
+    the bounded inference executor, so a request does not hold a thread while
+    it waits for a worker. Returns 429 when the executor queue is full.
+    """
+
+    async def post(self, request, *args, **kwargs):
+        """
+        Handles the POST request to the view.
+        """
+        body = self.parse_json(request)
+        if not isinstance(body, dict):
+            return self.json_response(
+                {"detail": "JSON parse error."}, status=status.HTTP_400_BAD_REQUEST
+            )
+        serializer = UserInputSerializer(data=body.get("data"))
+        with span("validation"):
+            valid = serializer.is_valid()
+        if not valid:
+            return self.json_response(
+                serializer.errors, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        explain = HeartDiseasePredictorView.explanation_requested(request)
+        try:
+            result, rejected = await self.run_inference(
+                HeartDiseasePredictorView.get_prediction,
+                serializer.validated_data,
+                explain,
+            )
+            if rejected is not None:
+                return rejected
+            prediction, shap_explanation, version = result
+
+            lang = request.GET.get("lang", "en")
+            data = {"prediction": prediction}
+            if explain:
+                data["explanation"] = HeartDiseasePredictorView.format_shap_values(
+                    shap_explanation
+                )
+            data["recommendations"] = recommend(
+                serializer.validated_data, prediction, lang
+            )
+            data["model_version"] = version
+            return self.json_response(data)
+        except Exception as e:
+            logger.error(f"Error in prediction or explanation: {e}")
+            return self.json_response(
+                {"detail": "Error processing request."},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
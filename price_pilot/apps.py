@@ -4,3 +4,15 @@ from django.apps import AppConfig
 class PredictorConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "price_pilot"
+
+    def ready(self):
+        from api.registry import registry
+
+        from .predictor import current_version, load_predictor, warm_up_predictor
+
+        registry.register(
+            "price_pilot",
+            load_predictor,
+            warm_up=warm_up_predictor,
+            version=current_version,
+        )
@@ -0,0 +1,101 @@
+import hashlib
+import json
+import threading
+import time
+
+from django.conf import settings
+
+from .models import get_car_collection
+
+
+def split_name(name):
+    """
+    Splits a car name into its brand (first word) and model (the rest).
+    """
+    brand, _, model = name.partition(" ")
+    return brand, model
+
+
+class CarNameIndex:
+    """
+    In-memory index of the distinct brand/model pairs of the Car collection.
+
+    The index is built with a single aggregation that returns the distinct
+    names from MongoDB, and is then updated incrementally when cars are
+    inserted through the API. Since cars inserted by other processes are not
+    seen, the index is rebuilt when it is older than CAR_NAME_INDEX_TTL
+    seconds. The ETag of the list is a hash of its content, so it is the same
+    in every process serving the same list.
+    """
+
+    def __init__(self):
+        self._pairs = set()
+        self._snapshot = None
+        self._built_at = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def fetch_names():
+        """
+        Returns the distinct non-empty car names stored in MongoDB.
+        """
+        collection = get_car_collection()
+        pipeline = [
+            {"$match": {"name": {"$nin": [None, ""]}}},
+            {"$group": {"_id": "$name"}},
+        ]
+        return [
+            document["_id"]
+            for document in collection.aggregate(pipeline, allowDiskUse=True)
+        ]
+
+    def rebuild(self):
+        """
+        Rebuilds the index from the names stored in MongoDB.
+        """
+        pairs = {split_name(name) for name in self.fetch_names()}
+        with self._lock:
+            self._pairs = pairs
+            self._snapshot = None
+            self._built_at = time.monotonic()
+
+    def add_names(self, names):
+        """
+        Adds the names of newly inserted cars to the index.
+        """
+        with self._lock:
+            if self._built_at is None:
+                # Not built yet, the names will be fetched with the others
+                return
+            for name in names:
+                if name:
+                    pair = split_name(name)
+                    if pair not in self._pairs:
+                        self._pairs.add(pair)
+                        self._snapshot = None
+
+    def snapshot(self):
+        """
+        Returns the sorted list of distinct brand/model pairs and its ETag.
+        """
+        built_at = self._built_at
+        if (
+            built_at is None
+            or time.monotonic() - built_at > settings.CAR_NAME_INDEX_TTL
+        ):
+            self.rebuild()
+
+        with self._lock:
+            if self._snapshot is None:
+                pairs = [
+                    {"brand": brand, "model": model}
+                    for brand, model in sorted(self._pairs)
+                ]
+                digest = hashlib.sha1(
+                    json.dumps(pairs, separators=(",", ":")).encode()
+                ).hexdigest()
+                self._snapshot = (pairs, f'"{digest}"')
+            return self._snapshot
+
+
+car_name_index = CarNameIndex()
@@ -0,0 +1,113 @@
+import json
+
+from bson import ObjectId
+from pymongo import ASCENDING
+from rest_framework import renderers, serializers
+
+from .serializers import CarSerializer
+
+
+class NDJSONRenderer(renderers.BaseRenderer):
+    """
+    Renders a list as newline-delimited JSON, one document per line. Selected
+    with the application/x-ndjson Accept header or the format=ndjson query
+    parameter.
+    """
+
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        documents = data if isinstance(data, list) else [data]
+        return "".join(dumps_line(document) for document in documents).encode()
+
+
+def dumps_line(document):
+    return (
+        json.dumps(document, ensure_ascii=False, separators=(",", ":"), default=str)
+        + "\n"
+    )
+
+
+def parse_fields(value):
+    """
+    Parses the comma-separated fields= query parameter into the projection of
+    the car documents, all the serialized fields by default.
+    """
+    allowed = CarSerializer.Meta.fields
+    if not value:
+        return list(allowed)
+    fields = [field.strip() for field in value.split(",") if field.strip()]
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        raise serializers.ValidationError(
+            {"fields": f"Unknown fields: {', '.join(unknown)}."}
+        )
+    return fields
+
+
+def parse_cursor(value):
+    """
+    Parses the cursor= query parameter, the _id of the last car of the
+    previous page.
+    """
+    if not value:
+        return None
+    if not ObjectId.is_valid(value):
+        raise serializers.ValidationError({"cursor": "Invalid cursor."})
+    return ObjectId(value)
+
+
+def to_car(document, fields):
+    # Missing fields are null, like in the serialized cars
+    return {field: document.get(field) for field in fields}
+
+
+def find_cars(collection, fields, after=None, batch_size=None):
+    """
+    Returns a server-side cursor over the cars in _id order, starting after
+    the given _id, with only the given fields (and _id).
+    """
+    cursor = collection.find(
+        {"_id": {"$gt": after}} if after is not None else {},
+        projection={field: True for field in fields},
+        sort=[("_id", ASCENDING)],
+    )
+    if batch_size:
+        cursor = cursor.batch_size(batch_size)
+    return cursor
+
+
+def fetch_page(collection, fields, after=None, limit=100):
+    """
+    Returns a page of at most limit cars following the given _id, and the
+    cursor of the next page (None on the last page).
+
+    Keyset pagination on the _id index: the cost of a page does not depend on
+    its position, unlike skipping over the previous pages.
+    """
+    # One extra car tells whether there is a next page
+    documents = list(find_cars(collection, fields, after).limit(limit + 1))
+    next_cursor = None
+    if len(documents) > limit:
+        documents = documents[:limit]
+        next_cursor = str(documents[-1]["_id"])
+    return [to_car(document, fields) for document in documents], next_cursor
+
+
+def iter_ndjson_export(collection, fields, after=None, batch_size=1000):
+    """
+    Yields the cars as newline-delimited JSON, one chunk per batch of the
+    server-side cursor, so that only one batch is held in memory.
+    """
+    lines = []
+    for document in find_cars(collection, fields, after, batch_size):
+        lines.append(dumps_line(to_car(document, fields)))
+        if len(lines) == batch_size:
+            yield "".join(lines).encode()
+            lines = []
+    if lines:
+        yield "".join(lines).encode()
@@ -0,0 +1,205 @@
+import codecs
+import json
+from itertools import islice
+
+from django.utils import timezone
+from pymongo.errors import BulkWriteError
+from rest_framework import serializers
+
+from api.timing import span
+
+from .models import get_car_collection
+from .serializers import CarSerializer
+
+READ_SIZE = 64 * 1024
+# Largest element buffered while waiting for its end, MongoDB's document limit
+MAX_DOCUMENT_SIZE = 16 * 1024 * 1024
+JSON_WHITESPACE = " \t\n\r"
+
+
+class IngestionError(ValueError):
+    """
+    Raised when the body of a bulk ingestion request cannot be parsed.
+    """
+
+
+def iter_text(stream, read_size=READ_SIZE):
+    """
+    Reads a binary stream in chunks and yields it as UTF-8 decoded text.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    while True:
+        chunk = stream.read(read_size)
+        if not chunk:
+            tail = decoder.decode(b"", final=True)
+            if tail:
+                yield tail
+            return
+        yield decoder.decode(chunk)
+
+
+def iter_json_array(stream, read_size=READ_SIZE):
+    """
+    Yields the elements of a JSON array read from a binary stream, holding
+    only about one read of the stream in memory at a time.
+    """
+    decoder = json.JSONDecoder()
+    chunks = iter_text(stream, read_size)
+    buffer, position, eof = "", 0, False
+    # "start" expects "[", "first" the first element or "]", "value" an
+    # element and "separator" a comma or "]"
+    state = "start"
+
+    while True:
+        while position < len(buffer) and buffer[position] in JSON_WHITESPACE:
+            position += 1
+
+        if position == len(buffer):
+            if eof:
+                raise IngestionError("Unexpected end of the JSON array.")
+            chunk = next(chunks, None)
+            eof = chunk is None
+            buffer, position = buffer[position:] + (chunk or ""), 0
+            continue
+
+        char = buffer[position]
+        if state == "start":
+            if char != "[":
+                raise IngestionError("Expected a JSON array of cars.")
+            position += 1
+            state = "first"
+        elif state == "separator":
+            if char == "]":
+                return
+            if char != ",":
+                raise IngestionError(f"Expected ',' or ']', got {char!r}.")
+            position += 1
+            state = "value"
+        elif state == "first" and char == "]":
+            return
+        else:
+            try:
+                value, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError as e:
+                if eof:
+                    raise IngestionError(f"Invalid JSON: {e}")
+                value, end = None, len(buffer)
+            if end == len(buffer) and not eof:
+                # The element may continue in the next chunk
+                if len(buffer) - position > MAX_DOCUMENT_SIZE:
+                    raise IngestionError("Invalid JSON or car document too large.")
+                chunk = next(chunks, None)
+                eof = chunk is None
+                buffer, position = buffer[position:] + (chunk or ""), 0
+                continue
+            position = end
+            state = "separator"
+            yield value
+
+
+def iter_ndjson(stream, read_size=READ_SIZE):
+    """
+    Yields the documents of a newline-delimited JSON stream.
+    """
+    buffer = ""
+    line_number = 0
+    for chunk in iter_text(stream, read_size):
+        buffer += chunk
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            line_number += 1
+            if line.strip():
+                yield _loads_line(line, line_number)
+    if buffer.strip():
+        yield _loads_line(buffer, line_number + 1)
+
+
+def _loads_line(line, line_number):
+    try:
+        return json.loads(line)
+    except json.JSONDecodeError as e:
+        raise IngestionError(f"Invalid JSON on line {line_number}: {e}")
+
+
+class CarIngestion:
+    """
+    Validates car documents with CarSerializer in chunks and writes each
+    chunk with a single unordered insert_many, bypassing the ORM.
+
+    The summary holds the number of documents received, inserted and
+    failed, and the validation or write errors of the failed documents,
+    identified by their index in the input (up to max_errors of them).
+    """
+
+    def __init__(self, chunk_size, max_errors, collection=None):
+        self.chunk_size = chunk_size
+        self.max_errors = max_errors
+        self.collection = collection
+        self.fields = CarSerializer.Meta.fields
+        self.summary = {"received": 0, "inserted": 0, "failed": 0, "errors": []}
+
+    def run(self, records, on_insert=None):
+        """
+        Ingests an iterable of car records.
+
+        Parameters:
+            records (iterable): Car records, as parsed from the request.
+            on_insert (callable): Optional function called with each list of
+                inserted documents.
+
+        Returns:
+            dict: The summary of the ingestion.
+        """
+        collection = self.collection
+        if collection is None:
+            collection = get_car_collection()
+        child = CarSerializer()
+        records = iter(records)
+
+        while True:
+            chunk = list(islice(records, self.chunk_size))
+            if not chunk:
+                return self.summary
+
+            offset = self.summary["received"]
+            self.summary["received"] += len(chunk)
+            documents, indexes = [], []
+            # Picked up by the next incremental scoring of the cars
+            updated_at = timezone.now()
+            with span("validation"):
+                for i, record in enumerate(chunk):
+                    try:
+                        validated_data = child.run_validation(record)
+                    except serializers.ValidationError as e:
+                        self._add_error(offset + i, e.detail)
+                        continue
+                    # Same shape as the documents saved by the ORM
+                    document = {
+                        field: validated_data.get(field) for field in self.fields
+                    }
+                    document["updated_at"] = updated_at
+                    documents.append(document)
+                    indexes.append(offset + i)
+
+            if documents:
+                inserted = self._insert(collection, documents, indexes)
+                if on_insert is not None:
+                    on_insert(inserted)
+
+    def _insert(self, collection, documents, indexes):
+        try:
+            collection.insert_many(documents, ordered=False)
+            self.summary["inserted"] += len(documents)
+            return documents
+        except BulkWriteError as e:
+            failed = set()
+            for error in e.details.get("writeErrors", []):
+                failed.add(error["index"])
+                self._add_error(indexes[error["index"]], error.get("errmsg"))
+            self.summary["inserted"] += e.details.get("nInserted", 0)
+            return [document for i, document in enumerate(documents) if i not in failed]
+
+    def _add_error(self, index, detail):
+        self.summary["failed"] += 1
+        if len(self.summary["errors"]) < self.max_errors:
+            self.summary["errors"].append({"index": index, "errors": detail})
@@ -0,0 +1,93 @@
+import io
+import json
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from pymongo import MongoClient
+
+from ...ingest import CarIngestion, iter_json_array, iter_ndjson
+from ...serializers import CarSerializer
+
+BRANDS = ["Peugeot 208", "Renault Clio V", "Volkswagen Golf", "Tesla Model 3"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures the throughput of the car_data_bulk/ ingestion path: streamed "
+        "parsing, chunked validation and insert_many, against validating the whole "
+        "payload at once and inserting the cars one at a time. Runs against the "
+        "MongoDB server given with --mongo-uri, or an in-memory mongomock database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=50000)
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument("--format", choices=["json", "ndjson"], default="json")
+        parser.add_argument(
+            "--mongo-uri",
+            help="MongoDB server to write to, defaults to an in-memory mongomock.",
+        )
+
+    def handle(self, *args, **options):
+        if options["mongo_uri"]:
+            client = MongoClient(options["mongo_uri"])
+        else:
+            try:
+                import mongomock
+            except ImportError:
+                raise CommandError(
+                    "Install mongomock (pip install -r requirements-dev.txt) or pass "
+                    "--mongo-uri to run the benchmark."
+                )
+            client = mongomock.MongoClient()
+        collection = client.get_database("benchmark")["price_pilot_car_benchmark"]
+
+        rows = [self.fake_car(i) for i in range(options["rows"])]
+        if options["format"] == "ndjson":
+            body = "\n".join(json.dumps(row) for row in rows).encode()
+            parse = iter_ndjson
+        else:
+            body = json.dumps(rows).encode()
+            parse = iter_json_array
+        self.stdout.write(f"{len(rows)} cars, {len(body) / 1e6:.1f} MB payload")
+
+        def per_row():
+            # Behaviour before streaming: parse and validate the whole payload,
+            # then write the cars one at a time
+            serializer = CarSerializer(data=json.loads(body), many=True)
+            serializer.is_valid(raise_exception=True)
+            for data in serializer.validated_data:
+                collection.insert_one(dict(data))
+
+        def streamed():
+            ingestion = CarIngestion(
+                options["chunk_size"], max_errors=100, collection=collection
+            )
+            summary = ingestion.run(parse(io.BytesIO(body)))
+            if summary["inserted"] != len(rows):
+                raise CommandError(f"Ingestion failed: {summary}")
+
+        for name, func in (("per-row", per_row), ("streamed", streamed)):
+            collection.drop()
+            start = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - start
+            self.stdout.write(
+                f"{name:<10}{elapsed:>10.2f} s{len(rows) / elapsed:>12.0f} rows/s"
+            )
+        collection.drop()
+
+    @staticmethod
+    def fake_car(i):
+        return {
+            "name": random.choice(BRANDS),
+            "price": str(random.randint(3000, 60000)),
+            "year": str(random.randint(2005, 2023)),
+            "mileage": f"{random.randint(0, 250000)} km",
+            "fuel_type": random.choice(["Essence", "Diesel", "Electrique"]),
+            "num_doors": "5",
+            "num_seats": "5",
+            "power": f"{random.randint(70, 300)}hp",
+            "combined_consumption": f"{random.uniform(3, 9):.1f}L/100km",
+        }
@@ -0,0 +1,100 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from ...predictor import DEFAULT_QUANTILES, load_predictor
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the p50 latency of predict_interval, which returns the standard "
+        "deviation and quantiles of the tree predictions, with plain predict_batch "
+        "on the served price model, for batches of 1, 100 and 10000 cars. Fails if "
+        "the overhead exceeds --max-overhead or if both disagree on the price."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-sizes",
+            type=int,
+            nargs="+",
+            default=[1, 100, 10000],
+            help="Number of cars per call.",
+        )
+        parser.add_argument(
+            "--iterations",
+            type=int,
+            default=200,
+            help="Number of timed calls per batch size (fewer for large batches).",
+        )
+        parser.add_argument(
+            "--quantiles", type=float, nargs="+", default=list(DEFAULT_QUANTILES)
+        )
+        parser.add_argument(
+            "--max-overhead",
+            type=float,
+            default=4.0,
+            help="Largest accepted ratio of the latency of the two.",
+        )
+
+    def handle(self, *args, **options):
+        predictor = load_predictor()
+        quantiles = tuple(options["quantiles"])
+        engine = predictor.tree_engine
+        rng = np.random.default_rng(0)
+        # Inputs around the split thresholds of each feature, see
+        # benchmark_tree_engine
+        internal = engine.children_left != -1
+        low = np.array(
+            [
+                engine.threshold[internal & (engine.feature == j)].min(initial=0)
+                for j in range(engine.n_features)
+            ]
+        )
+        high = np.array(
+            [
+                engine.threshold[internal & (engine.feature == j)].max(initial=0)
+                for j in range(engine.n_features)
+            ]
+        )
+
+        self.stdout.write(
+            f"{predictor.model_path} ({len(engine.roots)} trees, "
+            f"quantiles {', '.join(f'{q:g}' for q in quantiles)})"
+        )
+        self.stdout.write(
+            f"{'rows':>8}{'predict ms':>14}{'interval ms':>14}{'overhead':>10}"
+        )
+        failed = []
+        for batch_size in options["batch_sizes"]:
+            X = rng.uniform(low - 1, high + 1, (batch_size, engine.n_features))
+            if not np.array_equal(
+                predictor.predict_batch(X), predictor.predict_interval(X, quantiles)[0]
+            ):
+                raise CommandError("predict_interval and predict_batch disagree.")
+
+            iterations = max(5, options["iterations"] * 100 // max(batch_size, 100))
+            p50s = []
+            for predict in (
+                predictor.predict_batch,
+                lambda X: predictor.predict_interval(X, quantiles),
+            ):
+                timings = []
+                for _ in range(iterations):
+                    start = time.perf_counter()
+                    predict(X)
+                    timings.append((time.perf_counter() - start) * 1000)
+                p50s.append(np.percentile(timings, 50))
+            overhead = p50s[1] / p50s[0]
+            self.stdout.write(
+                f"{batch_size:>8}{p50s[0]:>14.4f}{p50s[1]:>14.4f}{overhead:>9.2f}x"
+            )
+            if overhead > options["max_overhead"]:
+                failed.append(batch_size)
+
+        if failed:
+            raise CommandError(
+                f"The overhead exceeds {options['max_overhead']:g}x for batches of "
+                f"{', '.join(map(str, failed))} cars."
+            )
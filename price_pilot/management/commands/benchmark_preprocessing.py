@@ -0,0 +1,93 @@
+import json
+import random
+import time
+import tracemalloc
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from ...predictor import FEATURE_ORDER, FEATURE_SCHEMA
+
+
+def legacy_preprocess_input(user_input):
+    # CarPricePredictor.preprocess_input and the reshape of predict before the
+    # feature schema
+    user_input_dict = json.loads(json.dumps(user_input))
+    input_features = [user_input_dict.get(feature, 0) for feature in FEATURE_ORDER]
+    input_features = [
+        0 if feature == "" or feature is None else feature for feature in input_features
+    ]
+    return np.array(input_features).reshape(1, -1)
+
+
+def legacy_preprocess_batch(user_inputs):
+    return np.vstack(
+        [legacy_preprocess_input(user_input) for user_input in user_inputs]
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the car price preprocessing before and after the compiled feature "
+        "schema, for single inputs and batches: mean time per call, and memory "
+        "allocated by the temporaries of a call (peak traced by tracemalloc)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--iterations", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        rng = random.Random(0)
+        records = [self.fake_input(rng) for _ in range(options["batch_size"])]
+        record = records[0]
+        out = FEATURE_SCHEMA.empty(1)
+
+        scenarios = [
+            ("single, before", lambda: legacy_preprocess_input(record), 1),
+            ("single, schema", lambda: FEATURE_SCHEMA.transform_one(record), 1),
+            (
+                "single, schema, out=",
+                lambda: FEATURE_SCHEMA.transform_one(record, out=out),
+                1,
+            ),
+            ("batch, before", lambda: legacy_preprocess_batch(records), len(records)),
+            ("batch, schema", lambda: FEATURE_SCHEMA.transform(records), len(records)),
+        ]
+
+        reference = legacy_preprocess_batch(records).astype(np.float64)
+        if not np.array_equal(reference, FEATURE_SCHEMA.transform(records)):
+            self.stderr.write("The schema and the legacy preprocessing disagree.")
+
+        self.stdout.write(f"{'':<24}{'us/call':>10}{'us/row':>10}{'peak KiB':>10}")
+        for name, func, rows in scenarios:
+            iterations = max(10, options["iterations"] // rows)
+            func()
+            start = time.perf_counter()
+            for _ in range(iterations):
+                func()
+            elapsed = (time.perf_counter() - start) / iterations
+
+            tracemalloc.start()
+            func()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            self.stdout.write(
+                f"{name:<24}{elapsed * 1e6:>10.1f}{elapsed * 1e6 / rows:>10.2f}"
+                f"{peak / 1024:>10.1f}"
+            )
+
+    @staticmethod
+    def fake_input(rng):
+        return {
+            "name": "Peugeot 208",
+            "year": rng.randint(2005, 2023),
+            "power": rng.choice([75, 100, 130, None]),
+            "combined_consumption": round(rng.uniform(3.5, 9.0), 1),
+            "mileage": float(rng.randint(0, 250000)),
+            "num_doors": rng.choice([3, 5]),
+            "num_seats": 5,
+            "length": rng.choice([4.05, 4.3, ""]),
+            "fuel_type": "Essence",
+        }
@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.registry import registry
+
+from ...scoring import ScoringInProgress, score_stored_cars
+
+
+class Command(BaseCommand):
+    help = (
+        "Predicts the price of the stored cars inserted or changed since the last "
+        "run, or of all of them with --full or when the model changed, and writes "
+        "it back to them as predicted_price with one bulk_write per batch. Fails "
+        "if another run is in progress. Meant to be scheduled periodically, e.g. "
+        "with cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--full", action="store_true", help="Score all the cars.")
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=settings.CAR_SCORING_BATCH_SIZE,
+            help="Number of cars read, predicted and written back together.",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            summary = score_stored_cars(
+                registry.get("price_pilot"), options["batch_size"], full=options["full"]
+            )
+        except ScoringInProgress as e:
+            raise CommandError(str(e))
+        since = summary["since"]
+        self.stdout.write(
+            f"Scored {summary['scored']} cars "
+            f"{'changed since ' + str(since) if since else '(all of them)'} with "
+            f"model {summary['model_version']} in {summary['seconds']:.1f} s "
+            f"({summary['scored'] / max(summary['seconds'], 1e-9):.0f} cars/s)"
+        )
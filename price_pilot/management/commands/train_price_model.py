@@ -0,0 +1,86 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ...models import get_car_collection
+from ...predictor import MODELS_DIR
+from ...training import save_price_model, train_price_model
+
+
+class Command(BaseCommand):
+    help = (
+        "Trains a car price random forest on the priced cars stored in MongoDB, "
+        "within a time budget: the cars are streamed and cleaned in batches, the "
+        "hyperparameters picked by successive halving on growing samples, and the "
+        "final forest grown until its validation error stops improving. Writes a "
+        "versioned artifact and a JSON file with its feature schema and metrics to "
+        "the models directory, and serves it with --activate."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--time-budget",
+            type=float,
+            default=600,
+            help="Seconds the training may take, loading the data included.",
+        )
+        parser.add_argument(
+            "--n-jobs",
+            type=int,
+            default=-1,
+            help="Number of cores the forests are trained on, -1 for all of them.",
+        )
+        parser.add_argument(
+            "--sample",
+            type=int,
+            help=(
+                "Number of cars sampled at random from the collection. By default, "
+                "the cars are read in order until the loading deadline."
+            ),
+        )
+        parser.add_argument(
+            "--candidates",
+            type=int,
+            default=12,
+            help="Number of hyperparameter combinations tried by the search.",
+        )
+        parser.add_argument(
+            "--max-estimators",
+            type=int,
+            default=300,
+            help="Maximum number of trees of the final forest.",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output-dir", default=MODELS_DIR)
+        parser.add_argument(
+            "--activate",
+            action="store_true",
+            help="Replace the manifest of the models directory to serve the model.",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            model, metadata = train_price_model(
+                get_car_collection(),
+                options["time_budget"],
+                n_jobs=options["n_jobs"],
+                sample=options["sample"],
+                n_candidates=options["candidates"],
+                max_estimators=options["max_estimators"],
+                seed=options["seed"],
+                log=self.stdout.write,
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        version, path = save_price_model(
+            model, metadata, options["output_dir"], activate=options["activate"]
+        )
+        metrics = metadata["metrics"]
+        self.stdout.write(
+            f"Trained {metadata['n_estimators']} trees on {metrics['n_train']} cars "
+            f"in {metadata['seconds']:.1f} s: validation MAE {metrics['mae']:.0f}, "
+            f"RMSE {metrics['rmse']:.0f}, R2 {metrics['r2']:.3f}"
+        )
+        self.stdout.write(
+            f"Saved version {version} to {path}"
+            + (", now served" if options["activate"] else "")
+        )
@@ -0,0 +1,108 @@
+from django.db import migrations, models
+from pymongo import ASCENDING, UpdateOne
+
+COLLECTION = "price_pilot_car"
+FLOAT_FIELDS = (
+    "price",
+    "mileage",
+    "power",
+    "co2_emission",
+    "trunk_volume",
+    "length",
+    "combined_consumption",
+)
+INTEGER_FIELDS = ("year", "num_doors", "num_seats")
+BATCH_SIZE = 1000
+
+
+def get_database(schema_editor):
+    schema_editor.connection.ensure_connection()
+    return schema_editor.connection.connection
+
+
+def normalize_value(field, value):
+    from price_pilot.normalization import parse_integer, parse_number
+
+    parse = parse_integer if field in INTEGER_FIELDS else parse_number
+    try:
+        return parse(value)
+    except ValueError:
+        # Values that are not numbers cannot be kept in a numeric field
+        return None
+
+
+def normalize_cars(apps, schema_editor):
+    """
+    Converts the numeric fields stored as strings by previous versions into
+    numbers, in batches of bulk updates, and creates the car indexes.
+    """
+    collection = get_database(schema_editor)[COLLECTION]
+    fields = FLOAT_FIELDS + INTEGER_FIELDS
+    cursor = collection.find(
+        {"$or": [{field: {"$type": "string"}} for field in fields]},
+        projection={field: True for field in fields},
+        batch_size=BATCH_SIZE,
+    )
+
+    updates = []
+    for document in cursor:
+        values = {
+            field: normalize_value(field, document[field])
+            for field in fields
+            if isinstance(document.get(field), str)
+        }
+        updates.append(UpdateOne({"_id": document["_id"]}, {"$set": values}))
+        if len(updates) == BATCH_SIZE:
+            collection.bulk_write(updates, ordered=False)
+            updates = []
+    if updates:
+        collection.bulk_write(updates, ordered=False)
+
+    collection.create_index(
+        [("name", ASCENDING), ("year", ASCENDING)], name="car_name_year_idx"
+    )
+    collection.create_index([("price", ASCENDING)], name="car_price_idx")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("price_pilot", "0002_car_trunk_volume"),
+    ]
+
+    # djongo cannot alter the type of a column, the documents are converted
+    # and the indexes created with pymongo instead
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                *(
+                    migrations.AlterField(
+                        model_name="car",
+                        name=field,
+                        field=models.FloatField(null=True),
+                    )
+                    for field in FLOAT_FIELDS
+                ),
+                *(
+                    migrations.AlterField(
+                        model_name="car",
+                        name=field,
+                        field=models.IntegerField(null=True),
+                    )
+                    for field in INTEGER_FIELDS
+                ),
+                migrations.AddIndex(
+                    model_name="car",
+                    index=models.Index(
+                        fields=["name", "year"], name="car_name_year_idx"
+                    ),
+                ),
+                migrations.AddIndex(
+                    model_name="car",
+                    index=models.Index(fields=["price"], name="car_price_idx"),
+                ),
+            ],
+            database_operations=[
+                migrations.RunPython(normalize_cars, migrations.RunPython.noop),
+            ],
+        ),
+    ]
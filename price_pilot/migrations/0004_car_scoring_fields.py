@@ -0,0 +1,59 @@
+from django.db import migrations, models
+from pymongo import ASCENDING
+
+COLLECTION = "price_pilot_car"
+
+
+def get_database(schema_editor):
+    schema_editor.connection.ensure_connection()
+    return schema_editor.connection.connection
+
+
+def create_updated_at_index(apps, schema_editor):
+    """
+    Creates the index of the updated_at stamp, which the incremental scoring
+    of the cars queries.
+    """
+    collection = get_database(schema_editor)[COLLECTION]
+    collection.create_index([("updated_at", ASCENDING)], name="car_updated_at_idx")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("price_pilot", "0003_car_numeric_fields"),
+    ]
+
+    # The new fields need no change to the documents, which are read as null
+    # until they are written, and djongo cannot create the index
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddField(
+                    model_name="car",
+                    name="updated_at",
+                    field=models.DateTimeField(null=True),
+                ),
+                migrations.AddField(
+                    model_name="car",
+                    name="predicted_price",
+                    field=models.FloatField(null=True),
+                ),
+                migrations.AddField(
+                    model_name="car",
+                    name="price_model_version",
+                    field=models.CharField(max_length=100, null=True),
+                ),
+                migrations.AddIndex(
+                    model_name="car",
+                    index=models.Index(
+                        fields=["updated_at"], name="car_updated_at_idx"
+                    ),
+                ),
+            ],
+            database_operations=[
+                migrations.RunPython(
+                    create_updated_at_index, migrations.RunPython.noop
+                ),
+            ],
+        ),
+    ]
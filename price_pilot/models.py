@@ -1,33 +1,57 @@
 from djongo import models
 
+from api.mongo import get_database
+
 
 class Car(models.Model):
     """
     Represents a car object with information about the car's brand, model, year, kilometers, and number of seats.
+
+    Numeric characteristics are stored as numbers, normalized from the scraped strings (e.g. "150hp" or "7.5L/100km") when the car is ingested.
+
+    Cars are stamped with `updated_at` when they are written, and the price predicted by the model is written back to them as `predicted_price`, with the `price_model_version` that computed it (see price_pilot.scoring).
     """
 
     _id = models.ObjectIdField(default=None)
     name = models.CharField(max_length=100, null=True)
-    price = models.CharField(max_length=100, null=True)
-    year = models.CharField(max_length=100, null=True)
+    price = models.FloatField(null=True)
+    year = models.IntegerField(null=True)
     origin = models.CharField(max_length=100, null=True)
     registration_date = models.CharField(max_length=100, null=True)
     technical_inspection = models.CharField(max_length=100, null=True)
     first_hand = models.CharField(max_length=100, null=True)
-    mileage = models.CharField(max_length=100, null=True)
+    mileage = models.FloatField(null=True)
     fuel_type = models.CharField(max_length=100, null=True)
     transmission = models.CharField(max_length=100, null=True)
-    num_doors = models.CharField(max_length=100, null=True)
-    num_seats = models.CharField(max_length=100, null=True)
-    power = models.CharField(max_length=100, null=True)
-    co2_emission = models.CharField(max_length=100, null=True)
-    trunk_volume = models.CharField(max_length=100, null=True)
-    length = models.CharField(max_length=100, null=True)
+    num_doors = models.IntegerField(null=True)
+    num_seats = models.IntegerField(null=True)
+    power = models.FloatField(null=True)
+    co2_emission = models.FloatField(null=True)
+    trunk_volume = models.FloatField(null=True)
+    length = models.FloatField(null=True)
     critair_rating = models.CharField(max_length=100, null=True)
-    combined_consumption = models.CharField(max_length=100, null=True)
+    combined_consumption = models.FloatField(null=True)
+    updated_at = models.DateTimeField(null=True)
+    predicted_price = models.FloatField(null=True)
+    price_model_version = models.CharField(max_length=100, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["name", "year"], name="car_name_year_idx"),
+            models.Index(fields=["price"], name="car_price_idx"),
+            models.Index(fields=["updated_at"], name="car_updated_at_idx"),
+        ]
 
     def __str__(self):
         """
         Returns a string representation of the car object, including the brand, model, and year.
         """
         return f"{self.name} - {self.year}"
+
+
+def get_car_collection():
+    """
+    Returns the pymongo collection storing the Car documents, for the bulk
+    operations that bypass the ORM.
+    """
+    return get_database()[Car._meta.db_table]
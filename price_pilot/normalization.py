@@ -0,0 +1,44 @@
+import re
+
+# Spaces used as thousands separators, e.g. "25 000 €" or "120 000 km"
+THOUSANDS_SEPARATOR = re.compile(r"(?<=\d)[ \u00a0\u202f](?=\d{3}(?!\d))")
+NUMBER = re.compile(r"[-+]?\d+(?:[.,]\d+)?")
+
+
+def parse_number(value):
+    """
+    Parses a scraped numeric value that may carry a unit or thousands
+    separators, such as "150hp", "7,5 L/100km" or "25 000 €".
+
+    Parameters:
+        value: The raw value, a string, a number or None.
+
+    Returns:
+        float: The parsed value, or None for a missing or blank value.
+
+    Raises:
+        ValueError: If the value does not contain a number.
+    """
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        raise ValueError(f"Not a number: {value!r}")
+    if isinstance(value, (int, float)):
+        return float(value)
+
+    text = str(value).strip()
+    if not text:
+        return None
+    match = NUMBER.search(THOUSANDS_SEPARATOR.sub("", text))
+    if match is None:
+        raise ValueError(f"Not a number: {value!r}")
+    # French decimal comma
+    return float(match.group().replace(",", "."))
+
+
+def parse_integer(value):
+    """
+    Same as parse_number, rounded to the nearest integer.
+    """
+    number = parse_number(value)
+    return None if number is None else int(round(number))
@@ -1,35 +1,120 @@
-import json
+import os
+import threading
 
-import joblib
 import numpy as np
+from django.conf import settings
+
+from api.features import FeatureSchema
+from api.inference import build_inference_engine
+from api.loading import artifact_version, load_compiled, load_model, read_manifest
+from api.timing import span
+from api.tree_engine import CompiledTreeEnsemble
+
+MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models")
+MODEL_PATH = os.path.join(MODELS_DIR, "random_forest_model.joblib")
+
+# Features in the order of X_train and X_test. Missing values (absent, None or
+# empty strings) are replaced with 0.
+FEATURE_ORDER = (
+    "year",
+    "power",
+    "combined_consumption",
+    "mileage",
+    "num_doors",
+    "num_seats",
+    "length",
+)
+FEATURE_SCHEMA = FeatureSchema(FEATURE_ORDER, default=0.0)
+
+# Quantiles of the price returned by predict_interval when none are given
+DEFAULT_QUANTILES = (0.05, 0.95)
 
 
 class CarPricePredictor:
-    def __init__(self, model_path):
+    def __init__(self, model_path, backend="sklearn", version=None):
         """
         Initializes the CarPricePredictor with the trained model.
 
         Parameters:
             model_path (str): Path to the trained model.
+            backend (str): How predictions are computed, "sklearn" or "numba"
+                (see api.inference).
+            version (str): Version of the model, defaults to the fingerprint of
+                the artifact.
+        """
+        self.model_path = model_path
+        self._model = None
+        self._model_lock = threading.Lock()
+        self._tree_engine = None
+        self._tree_engine_lock = threading.Lock()
+        self.version = version or artifact_version(model_path)
+        # A compiled model predicts with its compiled engine, without loading
+        # the fitted estimator
+        self.engine = load_compiled(model_path, backend)
+        if self.engine is None:
+            self.engine = build_inference_engine(self.model, backend)
+
+    @property
+    def model(self):
+        """
+        Returns the fitted estimator, loaded on first use.
+        """
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    self._model = load_model(self.model_path)
+        return self._model
+
+    @property
+    def tree_engine(self):
+        """
+        Returns the compiled trees of the forest, which give the prediction of
+        each tree in one pass (see api.tree_engine). This is the engine itself
+        when the model is compiled, otherwise the fitted forest is flattened
+        on first use.
+        """
+        if isinstance(self.engine, CompiledTreeEnsemble):
+            return self.engine
+        if self._tree_engine is None:
+            with self._tree_engine_lock:
+                if self._tree_engine is None:
+                    self._tree_engine = CompiledTreeEnsemble.from_estimator(
+                        self.model, jit=False
+                    )
+        return self._tree_engine
+
+    def tree_predict(self, preprocessed_input):
+        """
+        Returns the prediction of each tree of the forest, of shape
+        (n_samples, n_trees). The compiled engine keeps the leaf value of each
+        tree in its traversal, the fitted forest returns the index of the leaf
+        of each tree with its apply method, whose values are then gathered in
+        one indexing of the flattened trees.
         """
-        self.model = joblib.load(model_path)
+        if isinstance(self.engine, CompiledTreeEnsemble):
+            return self.engine.tree_predict(preprocessed_input)
+        return self.tree_engine.leaf_values(
+            self.model.apply(np.asarray(preprocessed_input, dtype=np.float32))
+        )
 
     def predict(self, input_data):
         """
         Predicts the car price using the trained model.
 
         Parameters:
-            input_data (dict): Input data containing car features.
+            input_data (ndarray): Preprocessed features of a car, as returned
+                by preprocess_input.
 
         Returns:
             float: Predicted car price.
         """
         try:
-            # Reshape the input as the model expects a 2D array
-            preprocessed_input = np.array(input_data).reshape(1, -1)
+            # The model expects a 2D array, preprocess_input already returns one
+            preprocessed_input = np.asarray(input_data, dtype=np.float64).reshape(1, -1)
 
             # Predict using the loaded model
-            prediction = self.model.predict(preprocessed_input)[0]
+            with span("predict"):
+                prediction = self.engine.predict(preprocessed_input)[0]
 
             # Post-process the prediction
             post_processed_prediction = self.post_process_prediction(prediction)
@@ -38,39 +123,110 @@ class CarPricePredictor:
         except Exception as e:
             return f"Prediction error: {str(e)}"
 
-    def preprocess_input(self, user_input):
+    def predict_batch(self, preprocessed_input):
         """
-        Preprocesses the input data.
+        Predicts the price of several cars with a single call to the model.
 
         Parameters:
-            user_input (dict): Input data containing car features.
+            preprocessed_input (ndarray): Feature matrix of the cars, as
+                returned by preprocess_batch.
 
         Returns:
-            list: Preprocessed feature values.
+            list: Predicted car prices.
         """
-        # Define the order of features as in X_train and X_test
-        feature_order = [
-            "year",
-            "power",
-            "combined_consumption",
-            "mileage",
-            "num_doors",
-            "num_seats",
-            "length",
-        ]
+        with span("predict"):
+            predictions = self.engine.predict(preprocessed_input)
+        return [self.post_process_prediction(p) for p in predictions]
 
-        user_input_dict = json.loads(json.dumps(user_input))
+    def predict_interval(self, preprocessed_input, quantiles=DEFAULT_QUANTILES):
+        """
+        Predicts the price of several cars with the spread of the predictions
+        of the trees of the forest: their standard deviation and quantiles.
 
-        # Extract relevant features from the input
-        input_features = [user_input_dict.get(feature, 0) for feature in feature_order]
+        All the trees are evaluated in one vectorized pass that keeps the leaf
+        value of each tree (see tree_predict), rather than once per estimator. The predicted
+        price is the mean of the trees added in the same order as the forest,
+        so it is the price returned by predict_batch.
 
-        # Handle missing or incorrect values (e.g., empty strings, None)
-        input_features = [
-            0 if feature == "" or feature is None else feature
-            for feature in input_features
-        ]
+        Parameters:
+            preprocessed_input (ndarray): Feature matrix of the cars, as
+                returned by preprocess_input or preprocess_batch.
+            quantiles (tuple): Quantiles of the tree predictions, in [0, 1].
 
-        return input_features
+        Returns:
+            tuple: The predicted prices, their standard deviations, of shape
+            (n_samples,), and their quantiles, of shape (n_samples,
+            len(quantiles)).
+
+        Raises:
+            ValueError: If the model is not a forest.
+        """
+        with span("predict"):
+            tree_predictions = self.tree_predict(preprocessed_input)
+            # cumsum adds the trees one after the other, like the forest
+            predictions = (
+                np.cumsum(tree_predictions, axis=1)[:, -1] / tree_predictions.shape[1]
+            )
+            std = tree_predictions.std(axis=1)
+            price_quantiles = tree_quantiles(tree_predictions, quantiles)
+        return (
+            np.array([self.post_process_prediction(p) for p in predictions]),
+            std,
+            price_quantiles,
+        )
+
+    def score_frame(self, frame, quantiles=None):
+        """
+        Predicts the price of each row of a DataFrame of cars with a single
+        call to the model. As with preprocess_input, missing features take the
+        value 0, and so do values that are not numbers.
+
+        Parameters:
+            frame (DataFrame): Cars, with one column per feature.
+            quantiles (tuple): Quantiles of the price to add, see
+                predict_interval.
+
+        Returns:
+            DataFrame: The `predicted_price` of each row, with the index of
+            the frame, and with quantiles its `price_std` and a
+            `price_q<quantile>` column per quantile.
+        """
+        import pandas as pd
+
+        X = FEATURE_SCHEMA.transform_frame(frame)
+        if not quantiles:
+            predictions = self.predict_batch(X)
+            return pd.DataFrame({"predicted_price": predictions}, index=frame.index)
+
+        predictions, std, price_quantiles = self.predict_interval(X, quantiles)
+        columns = {"predicted_price": predictions, "price_std": std}
+        for j, q in enumerate(quantiles):
+            columns[f"price_q{q:g}"] = price_quantiles[:, j]
+        return pd.DataFrame(columns, index=frame.index)
+
+    @staticmethod
+    def preprocess_input(user_input, out=None):
+        """
+        Preprocesses the input data.
+
+        Parameters:
+            user_input (dict): Input data containing car features.
+            out (ndarray): Optional preallocated array of shape (1, n_features)
+                the features are written into.
+
+        Returns:
+            ndarray: Preprocessed feature values, of shape (1, n_features).
+        """
+        with span("preprocess"):
+            return FEATURE_SCHEMA.transform_one(user_input, out=out)
+
+    @staticmethod
+    def preprocess_batch(user_inputs, out=None):
+        """
+        Preprocesses a list of inputs into one feature matrix, one row per input.
+        """
+        with span("preprocess"):
+            return FEATURE_SCHEMA.transform(user_inputs, out=out)
 
     def post_process_prediction(self, prediction):
         """
@@ -85,3 +241,52 @@ class CarPricePredictor:
         # TODO: Implement any postprocessing needed for the prediction
         # For now, let's assume no postprocessing is needed
         return prediction
+
+
+def tree_quantiles(tree_predictions, quantiles):
+    """
+    Returns the quantiles of the tree predictions of each row, of shape
+    (n_samples, len(quantiles)), interpolated linearly like np.quantile but
+    with a single sort of the rows, which is much cheaper than np.quantile
+    for a few rows.
+    """
+    n_trees = tree_predictions.shape[1]
+    ordered = np.sort(tree_predictions, axis=1)
+    positions = np.asarray(quantiles, dtype=np.float64) * (n_trees - 1)
+    below = np.floor(positions).astype(np.intp)
+    above = np.minimum(below + 1, n_trees - 1)
+    weight = positions - below
+    return ordered[:, below] * (1 - weight) + ordered[:, above] * weight
+
+
+def current_artifacts():
+    """
+    Returns the version and the path of the model to serve, listed by the
+    manifest of the models directory (see api.loading.read_manifest).
+    """
+    return read_manifest(MODELS_DIR, {"model": MODEL_PATH})
+
+
+def current_version():
+    return current_artifacts()[0]
+
+
+def load_predictor():
+    """
+    Loads the CarPricePredictor served by the API, registered in the model
+    registry when the app is ready.
+    """
+    version, artifacts = current_artifacts()
+    return CarPricePredictor(
+        artifacts["model"],
+        backend=settings.PRICE_PILOT_INFERENCE_BACKEND,
+        version=version,
+    )
+
+
+def warm_up_predictor(predictor):
+    """
+    Runs a prediction on an empty input so that the first request does not pay
+    for any lazy initialisation of the model.
+    """
+    predictor.predict(predictor.preprocess_input({}))
@@ -0,0 +1,272 @@
+import logging
+import threading
+import time
+import uuid
+from datetime import timedelta
+
+import numpy as np
+from django.utils import timezone
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from .models import get_car_collection
+from .normalization import parse_number
+from .predictor import FEATURE_ORDER, FEATURE_SCHEMA
+
+SCORING_STATE_COLLECTION = "price_pilot_car_scoring"
+SCORING_STATE_ID = "car_prices"
+
+# Cars stamped shortly before a run but written after its query started would
+# be missed if the next run started exactly where this one did, so each run
+# goes back this far before the start of the previous one. Rescoring a car
+# twice is harmless.
+WATERMARK_LAG = timedelta(minutes=5)
+
+# A run still marked as running after this long died with its process, and no
+# longer prevents other runs from starting
+RUN_TIMEOUT = timedelta(hours=6)
+
+logger = logging.getLogger(__name__)
+
+
+class ScoringInProgress(Exception):
+    """
+    Raised when a run of the scoring is started while another one is running.
+    """
+
+    def __init__(self, running):
+        super().__init__(f"Run {running['id']} of the scoring is in progress.")
+        self.running = running
+
+
+def get_state_collection(collection=None):
+    """
+    Returns the collection holding the state of the scoring, next to the cars.
+    """
+    if collection is None:
+        collection = get_car_collection()
+    return collection.database[SCORING_STATE_COLLECTION]
+
+
+def get_scoring_state(collection=None):
+    """
+    Returns the state of the scoring: the watermark the next run starts from,
+    the model version the last run scored with, the summary of the last run
+    and the run in progress, if any. None if the cars have never been scored.
+    """
+    return get_state_collection(collection).find_one({"_id": SCORING_STATE_ID})
+
+
+def claim_run(collection=None):
+    """
+    Marks a new run of the scoring as running in the state, so that no other
+    run starts until it is released, in this process or another one.
+
+    Returns:
+        str: The id of the run.
+
+    Raises:
+        ScoringInProgress: If another run is running.
+    """
+    state_collection = get_state_collection(collection)
+    now = timezone.now()
+    running = {"id": uuid.uuid4().hex, "started_at": now}
+    try:
+        # Upserting a state that does not match the filter fails on its _id
+        state_collection.update_one(
+            {
+                "_id": SCORING_STATE_ID,
+                "$or": [
+                    {"running": None},
+                    {"running.started_at": {"$lt": now - RUN_TIMEOUT}},
+                ],
+            },
+            {"$set": {"running": running}},
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        state = get_scoring_state(collection) or {}
+        raise ScoringInProgress(state.get("running") or running)
+    return running["id"]
+
+
+def release_run(run_id, collection=None):
+    """
+    Marks a run of the scoring claimed with claim_run as finished.
+    """
+    get_state_collection(collection).update_one(
+        {"_id": SCORING_STATE_ID, "running.id": run_id}, {"$unset": {"running": ""}}
+    )
+
+
+def start_scoring(predictor, batch_size, full=False, collection=None):
+    """
+    Starts a run of score_stored_cars in a background thread of the process
+    and returns without waiting for it. Its summary, or its error, is saved
+    as the `last_run` of the state.
+
+    Returns:
+        str: The id of the run.
+
+    Raises:
+        ScoringInProgress: If another run is running.
+    """
+    run_id = claim_run(collection)
+    threading.Thread(
+        target=_score_in_background,
+        args=(predictor, batch_size, full, collection, run_id),
+        name="car-scoring",
+        daemon=True,
+    ).start()
+    return run_id
+
+
+def _score_in_background(predictor, batch_size, full, collection, run_id):
+    try:
+        score_stored_cars(
+            predictor, batch_size, full=full, collection=collection, run_id=run_id
+        )
+    except Exception as e:
+        logger.exception(f"Error scoring the stored cars in run {run_id}: {e}")
+
+
+def score_stored_cars(predictor, batch_size, full=False, collection=None, run_id=None):
+    """
+    Predicts the price of the stored cars and writes it back to them, as
+    `predicted_price` with the `price_model_version` that computed it.
+
+    Only the cars inserted or changed since the previous run are scored: every
+    write path stamps the cars with `updated_at`, and the start of each run is
+    saved as the watermark of the next one. All the cars are scored on the
+    first run, when the model version changed since the previous run, or
+    with full. Only one run is running at a time (see claim_run).
+
+    Cars are read with an aggregation pipeline that matches the cars to score
+    and projects only the features of the model, in batches of batch_size.
+    Each batch is converted into one feature matrix, predicted with a single
+    call to the model and written back with a single unordered bulk_write, so
+    memory does not grow with the collection.
+
+    Parameters:
+        predictor (CarPricePredictor): Predictor of the prices.
+        batch_size (int): Number of cars read, predicted and written together.
+        full (bool): Whether to score all the cars.
+        collection (Collection): Collection of the cars, the Car collection by
+            default.
+        run_id (str): Id of the run, when already claimed with claim_run.
+
+    Returns:
+        dict: The id of the run, the number of cars scored, the model version,
+        the watermark the run started from (None when all the cars were
+        scored) and its duration in seconds.
+
+    Raises:
+        ScoringInProgress: If another run is running.
+    """
+    if collection is None:
+        collection = get_car_collection()
+    if run_id is None:
+        run_id = claim_run(collection)
+    try:
+        return _score_stored_cars(predictor, batch_size, full, collection, run_id)
+    except Exception as e:
+        get_state_collection(collection).update_one(
+            {"_id": SCORING_STATE_ID},
+            {"$set": {"last_run": {"id": run_id, "error": str(e)}}},
+        )
+        raise
+    finally:
+        release_run(run_id, collection)
+
+
+def _score_stored_cars(predictor, batch_size, full, collection, run_id):
+    started_at = timezone.now()
+    start = time.perf_counter()
+
+    state = get_scoring_state(collection) or {}
+    since = None
+    if not full and state.get("model_version") == predictor.version:
+        since = state.get("watermark")
+
+    pipeline = [
+        {"$match": {"updated_at": {"$gte": since}} if since is not None else {}},
+        {"$project": {feature: True for feature in FEATURE_ORDER}},
+    ]
+    cursor = collection.aggregate(pipeline, allowDiskUse=True, batchSize=batch_size)
+    scored = 0
+    for documents in iter_batches(cursor, batch_size):
+        prices = predictor.predict_batch(feature_matrix(documents))
+        collection.bulk_write(
+            [
+                UpdateOne(
+                    {"_id": document["_id"]},
+                    {
+                        "$set": {
+                            "predicted_price": float(price),
+                            "price_model_version": predictor.version,
+                        }
+                    },
+                )
+                for document, price in zip(documents, prices)
+            ],
+            ordered=False,
+        )
+        scored += len(documents)
+
+    summary = {
+        "id": run_id,
+        "scored": scored,
+        "model_version": predictor.version,
+        "since": since,
+        "seconds": time.perf_counter() - start,
+    }
+    get_state_collection(collection).update_one(
+        {"_id": SCORING_STATE_ID},
+        {
+            "$set": {
+                "watermark": started_at - WATERMARK_LAG,
+                "model_version": predictor.version,
+                "last_run": {**summary, "started_at": started_at},
+            }
+        },
+        upsert=True,
+    )
+    return summary
+
+
+def iter_batches(cursor, batch_size):
+    """
+    Yields the documents of a cursor in lists of at most batch_size documents.
+    """
+    batch = []
+    for document in cursor:
+        batch.append(document)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def feature_matrix(documents):
+    """
+    Returns the feature matrix of a batch of car documents. Features are
+    converted one column at a time; the values still stored as strings by old
+    versions are parsed like ingested cars, and missing values or values that
+    are not numbers take the value 0, as in predict_price/.
+    """
+    import pandas as pd
+
+    frame = pd.DataFrame.from_records(documents, columns=FEATURE_ORDER)
+    for feature in FEATURE_ORDER:
+        column = frame[feature]
+        if column.dtype == object:
+            frame[feature] = column.map(_parse_or_nan)
+    return FEATURE_SCHEMA.transform_frame(frame)
+
+
+def _parse_or_nan(value):
+    try:
+        return parse_number(value)
+    except ValueError:
+        return np.nan
@@ -1,6 +1,37 @@
 from rest_framework import serializers
 
 from .models import Car
+from .normalization import parse_integer, parse_number
+
+
+class NormalizedNumberMixin:
+    """
+    Parses the numeric fields of scraped cars, which may be strings with a unit
+    or thousands separators such as "150hp", "7.5L/100km" or "25 000 €". A
+    blank string is treated as a missing value.
+    """
+
+    parse = None
+
+    def to_internal_value(self, data):
+        if isinstance(data, str):
+            try:
+                data = self.parse(data)
+            except ValueError:
+                self.fail("invalid")
+            if data is None:
+                if not self.allow_null:
+                    self.fail("null")
+                return None
+        return super().to_internal_value(data)
+
+
+class NormalizedFloatField(NormalizedNumberMixin, serializers.FloatField):
+    parse = staticmethod(parse_number)
+
+
+class NormalizedIntegerField(NormalizedNumberMixin, serializers.IntegerField):
+    parse = staticmethod(parse_integer)
 
 
 class CarSerializer(serializers.ModelSerializer):
@@ -18,27 +49,40 @@ class CarSerializer(serializers.ModelSerializer):
         car_instance = deserialized_car.save()
         print(car_instance)
 
+    Numeric fields are normalized from the scraped strings, e.g. "150hp" is stored as 150 and "7.5L/100km" as 7.5.
+
     Fields:
     - name: CharField representing the name of the car.
-    - price: CharField representing the price of the car.
-    - year: CharField representing the year of the car.
+    - price: FloatField representing the price of the car.
+    - year: IntegerField representing the year of the car.
     - origin: CharField representing the origin of the car.
     - registration_date: CharField representing the registration date of the car.
     - technical_inspection: CharField representing whether the car has passed the technical inspection.
     - first_hand: CharField representing whether the car is a first-hand car.
-    - mileage: CharField representing the mileage of the car.
+    - mileage: FloatField representing the mileage of the car.
     - fuel_type: CharField representing the fuel type of the car.
     - transmission: CharField representing the transmission type of the car.
-    - num_doors: CharField representing the number of doors of the car.
-    - num_seats: CharField representing the number of seats of the car.
-    - power: CharField representing the power of the car.
-    - co2_emission: CharField representing the CO2 emission of the car.
-    - trunk_volume: CharField representing the trunk volume of the car.
-    - length: CharField representing the length of the car.
+    - num_doors: IntegerField representing the number of doors of the car.
+    - num_seats: IntegerField representing the number of seats of the car.
+    - power: FloatField representing the power of the car.
+    - co2_emission: FloatField representing the CO2 emission of the car.
+    - trunk_volume: FloatField representing the trunk volume of the car.
+    - length: FloatField representing the length of the car.
     - critair_rating: CharField representing the Crit'Air rating of the car.
-    - combined_consumption: CharField representing the combined fuel consumption of the car.
+    - combined_consumption: FloatField representing the combined fuel consumption of the car.
     """
 
+    price = NormalizedFloatField(allow_null=True, required=False)
+    year = NormalizedIntegerField(allow_null=True, required=False)
+    mileage = NormalizedFloatField(allow_null=True, required=False)
+    num_doors = NormalizedIntegerField(allow_null=True, required=False)
+    num_seats = NormalizedIntegerField(allow_null=True, required=False)
+    power = NormalizedFloatField(allow_null=True, required=False)
+    co2_emission = NormalizedFloatField(allow_null=True, required=False)
+    trunk_volume = NormalizedFloatField(allow_null=True, required=False)
+    length = NormalizedFloatField(allow_null=True, required=False)
+    combined_consumption = NormalizedFloatField(allow_null=True, required=False)
+
     class Meta:
         model = Car
         fields = [
@@ -1,3 +1,259 @@
-from django.test import TestCase
+import random
+import tempfile
+import time
+from datetime import timedelta
+from types import SimpleNamespace
 
-# Create your tests here.
+import numpy as np
+from django.test import SimpleTestCase
+from django.utils import timezone
+
+from api.standins import fake_car, train_price_pilot
+
+from .export import fetch_page, parse_cursor
+from .predictor import FEATURE_ORDER, CarPricePredictor
+from .scoring import (
+    ScoringInProgress,
+    claim_run,
+    feature_matrix,
+    get_scoring_state,
+    release_run,
+    score_stored_cars,
+    start_scoring,
+)
+from .serializers import serializers
+from .training import load_training_data
+
+
+def car_collection():
+    import mongomock
+
+    return mongomock.MongoClient().db.cars
+
+
+class CarPriceTestCase(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.model_path = train_price_pilot(cls.directory.name, n_samples=500)
+        cls.predictor = CarPricePredictor(cls.model_path, version="v1")
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.directory.cleanup()
+        super().tearDownClass()
+
+    @staticmethod
+    def fake_cars(n, seed=0, **fields):
+        rng = random.Random(seed)
+        return [{**fake_car(rng), **fields} for _ in range(n)]
+
+
+class KeysetPaginationTests(SimpleTestCase):
+    def setUp(self):
+        self.collection = car_collection()
+        self.collection.insert_many(CarPriceTestCase.fake_cars(25))
+
+    def test_pages_cover_the_collection_in_id_order(self):
+        names = [car["name"] for car in self.collection.find(sort=[("_id", 1)])]
+        pages, cursor = [], None
+        while True:
+            documents, cursor = fetch_page(
+                self.collection, ["name", "year"], parse_cursor(cursor), limit=10
+            )
+            pages.append(documents)
+            if cursor is None:
+                break
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+        self.assertEqual([car["name"] for page in pages for car in page], names)
+        self.assertEqual(set(pages[0][0]), {"name", "year"})
+
+    def test_last_page_has_no_cursor(self):
+        documents, cursor = fetch_page(self.collection, ["name"], limit=25)
+        self.assertEqual(len(documents), 25)
+        self.assertIsNone(cursor)
+
+    def test_invalid_cursor(self):
+        self.assertIsNone(parse_cursor(""))
+        with self.assertRaises(serializers.ValidationError):
+            parse_cursor("not-an-id")
+
+
+class ScoreStoredCarsTests(CarPriceTestCase):
+    def setUp(self):
+        self.collection = car_collection()
+        self.collection.insert_many(
+            self.fake_cars(30, updated_at=timezone.now() - timedelta(days=1))
+        )
+
+    def score(self, predictor=None, **kwargs):
+        return score_stored_cars(
+            predictor or self.predictor, 8, collection=self.collection, **kwargs
+        )
+
+    def test_first_run_scores_every_car(self):
+        summary = self.score()
+        self.assertEqual(summary["scored"], 30)
+        self.assertIsNone(summary["since"])
+
+        cars = list(self.collection.find(sort=[("_id", 1)]))
+        np.testing.assert_array_equal(
+            [car["predicted_price"] for car in cars],
+            self.predictor.predict_batch(feature_matrix(cars)),
+        )
+        self.assertEqual({car["price_model_version"] for car in cars}, {"v1"})
+
+    def test_next_runs_only_score_changed_cars(self):
+        self.score()
+        watermark = get_scoring_state(self.collection)["watermark"]
+        self.collection.insert_many(
+            self.fake_cars(5, seed=1, updated_at=timezone.now())
+        )
+
+        summary = self.score()
+        self.assertEqual(summary["scored"], 5)
+        self.assertEqual(summary["since"], watermark)
+        self.assertEqual(
+            self.collection.count_documents({"predicted_price": {"$exists": True}}),
+            35,
+        )
+
+    def test_model_change_scores_every_car(self):
+        self.score()
+        predictor = CarPricePredictor(self.model_path, version="v2")
+        self.assertEqual(self.score(predictor)["scored"], 30)
+        self.assertEqual(
+            self.collection.count_documents({"price_model_version": "v2"}), 30
+        )
+
+    def test_full_run(self):
+        self.score()
+        self.assertEqual(self.score(full=True)["scored"], 30)
+        self.assertEqual(self.score()["scored"], 0)
+
+    def test_one_run_at_a_time(self):
+        run_id = claim_run(self.collection)
+        with self.assertRaises(ScoringInProgress) as context:
+            self.score()
+        self.assertEqual(context.exception.running["id"], run_id)
+
+        release_run(run_id, self.collection)
+        self.assertEqual(self.score()["scored"], 30)
+        self.assertNotIn("running", get_scoring_state(self.collection))
+
+    def test_failed_run_is_recorded_and_released(self):
+        def predict_batch(X):
+            raise ValueError("model failed")
+
+        predictor = SimpleNamespace(version="v1", predict_batch=predict_batch)
+        with self.assertRaises(ValueError):
+            self.score(predictor)
+        state = get_scoring_state(self.collection)
+        self.assertEqual(state["last_run"]["error"], "model failed")
+        self.assertNotIn("running", state)
+
+    def test_start_scoring_runs_in_the_background(self):
+        run_id = start_scoring(self.predictor, 8, collection=self.collection)
+        deadline = time.monotonic() + 10
+        while "running" in get_scoring_state(self.collection):
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.01)
+        last_run = get_scoring_state(self.collection)["last_run"]
+        self.assertEqual((last_run["id"], last_run["scored"]), (run_id, 30))
+
+    def test_feature_matrix_parses_old_documents(self):
+        matrix = feature_matrix(
+            [{"_id": 1, "year": 2015, "power": "150hp", "mileage": "n/a"}, {"_id": 2}]
+        )
+        self.assertEqual(matrix.shape, (2, len(FEATURE_ORDER)))
+        self.assertEqual(matrix[0, FEATURE_ORDER.index("power")], 150)
+        self.assertEqual(matrix[0, FEATURE_ORDER.index("mileage")], 0)
+        self.assertFalse(matrix[1].any())
+
+
+class LoadTrainingDataTests(SimpleTestCase):
+    def setUp(self):
+        self.collection = car_collection()
+        self.collection.insert_many(CarPriceTestCase.fake_cars(30))
+
+    def test_loads_every_car(self):
+        X, y, truncated = load_training_data(self.collection, batch_size=8)
+        self.assertEqual(
+            (X.shape, len(y), truncated), ((30, len(FEATURE_ORDER)), 30, False)
+        )
+
+    def test_stops_at_the_deadline(self):
+        X, y, truncated = load_training_data(
+            self.collection, batch_size=8, deadline=time.monotonic()
+        )
+        self.assertEqual((len(X), len(y), truncated), (8, 8, True))
+
+
+class ScoreFrameTests(CarPriceTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        import pandas as pd
+
+        cls.frame = pd.DataFrame(cls.fake_cars(40), index=range(100, 140))
+        cls.X = feature_matrix(cls.frame.to_dict("records"))
+
+    def test_predicts_like_predict_batch(self):
+        scores = self.predictor.score_frame(self.frame)
+        self.assertEqual(list(scores.columns), ["predicted_price"])
+        self.assertEqual(list(scores.index), list(self.frame.index))
+        np.testing.assert_array_equal(
+            scores["predicted_price"], self.predictor.predict_batch(self.X)
+        )
+
+    def test_missing_features_are_zero(self):
+        frame = self.frame.drop(columns=["length"])
+        frame.loc[100, "power"] = None
+        X = self.X.copy()
+        X[:, FEATURE_ORDER.index("length")] = 0
+        X[0, FEATURE_ORDER.index("power")] = 0
+        np.testing.assert_array_equal(
+            self.predictor.score_frame(frame)["predicted_price"],
+            self.predictor.predict_batch(X),
+        )
+
+    def test_quantiles(self):
+        scores = self.predictor.score_frame(self.frame, quantiles=(0.1, 0.9))
+        self.assertEqual(
+            list(scores.columns),
+            ["predicted_price", "price_std", "price_q0.1", "price_q0.9"],
+        )
+        np.testing.assert_array_equal(
+            scores["predicted_price"], self.predictor.predict_batch(self.X)
+        )
+        self.assertTrue((scores["price_q0.1"] <= scores["price_q0.9"]).all())
+
+
+class PredictIntervalTests(CarPriceTestCase):
+    def test_matches_the_trees_of_the_forest(self):
+        X = feature_matrix(self.fake_cars(50))
+        quantiles = (0.05, 0.5, 0.95)
+        tree_predictions = np.column_stack(
+            [
+                tree.predict(X.astype(np.float32))
+                for tree in self.predictor.model.estimators_
+            ]
+        )
+        for backend in ("sklearn", "numba"):
+            with self.subTest(backend=backend):
+                predictor = CarPricePredictor(self.model_path, backend=backend)
+                prices, std, price_quantiles = predictor.predict_interval(X, quantiles)
+                np.testing.assert_array_equal(prices, predictor.predict_batch(X))
+                np.testing.assert_allclose(std, tree_predictions.std(axis=1))
+                np.testing.assert_allclose(
+                    price_quantiles,
+                    np.quantile(tree_predictions, quantiles, axis=1).T,
+                )
+
+    def test_single_car(self):
+        X = self.predictor.preprocess_input(self.fake_cars(1)[0])
+        prices, std, price_quantiles = self.predictor.predict_interval(X)
+        self.assertEqual(prices[0], self.predictor.predict(X))
+        self.assertEqual(price_quantiles.shape, (1, 2))
+        self.assertLessEqual(price_quantiles[0, 0], price_quantiles[0, 1])
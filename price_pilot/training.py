@@ -0,0 +1,301 @@
+import itertools
+import json
+import math
+import os
+import time
+from datetime import datetime, timezone
+
+import joblib
+import numpy as np
+
+from api.loading import MANIFEST_NAME
+
+from .predictor import FEATURE_ORDER, FEATURE_SCHEMA
+from .scoring import feature_matrix, iter_batches
+
+# Hyperparameters tried by the search, sampled from their product
+SEARCH_SPACE = {
+    "max_depth": [None, 12, 20],
+    "min_samples_leaf": [1, 3, 10],
+    "max_features": [1.0, 0.5, "sqrt"],
+}
+# Forests of the search are small and trained on samples of growing size,
+# starting from SEARCH_MIN_ROWS rows, the candidates kept after each round
+# being the best third
+SEARCH_ESTIMATORS = 30
+SEARCH_MIN_ROWS = 2000
+SEARCH_KEEP = 3
+# The final forest grows by GROWTH_STEP trees until its validation error
+# improves by less than GROWTH_TOLERANCE for GROWTH_PATIENCE steps
+GROWTH_STEP = 25
+GROWTH_TOLERANCE = 0.005
+GROWTH_PATIENCE = 2
+# Loading the cars stops after this fraction of the time budget, so that a
+# large collection leaves time to train on what was loaded
+LOAD_BUDGET_FRACTION = 0.3
+
+
+def load_training_data(collection, sample=None, batch_size=10000, deadline=None):
+    """
+    Streams the priced cars of a collection into a feature matrix and a price
+    vector, with an aggregation pipeline projecting only the features and the
+    price, converted in batches of batch_size cars.
+
+    Parameters:
+        collection (Collection): Collection of the cars.
+        sample (int): Number of cars sampled at random by the server, all the
+            cars by default.
+        batch_size (int): Number of cars converted together.
+        deadline (float): time.monotonic() value after which no more batches
+            are read, the cars read so far being returned.
+
+    Returns:
+        tuple: The feature matrix, the prices and whether the deadline stopped
+        the loading before the end of the cars.
+    """
+    pipeline = [{"$match": {"price": {"$gt": 0}}}]
+    if sample:
+        pipeline.append({"$sample": {"size": sample}})
+    pipeline.append({"$project": {field: True for field in (*FEATURE_ORDER, "price")}})
+    cursor = collection.aggregate(pipeline, allowDiskUse=True, batchSize=batch_size)
+
+    matrices, prices = [], []
+    truncated = False
+    with cursor:
+        for documents in iter_batches(cursor, batch_size):
+            matrices.append(feature_matrix(documents))
+            prices.append(
+                np.array([document.get("price") for document in documents], dtype=float)
+            )
+            if deadline is not None and time.monotonic() > deadline:
+                truncated = True
+                break
+    if not matrices:
+        return FEATURE_SCHEMA.empty(0), np.empty(0), truncated
+    return (*clean(np.concatenate(matrices), np.concatenate(prices)), truncated)
+
+
+def clean(X, y):
+    """
+    Drops the cars without a valid price and the duplicated listings, which
+    scraped data is full of, in a few array operations.
+    """
+    valid = np.isfinite(y) & (y > 0) & np.isfinite(X).all(axis=1)
+    X, y = X[valid], y[valid]
+    _, first = np.unique(np.column_stack([X, y]), axis=0, return_index=True)
+    first.sort()
+    return X[first], y[first]
+
+
+def sample_candidates(n_candidates, rng):
+    """
+    Returns n_candidates distinct hyperparameter combinations of SEARCH_SPACE.
+    """
+    names = list(SEARCH_SPACE)
+    grid = list(itertools.product(*SEARCH_SPACE.values()))
+    return [
+        dict(zip(names, grid[i])) for i in rng.permutation(len(grid))[:n_candidates]
+    ]
+
+
+def mean_absolute_error(model, X, y):
+    return float(np.abs(model.predict(X) - y).mean())
+
+
+def search(X, y, X_val, y_val, candidates, n_jobs, deadline, rng, log=None):
+    """
+    Picks the best hyperparameters by successive halving: every candidate is
+    trained on a small sample of the training set, and only the best third is
+    trained again on a sample three times as large, until one candidate is
+    left or the whole set is used. The search stops early at the deadline,
+    with the best candidate of the last round.
+
+    Returns:
+        tuple: The best hyperparameters and the history of the search.
+    """
+    from sklearn.ensemble import RandomForestRegressor
+
+    survivors = list(candidates)
+    n_rows = min(len(X), SEARCH_MIN_ROWS)
+    history = []
+    while True:
+        rows = rng.choice(len(X), n_rows, replace=False)
+        scores = []
+        for params in survivors:
+            if time.monotonic() > deadline:
+                break
+            model = RandomForestRegressor(
+                n_estimators=SEARCH_ESTIMATORS, n_jobs=n_jobs, random_state=0, **params
+            ).fit(X[rows], y[rows])
+            scores.append(mean_absolute_error(model, X_val, y_val))
+            history.append({"params": params, "rows": n_rows, "mae": scores[-1]})
+            if log is not None:
+                log(f"  {params} on {n_rows} rows: MAE {scores[-1]:.0f}")
+        if not scores:
+            # The deadline passed before this round, the survivors are ranked
+            return survivors[0], history
+        ranked = [survivors[i] for i in np.argsort(scores)]
+        if len(scores) < len(survivors) or len(ranked) == 1 or n_rows == len(X):
+            return ranked[0], history
+        survivors = ranked[: math.ceil(len(ranked) / SEARCH_KEEP)]
+        n_rows = min(len(X), n_rows * SEARCH_KEEP)
+
+
+def grow(X, y, X_val, y_val, params, n_jobs, max_estimators, deadline, log=None):
+    """
+    Trains the final forest, adding GROWTH_STEP trees at a time with
+    warm_start, and stops when the validation error stops improving, when
+    max_estimators trees are grown or at the deadline.
+
+    Returns:
+        RandomForestRegressor: The trained forest.
+    """
+    from sklearn.ensemble import RandomForestRegressor
+
+    model = RandomForestRegressor(
+        n_estimators=0, warm_start=True, n_jobs=n_jobs, random_state=0, **params
+    )
+    best, stalled = math.inf, 0
+    while model.n_estimators < max_estimators:
+        model.set_params(
+            n_estimators=min(model.n_estimators + GROWTH_STEP, max_estimators)
+        )
+        model.fit(X, y)
+        error = mean_absolute_error(model, X_val, y_val)
+        if log is not None:
+            log(f"  {model.n_estimators} trees: MAE {error:.0f}")
+        stalled = stalled + 1 if error > best * (1 - GROWTH_TOLERANCE) else 0
+        best = min(best, error)
+        if stalled >= GROWTH_PATIENCE or time.monotonic() > deadline:
+            break
+    return model
+
+
+def evaluate(model, X, y):
+    """
+    Returns the mean absolute error, the root mean squared error and the
+    coefficient of determination of the model on a validation set.
+    """
+    errors = model.predict(X) - y
+    return {
+        "mae": float(np.abs(errors).mean()),
+        "rmse": float(np.sqrt((errors**2).mean())),
+        "r2": float(1 - (errors**2).sum() / ((y - y.mean()) ** 2).sum()),
+    }
+
+
+def train_price_model(
+    collection,
+    time_budget,
+    n_jobs=-1,
+    sample=None,
+    n_candidates=12,
+    max_estimators=300,
+    validation_fraction=0.2,
+    seed=0,
+    log=None,
+):
+    """
+    Trains a car price forest on the cars of a collection within a time
+    budget: the data is loaded, for at most LOAD_BUDGET_FRACTION of the
+    budget, then about half of the remaining time goes to the hyperparameter
+    search and the rest to growing the final forest.
+
+    When the loading is stopped, the model is trained on the cars read so far,
+    in the order of the collection unless sample is given, and the metadata
+    records it.
+
+    Returns:
+        tuple: The trained model and its metadata (feature schema,
+        hyperparameters, validation metrics and history of the search).
+
+    Raises:
+        ValueError: If there are too few priced cars to train on.
+    """
+    start = time.monotonic()
+    deadline = start + time_budget
+    rng = np.random.default_rng(seed)
+
+    X, y, truncated = load_training_data(
+        collection, sample=sample, deadline=start + time_budget * LOAD_BUDGET_FRACTION
+    )
+    if len(X) < 50:
+        raise ValueError(f"Only {len(X)} priced cars to train on.")
+    if log is not None:
+        log(
+            f"Loaded {len(X)} cars in {time.monotonic() - start:.1f} s"
+            + (" (stopped at the loading deadline)" if truncated else "")
+        )
+
+    order = rng.permutation(len(X))
+    n_validation = max(1, int(len(X) * validation_fraction))
+    validation, training = order[:n_validation], order[n_validation:]
+    X_train, y_train = X[training], y[training]
+    X_val, y_val = X[validation], y[validation]
+
+    search_deadline = time.monotonic() + (deadline - time.monotonic()) / 2
+    params, history = search(
+        X_train,
+        y_train,
+        X_val,
+        y_val,
+        sample_candidates(n_candidates, rng),
+        n_jobs,
+        search_deadline,
+        rng,
+        log=log,
+    )
+    if log is not None:
+        log(f"Best hyperparameters: {params}")
+    model = grow(
+        X_train, y_train, X_val, y_val, params, n_jobs, max_estimators, deadline, log
+    )
+    # Trained on every core, served with the default number of jobs
+    model.set_params(n_jobs=None, warm_start=False)
+
+    metadata = {
+        "trained_at": datetime.now(timezone.utc).isoformat(),
+        "features": list(FEATURE_ORDER),
+        "defaults": FEATURE_SCHEMA.defaults.tolist(),
+        "params": params,
+        "n_estimators": model.n_estimators,
+        "data": {"n_cars": len(X), "sample": sample, "truncated": truncated},
+        "metrics": {
+            **evaluate(model, X_val, y_val),
+            "n_train": len(X_train),
+            "n_validation": len(X_val),
+        },
+        "search": history,
+        "seconds": time.monotonic() - start,
+    }
+    return model, metadata
+
+
+def save_price_model(model, metadata, models_dir, activate=False):
+    """
+    Writes a trained model and its metadata to the models directory, as
+    random_forest_model-<version>.joblib and .json, the version being the
+    UTC training time. With activate, the manifest of the directory is
+    replaced to serve the new version (see api.loading.read_manifest).
+
+    Returns:
+        tuple: The version and the path of the model.
+    """
+    version = datetime.fromisoformat(metadata["trained_at"]).strftime("%Y%m%d%H%M%S")
+    name = f"random_forest_model-{version}"
+    model_path = os.path.join(models_dir, f"{name}.joblib")
+    joblib.dump(model, model_path)
+    with open(os.path.join(models_dir, f"{name}.json"), "w", encoding="utf-8") as f:
+        json.dump({"version": version, **metadata}, f, indent=2)
+
+    if activate:
+        manifest_path = os.path.join(models_dir, MANIFEST_NAME)
+        # Replaced atomically, the workers may read it at any time
+        with open(f"{manifest_path}.tmp", "w", encoding="utf-8") as f:
+            json.dump(
+                {"version": version, "artifacts": {"model": f"{name}.joblib"}},
+                f,
+                indent=2,
+            )
+        os.replace(f"{manifest_path}.tmp", manifest_path)
+    return version, model_path
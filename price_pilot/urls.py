@@ -1,10 +1,23 @@
 from django.urls import path
 
-from .views import CarDataBulkView, CarDataView, CarNameListView, CarPricePredictionView
+from .views import (
+    AsyncCarPricePredictionView,
+    CarDataBulkView,
+    CarDataView,
+    CarNameListView,
+    CarPricePredictionView,
+    CarPriceScoringView,
+)
 
 urlpatterns = [
     path("car_data/", CarDataView.as_view(), name="car_data"),
     path("predict_price/", CarPricePredictionView.as_view(), name="predict_price"),
+    path(
+        "predict_price_async/",
+        AsyncCarPricePredictionView.as_view(),
+        name="predict_price_async",
+    ),
     path("car_names/", CarNameListView.as_view(), name="car_names"),
     path("car_data_bulk/", CarDataBulkView.as_view(), name="car_data_bulk"),
+    path("score_cars/", CarPriceScoringView.as_view(), name="score_cars"),
 ]
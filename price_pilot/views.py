@@ -1,12 +1,52 @@
-import os
+import io
+from functools import partial
 
-from rest_framework import generics, response, status, views
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.http import parse_etags
+from rest_framework import generics, permissions, response, status, views
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
 
-from .models import Car
-from .predictor import CarPricePredictor
+from api.async_views import AsyncAPIView
+from api.batching import MicroBatcher, group_by_model
+from api.cache import prediction_cache
+from api.registry import registry
+from api.timing import annotate, span
+
+from .car_names import car_name_index
+from .export import (
+    NDJSONRenderer,
+    fetch_page,
+    iter_ndjson_export,
+    parse_cursor,
+    parse_fields,
+)
+from .ingest import CarIngestion, IngestionError, iter_json_array, iter_ndjson
+from .models import Car, get_car_collection
+from .scoring import ScoringInProgress, get_scoring_state, start_scoring
 from .serializers import CarSerializer, UserInputSerializer, serializers
 
 
+def parse_quantiles(value):
+    """
+    Parses the quantiles= query parameter, comma-separated quantiles of the
+    price in [0, 1], e.g. "0.05,0.95". None if the parameter is absent.
+    """
+    if not value:
+        return None
+    try:
+        quantiles = tuple(float(q) for q in value.split(","))
+    except ValueError:
+        quantiles = ()
+    if not quantiles or not all(0 <= q <= 1 for q in quantiles):
+        raise serializers.ValidationError(
+            {"quantiles": "Comma-separated numbers between 0 and 1 expected."}
+        )
+    return quantiles
+
+
 class CarDataView(generics.CreateAPIView):
     """
     A Django REST Framework view that handles the creation of car objects.
@@ -19,6 +59,10 @@ class CarDataView(generics.CreateAPIView):
     serializer_class = CarSerializer
     queryset = Car.objects.all()
 
+    def perform_create(self, serializer):
+        instance = serializer.save(updated_at=timezone.now())
+        car_name_index.add_names([instance.name])
+
 
 class CarPricePredictionView(views.APIView):
     """
@@ -28,21 +72,9 @@ class CarPricePredictionView(views.APIView):
     - post: Handles the POST request to the view. It receives the user input data, validates it using the UserInputSerializer, preprocesses the input data, predicts the car price using the CarPricePredictor class, post-processes the prediction, and returns the predicted price to the client.
     """
 
-    def __init__(self):
-        """
-        Initializes the CarPricePredictionView class.
-
-        Fields:
-        - price_pilot: An instance of the CarPricePredictor class that is used to preprocess and predict car prices. It is initialized with a trained model loaded from a file.
-        """
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        path = "models/random_forest_model.joblib"
-        model_path = os.path.join(current_dir, path)
-        self.price_pilot = CarPricePredictor(model_path)
-
     def post(self, request, format=None):
         """
-        Handles the POST request to the view.
+        Handles the POST request to the view. With the `quantiles` query parameter, e.g. `?quantiles=0.05,0.95`, the response also has the standard deviation and the quantiles of the predictions of the trees of the forest, as `price_std` and `price_quantiles`.
 
         Args:
         - request: The HTTP request object.
@@ -51,20 +83,173 @@ class CarPricePredictionView(views.APIView):
         Returns:
         - A response object with the predicted car price or validation errors.
         """
+        quantiles = parse_quantiles(request.query_params.get("quantiles"))
         serializer = UserInputSerializer(data=request.data["data"])
-        if serializer.is_valid():
-            preprocessed_input = self.price_pilot.preprocess_input(
-                serializer.validated_data
+        with span("validation"):
+            valid = serializer.is_valid()
+        if valid and quantiles:
+            interval, version = self.get_price_interval(
+                serializer.validated_data, quantiles
             )
-            prediction = self.price_pilot.predict(preprocessed_input)
-            post_process_prediction = self.price_pilot.post_process_prediction(
-                prediction
+            return response.Response(
+                {**interval, "model_version": version}, status=status.HTTP_200_OK
             )
+        if valid:
+            post_process_prediction, version = self.get_price(serializer.validated_data)
             return response.Response(
-                {"predicted_price": post_process_prediction}, status=status.HTTP_200_OK
+                {"predicted_price": post_process_prediction, "model_version": version},
+                status=status.HTTP_200_OK,
             )
         return response.Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @classmethod
+    def get_price(cls, input_data):
+        """
+        Returns the predicted price of a validated input, from the prediction
+        cache or computed by the CarPricePredictor, and the version of the
+        model. The trained model is loaded once per process by the model
+        registry and shared by every request.
+        With MICRO_BATCH_ENABLED, the cars of concurrent requests are predicted
+        together by the micro-batcher.
+        """
+        price_pilot = registry.get("price_pilot")
+        annotate(model_version=price_pilot.version)
+        if settings.MICRO_BATCH_ENABLED:
+            compute = partial(batcher.run, (price_pilot, input_data))
+        else:
+            compute = partial(cls.predict_price, price_pilot, input_data)
+        post_process_prediction = prediction_cache.get_or_compute(
+            "price_pilot",
+            price_pilot.version,
+            input_data,
+            compute,
+            # Prediction errors are returned as strings and are not cached
+            cacheable=lambda prediction: not isinstance(prediction, str),
+        )
+        return post_process_prediction, price_pilot.version
+
+    @classmethod
+    def get_price_interval(cls, input_data, quantiles):
+        """
+        Returns the predicted price of a validated input with the spread of
+        the predictions of the trees (see CarPricePredictor.predict_interval),
+        from the prediction cache or computed directly, and the version of the
+        model.
+        """
+        price_pilot = registry.get("price_pilot")
+        annotate(model_version=price_pilot.version)
+        interval = prediction_cache.get_or_compute(
+            f"price_pilot_interval:{','.join(f'{q:g}' for q in quantiles)}",
+            price_pilot.version,
+            input_data,
+            partial(cls.predict_price_interval, price_pilot, input_data, quantiles),
+        )
+        return interval, price_pilot.version
+
+    @staticmethod
+    def predict_price_interval(price_pilot, input_data, quantiles):
+        """
+        Preprocesses the input data and predicts the car price, its standard
+        deviation and its quantiles.
+        """
+        preprocessed_input = price_pilot.preprocess_input(input_data)
+        prices, std, price_quantiles = price_pilot.predict_interval(
+            preprocessed_input, quantiles
+        )
+        return {
+            "predicted_price": float(prices[0]),
+            "price_std": float(std[0]),
+            "price_quantiles": {
+                f"{q:g}": float(value)
+                for q, value in zip(quantiles, price_quantiles[0])
+            },
+        }
+
+    @staticmethod
+    def predict_price(price_pilot, input_data):
+        """
+        Preprocesses the input data, predicts the car price and post-processes it.
+        """
+        preprocessed_input = price_pilot.preprocess_input(input_data)
+        prediction = price_pilot.predict(preprocessed_input)
+        return price_pilot.post_process_prediction(prediction)
+
+    @staticmethod
+    def predict_price_items(items):
+        """
+        Predicts a batch of (predictor, input) items of the micro-batcher,
+        preprocessed into one matrix, with one call to the model per
+        predictor. As with predict, a failed prediction is returned as an
+        error message for each input.
+        """
+        results = [None] * len(items)
+        for price_pilot, indexes in group_by_model(items):
+            try:
+                predictions = price_pilot.predict_batch(
+                    price_pilot.preprocess_batch([items[i][1] for i in indexes])
+                )
+            except Exception as e:
+                predictions = [f"Prediction error: {str(e)}"] * len(indexes)
+            for i, prediction in zip(indexes, predictions):
+                results[i] = prediction
+        return results
+
+
+batcher = MicroBatcher(
+    "price_pilot",
+    CarPricePredictionView.predict_price_items,
+    max_batch_size=settings.MICRO_BATCH_MAX_SIZE,
+    max_wait=settings.MICRO_BATCH_MAX_WAIT_MS / 1000,
+)
+
+
+class AsyncCarPricePredictionView(AsyncAPIView):
+    """
+    Async variant of CarPricePredictionView for ASGI servers. The prediction runs in the bounded inference executor instead of on the event loop, and a 429 response is returned when the executor queue is full.
+    """
+
+    async def post(self, request, *args, **kwargs):
+        """
+        Handles the POST request to the view.
+        """
+        body = self.parse_json(request)
+        if not isinstance(body, dict):
+            return self.json_response(
+                {"detail": "JSON parse error."}, status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            quantiles = parse_quantiles(request.GET.get("quantiles"))
+        except serializers.ValidationError as e:
+            return self.json_response(e.detail, status=status.HTTP_400_BAD_REQUEST)
+        serializer = UserInputSerializer(data=body.get("data"))
+        with span("validation"):
+            valid = serializer.is_valid()
+        if not valid:
+            return self.json_response(
+                serializer.errors, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if quantiles:
+            result, rejected = await self.run_inference(
+                CarPricePredictionView.get_price_interval,
+                serializer.validated_data,
+                quantiles,
+            )
+            if rejected is not None:
+                return rejected
+            interval, version = result
+            return self.json_response({**interval, "model_version": version})
+
+        result, rejected = await self.run_inference(
+            CarPricePredictionView.get_price, serializer.validated_data
+        )
+        if rejected is not None:
+            return rejected
+        post_process_prediction, version = result
+        return self.json_response(
+            {"predicted_price": post_process_prediction, "model_version": version}
+        )
+
 
 class CarNameSerializer(serializers.ListSerializer):
     child = serializers.CharField()
@@ -78,6 +263,10 @@ class CarDataBulkView(generics.ListCreateAPIView):
     """
     A Django REST Framework view that handles the creation and list of car objects in bulk.
 
+    Cars are created from a JSON array (or, with the application/x-ndjson content type, one JSON document per line) streamed from the request body, validated in chunks of CAR_BULK_CHUNK_SIZE and written with one insert_many per chunk. The response is a summary of the number of cars received, inserted and failed, with the errors of the failed cars identified by their index in the input.
+
+    Cars are listed in pages of `limit` cars (CAR_LIST_PAGE_SIZE by default, at most CAR_LIST_MAX_PAGE_SIZE) in _id order, with keyset pagination: the `next` link of a page carries the cursor of the following one. The `fields` query parameter restricts the comma-separated fields returned. With the application/x-ndjson Accept header or `format=ndjson`, the whole collection (from the cursor, if any) is streamed as newline-delimited JSON from a server-side cursor read in batches of CAR_EXPORT_BATCH_SIZE, in constant memory.
+
     Attributes:
         serializer_class (class): The serializer class used for serializing and deserializing car objects.
         queryset (QuerySet): The queryset of car objects used for the view.
@@ -86,24 +275,79 @@ class CarDataBulkView(generics.ListCreateAPIView):
     serializer_class = CarSerializer
     queryset = Car.objects.all()
 
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, NDJSONRenderer]
+
+    NDJSON_CONTENT_TYPE = NDJSONRenderer.media_type
+
+    def list(self, request, *args, **kwargs):
+        fields = parse_fields(request.query_params.get("fields"))
+        after = parse_cursor(request.query_params.get("cursor"))
+        collection = get_car_collection()
+
+        if request.accepted_renderer.format == NDJSONRenderer.format:
+            return StreamingHttpResponse(
+                iter_ndjson_export(
+                    collection, fields, after, settings.CAR_EXPORT_BATCH_SIZE
+                ),
+                content_type=NDJSONRenderer.media_type,
+            )
+
+        documents, next_cursor = fetch_page(
+            collection, fields, after, self.get_page_size(request)
+        )
+        next_url = None
+        if next_cursor is not None:
+            next_url = replace_query_param(
+                request.build_absolute_uri(), "cursor", next_cursor
+            )
+        return response.Response({"next": next_url, "results": documents})
+
+    @staticmethod
+    def get_page_size(request):
+        try:
+            limit = int(request.query_params["limit"])
+        except (KeyError, ValueError):
+            return settings.CAR_LIST_PAGE_SIZE
+        return min(max(limit, 1), settings.CAR_LIST_MAX_PAGE_SIZE)
+
     def create(self, request, *args, **kwargs):
-        serializer = self.get_serializer(data=request.data, many=True)
-        serializer.is_valid(raise_exception=True)
-        self.perform_create(serializer)
-        headers = self.get_success_headers(serializer.data)
-        return response.Response(
-            serializer.data, status=status.HTTP_201_CREATED, headers=headers
+        # DRF has no stream for a request without a body
+        stream = request.stream or io.BytesIO()
+        if request.content_type.startswith(self.NDJSON_CONTENT_TYPE):
+            records = iter_ndjson(stream)
+        else:
+            records = iter_json_array(stream)
+
+        ingestion = CarIngestion(
+            chunk_size=settings.CAR_BULK_CHUNK_SIZE,
+            max_errors=settings.CAR_BULK_MAX_ERRORS,
         )
+        try:
+            summary = ingestion.run(records, on_insert=self.index_car_names)
+        except IngestionError as e:
+            # The chunks before the error have already been inserted
+            return response.Response(
+                {"detail": str(e), **ingestion.summary},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if summary["failed"] and not summary["inserted"]:
+            return response.Response(summary, status=status.HTTP_400_BAD_REQUEST)
+        return response.Response(summary, status=status.HTTP_201_CREATED)
+
+    @staticmethod
+    def index_car_names(documents):
+        car_name_index.add_names(document["name"] for document in documents)
 
 
 class CarNameListView(views.APIView):
     """
-    API view that retrieves all car names from the database, extracts the brand and model information, and returns a list of distinct brand-model pairs to the client.
+    API view that returns the list of distinct brand-model pairs of the cars stored in the database.
     """
 
     def get(self, request, format=None):
         """
-        Retrieves all car names from the database, extracts the brand and model information, and returns a list of distinct brand-model pairs to the client.
+        Returns the list of distinct brand-model pairs to the client, served from the in-memory car name index. The response carries an ETag, and a request whose If-None-Match header matches it gets an empty 304 response.
 
         Args:
             request: The request object.
@@ -112,21 +356,55 @@ class CarNameListView(views.APIView):
         Returns:
             A response containing the list of distinct brand-model pairs.
         """
-        car_names = filter(None, Car.objects.values_list("name", flat=True))
+        brand_model_pairs, etag = car_name_index.snapshot()
+        headers = {"ETag": etag}
 
-        brand_model_pairs = [
-            {"brand": brand, "model": model}
-            for brand, model in (
-                name.split(" ", 1) if " " in name else (name, "") for name in car_names
+        # If-None-Match uses the weak comparison, which ignores the W/ prefix
+        if_none_match = parse_etags(request.headers.get("If-None-Match", ""))
+        if "*" in if_none_match or etag in (
+            tag.removeprefix("W/") for tag in if_none_match
+        ):
+            return response.Response(
+                status=status.HTTP_304_NOT_MODIFIED, headers=headers
             )
-        ]
 
-        unique_brand_model_pairs = []
-        seen_pairs = set()
-        for pair in brand_model_pairs:
-            pair_tuple = tuple(pair.items())
-            if pair_tuple not in seen_pairs:
-                seen_pairs.add(pair_tuple)
-                unique_brand_model_pairs.append(pair)
+        return response.Response(
+            brand_model_pairs, status=status.HTTP_200_OK, headers=headers
+        )
+
+
+class CarPriceScoringView(views.APIView):
+    """
+    Reports and starts the scoring of the stored cars, which writes the price predicted by the model back to them as `predicted_price` (see price_pilot.scoring). Restricted to staff users.
+
+    Methods:
+    - get: Returns the state of the scoring, with the run in progress if any, 404 if the cars have never been scored.
+    - post: Starts a run of the scoring in the background of the worker process and returns 202 with its id, or 409 if a run is already in progress (started here, by another worker or by the `score_cars` command). All the cars are scored with the `full=true` query parameter.
+    """
+
+    permission_classes = [permissions.IsAdminUser]
 
-        return response.Response(unique_brand_model_pairs, status=status.HTTP_200_OK)
+    def get(self, request, format=None):
+        state = get_scoring_state()
+        if state is None:
+            return response.Response(
+                {"detail": "The cars have never been scored."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        state.pop("_id")
+        return response.Response(state, status=status.HTTP_200_OK)
+
+    def post(self, request, format=None):
+        full = request.query_params.get("full", "false").lower() in ("true", "1", "yes")
+        try:
+            run_id = start_scoring(
+                registry.get("price_pilot"), settings.CAR_SCORING_BATCH_SIZE, full=full
+            )
+        except ScoringInProgress as e:
+            return response.Response(
+                {"detail": str(e), "running": e.running},
+                status=status.HTTP_409_CONFLICT,
+            )
+        return response.Response(
+            {"id": run_id, "full": full}, status=status.HTTP_202_ACCEPTED
+        )